@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the app registry is ready: live results are streamed in front of Django.
+from polls.streaming import with_results_stream  # noqa: E402
+
+application = with_results_stream(django_application)
@@ -10,8 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import sys
+import warnings
 from pathlib import Path
-from decouple import config
+from decouple import Choices, Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent
@@ -25,8 +27,14 @@ SECRET_KEY = config('SECRET_KEY', default='secret_key')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=False, cast=bool)
 
+TESTING = 'test' in sys.argv[1:2]
+
 ALLOWED_HOSTS = []
 
+# Addresses of the reverse proxies in front of the site. X-Forwarded-For is only
+# trusted in requests coming from them.
+POLLS_TRUSTED_PROXIES = config('POLLS_TRUSTED_PROXIES', default='', cast=Csv())
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -40,6 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'polls.middleware.MetricsMiddleware',
+    'polls.middleware.DatabaseRoutingMiddleware',
+    'polls.middleware.ThrottleMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,13 +84,269 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Connections are kept for DATABASE_CONN_MAX_AGE seconds instead of reopened on
+# every request. Set DATABASE_REPLICA_NAME to read the read-only views from a
+# replica of the database (e.g. a LiteFS or Litestream read replica).
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+        'OPTIONS': {
+            'timeout': config('DATABASE_TIMEOUT', default=20, cast=int),
+        },
     }
 }
 
+if config('DATABASE_REPLICA_NAME', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': config('DATABASE_REPLICA_NAME'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['polls.db.PrimaryReplicaRouter']
+
+# SQLite pragmas applied to every new connection (polls.db): WAL lets readers run
+# alongside the writer. Idle persistent connections are checked after
+# HEALTH_CHECK_AFTER seconds. After a write, the client reads from the primary for
+# STICKY_SECONDS.
+
+POLLS_DATABASE = {
+    'PRAGMAS': {
+        'journal_mode': config('DATABASE_JOURNAL_MODE', default='wal'),
+        'synchronous': config('DATABASE_SYNCHRONOUS', default='normal'),
+        'cache_size': config('DATABASE_CACHE_KB', default=20000, cast=lambda kb: -int(kb)),
+        'temp_store': 'memory',
+        'mmap_size': config('DATABASE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int),
+    },
+    'HEALTH_CHECK_AFTER': config('DATABASE_HEALTH_CHECK_AFTER', default=30, cast=float),
+    'REPLICA': 'replica',
+    'REPLICA_VIEWS': (
+        'polls:index', 'polls:detail', 'polls:results', 'polls:timeline',
+        'polls:api-questions', 'polls:api-results', 'polls:api-timeline',
+    ),
+    'STICKY_SECONDS': config('DATABASE_STICKY_SECONDS', default=5, cast=int),
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# The 'polls' cache is the shared tier behind the in-process LRU of polls.cache.
+# Point it at a file directory or a memcached/redis service to share it between
+# workers, e.g. POLLS_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# and POLLS_CACHE_LOCATION=/var/tmp/ku-polls-cache. It is off while running the test
+# suite, whose rolled back transactions reuse ids without invalidating anything.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'polls': {
+        'BACKEND': config('POLLS_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('POLLS_CACHE_LOCATION', default='ku-polls'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'throttle': {
+        'BACKEND': config('POLLS_THROTTLE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('POLLS_THROTTLE_CACHE_LOCATION', default='ku-polls-throttle'),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+POLLS_CACHE = {
+    'ENABLED': config('POLLS_CACHE_ENABLED', default=not TESTING, cast=bool),
+    'LOCAL_SIZE': config('POLLS_CACHE_LOCAL_SIZE', default=512, cast=int),
+    'TIMEOUT': config('POLLS_CACHE_TIMEOUT', default=300, cast=int),
+    'INDEX_TIMEOUT': config('POLLS_CACHE_INDEX_TIMEOUT', default=30, cast=int),
+    'SHARD_TIMEOUT': config('POLLS_CACHE_SHARD_TIMEOUT', default=1, cast=int),
+}
+
+
+# Write-behind vote ingestion (polls.ingest). When enabled, vote() journals and
+# queues votes and a background thread writes them in batches. Every worker
+# process needs its own JOURNAL path, e.g. one that includes the worker number,
+# since replaying another process's journal can revert newer votes. A voter sees
+# their queued vote only on pages served by the worker that queued it; other
+# workers show their previous vote until the batch is written.
+
+POLLS_VOTE_BUFFER = {
+    'ENABLED': config('POLLS_VOTE_BUFFER_ENABLED', default=False, cast=bool),
+    'MAX_LATENCY': config('POLLS_VOTE_BUFFER_MAX_LATENCY', default=0.5, cast=float),
+    'MAX_BATCH': config('POLLS_VOTE_BUFFER_MAX_BATCH', default=500, cast=int),
+    'JOURNAL': config('POLLS_VOTE_BUFFER_JOURNAL', default=str(BASE_DIR / 'vote-journal.jsonl')),
+    'FSYNC': config('POLLS_VOTE_BUFFER_FSYNC', default=False, cast=bool),
+}
+
+
+# Live results over Server-Sent Events (polls.streaming), served only when the
+# site runs through mysite.asgi. Each client gets at most MAX_UPDATES_PER_SECOND
+# events; ENABLED makes the results page subscribe to them.
+
+POLLS_STREAM = {
+    'ENABLED': config('POLLS_STREAM_ENABLED', default=False, cast=bool),
+    'MAX_UPDATES_PER_SECOND': config('POLLS_STREAM_MAX_UPDATES_PER_SECOND', default=2, cast=float),
+    'KEEPALIVE': config('POLLS_STREAM_KEEPALIVE', default=15, cast=float),
+}
+
+
+# Per-request metrics (polls.metrics), exposed at /metrics while ENABLED. DIR is a
+# directory shared by the worker processes of one host so that /metrics adds them
+# up. /metrics answers staff users, the ALLOWED_IPS and "Authorization: Bearer
+# <TOKEN>" only.
+
+POLLS_METRICS = {
+    'ENABLED': config('POLLS_METRICS_ENABLED', default=False, cast=bool),
+    'DIR': config('POLLS_METRICS_DIR', default=''),
+    'DUMP_INTERVAL': config('POLLS_METRICS_DUMP_INTERVAL', default=1.0, cast=float),
+    'ALLOWED_IPS': config('POLLS_METRICS_ALLOWED_IPS', default='', cast=Csv()),
+    'TOKEN': config('POLLS_METRICS_TOKEN', default=''),
+}
+
+
+# Rate limits and load shedding per URL name (polls.throttle). RATE is per logged-in
+# user and IP_RATE per client address, as "<requests>/<s|m|h|d>". Over them the
+# client gets a 429; with CONCURRENCY requests already running in the process, or
+# MAX_QUEUE votes waiting in the write-behind buffer, a 503. The windows are kept in
+# the 'throttle' cache.
+
+VOTE_THROTTLE = {
+    'RATE': config('POLLS_THROTTLE_VOTE_RATE', default='20/m'),
+    'IP_RATE': config('POLLS_THROTTLE_VOTE_IP_RATE', default='300/m'),
+    'CONCURRENCY': config('POLLS_THROTTLE_VOTE_CONCURRENCY', default=32, cast=int),
+    'MAX_QUEUE': config('POLLS_THROTTLE_VOTE_MAX_QUEUE', default=10000, cast=int),
+}
+
+POLLS_THROTTLE = {
+    'ENABLED': config('POLLS_THROTTLE_ENABLED', default=not TESTING, cast=bool),
+    'VIEWS': {
+        'polls:vote': VOTE_THROTTLE,
+        'polls:group-vote': VOTE_THROTTLE,
+    },
+}
+
+
+# Archiving of long-closed polls (polls.archive, manage.py archive_polls). The votes of
+# polls closed more than GRACE_DAYS ago go to compressed files in DIRECTORY and only
+# their final counts stay in the database.
+
+POLLS_ARCHIVE = {
+    'GRACE_DAYS': config('POLLS_ARCHIVE_GRACE_DAYS', default=30, cast=int),
+    'DIRECTORY': config('POLLS_ARCHIVE_DIRECTORY', default=str(BASE_DIR / 'archive')),
+    'BATCH_SIZE': config('POLLS_ARCHIVE_BATCH_SIZE', default=1000, cast=int),
+}
+
+
+# Scheduled transitions (polls.scheduler, manage.py schedule_polls). Questions are
+# warmed in the poll cache LEAD seconds before they open; the worker wakes up at
+# the next transition, or after INTERVAL seconds at the latest. Warming only
+# reaches the web workers through a shared POLLS_CACHE_BACKEND.
+
+POLLS_SCHEDULER = {
+    'LEAD': config('POLLS_SCHEDULER_LEAD', default=60, cast=float),
+    'INTERVAL': config('POLLS_SCHEDULER_INTERVAL', default=30, cast=float),
+}
+
+
+# Tally reconciliation (polls.reconcile, manage.py reconcile_tallies). Each run
+# checks at most MAX_QUESTIONS questions, BATCH_SIZE at a time, after the id kept
+# in CHECKPOINT, and repairs those whose tallies drifted from their votes.
+
+POLLS_RECONCILE = {
+    'BATCH_SIZE': config('POLLS_RECONCILE_BATCH_SIZE', default=200, cast=int),
+    'MAX_QUESTIONS': config('POLLS_RECONCILE_MAX_QUESTIONS', default=5000, cast=int),
+    'CHECKPOINT': config('POLLS_RECONCILE_CHECKPOINT', default=str(BASE_DIR / 'reconcile.checkpoint')),
+}
+
+
+# Logging
+# https://docs.djangoproject.com/en/3.1/topics/logging/
+# The polls logger writes JSON lines from a background thread (polls.log). Set
+# POLLS_LOG_FILE to write them to a file, and POLLS_LOG_VOTE_SAMPLE to keep only
+# a share of the vote records.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample': {
+            '()': 'polls.log.SamplingFilter',
+            'rates': {'vote': config('POLLS_LOG_VOTE_SAMPLE', default=1.0, cast=float)},
+        },
+    },
+    'formatters': {
+        'simple': {
+            'format': '%(asctime)s : %(message)s',
+            'datefmt': '%d/%m/%Y %I:%M:%S %p',
+        },
+        'json': {
+            '()': 'polls.log.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+        'polls': {
+            'class': 'polls.log.BackgroundHandler',
+            'filename': config('POLLS_LOG_FILE', default='') or None,
+            'formatter': 'json',
+            'filters': ['sample'],
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'polls': {
+            'handlers': ['polls'],
+            'level': config('DJANGO_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Sessions and authentication (polls.auth). SESSION_BACKEND picks the session
+# engine: 'db' reads the session table on every request, 'cached_db' only on a
+# cache miss, 'cache' never (sessions are lost with the cache) and 'signed_cookies'
+# keeps the whole session in the client's cookie. 'cached_db' and 'cache' need a
+# SESSION_CACHE_ALIAS shared by all the workers, or a logout on one worker leaves
+# the session valid on the others; with a locmem or dummy cache they fall back to
+# 'db' with a warning. With USER_CACHE_ENABLED the users of logged-in sessions are
+# cached in USER_CACHE, which must be shared by all the workers: a locmem cache
+# leaves it off. PASSWORD_ITERATIONS sets the PBKDF2 cost of new passwords
+# (Django's default when 0); stored hashes with another cost are rehashed at the
+# next login.
+
+SESSION_BACKEND = config('SESSION_BACKEND', default='db', cast=Choices(['db', 'cached_db', 'cache', 'signed_cookies']))
+SESSION_CACHE_ALIAS = config('SESSION_CACHE_ALIAS', default='default')
+if SESSION_BACKEND in ('cached_db', 'cache') and CACHES[SESSION_CACHE_ALIAS]['BACKEND'] in (
+        'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache'):
+    warnings.warn(f"SESSION_CACHE_ALIAS {SESSION_CACHE_ALIAS!r} is local to each process; "
+                  f"using database sessions instead of {SESSION_BACKEND!r}.", RuntimeWarning)
+    SESSION_BACKEND = 'db'
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + SESSION_BACKEND
+
+AUTHENTICATION_BACKENDS = ['polls.auth.CachedModelBackend']
+
+PASSWORD_HASHERS = [
+    'polls.auth.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+POLLS_AUTH = {
+    'USER_CACHE_ENABLED': config('POLLS_USER_CACHE_ENABLED', default=False, cast=bool),
+    'USER_CACHE': config('POLLS_USER_CACHE', default='polls'),
+    'USER_CACHE_TIMEOUT': config('POLLS_USER_CACHE_TIMEOUT', default=300, cast=int),
+    'PASSWORD_ITERATIONS': config('POLLS_PASSWORD_ITERATIONS', default=0, cast=int),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
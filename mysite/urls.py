@@ -8,6 +8,7 @@ We can specific the url that we want to lead to the page that we want.
 
 from django.contrib import admin
 from django.urls import include, path
+from polls.metrics import metrics_settings, metrics_view
 from . import views
 
 urlpatterns = [
@@ -16,3 +17,6 @@ urlpatterns = [
     path('polls/', include('polls.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
 ]
+
+if metrics_settings()['ENABLED']:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
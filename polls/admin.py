@@ -3,26 +3,211 @@ This is admin site.
 
 This module can adjust everythings about the questions.
 """
+import datetime
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.db.models import Count, F
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+from .cache import invalidate, invalidate_all, invalidate_question
+from .models import Choice, PollGroup, Question, ResultSnapshot
+
+#: How long the reopen action keeps a poll open.
+REOPEN_FOR = datetime.timedelta(days=7)
 
-from .models import Choice, Question
 
 class ChoiceInline(admin.TabularInline):
-    """Admin can edit all choices in this section."""
+    """Admin can edit all choices in this section, next to their read-only tallies."""
 
     model = Choice
-    extra = 3
+    extra = 1
+    fields = ('choice_text', 'tally')
+    readonly_fields = ('tally',)
+
+    def get_queryset(self, request):
+        """Load the choices with their tallies, shards included, in one query."""
+        return super().get_queryset(request).with_vote_totals().order_by('pk')
+
+    def tally(self, choice):
+        """Return the votes of the choice."""
+        return getattr(choice, 'votes_total', choice.vote_count)
+    tally.short_description = 'Votes'
+
+
+class StatusFilter(admin.SimpleListFilter):
+    """Filter the questions by whether they can be voted on, in SQL."""
+
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        """Offer the three states of a poll."""
+        return (('scheduled', 'Scheduled'), ('open', 'Open'), ('closed', 'Closed'))
+
+    def queryset(self, request, queryset):
+        """Apply the same conditions as the public poll list."""
+        now = timezone.now()
+        if self.value() == 'scheduled':
+            return queryset.filter(pub_date__gt=now)
+        if self.value() == 'open':
+            return queryset.published(now).open(now)
+        if self.value() == 'closed':
+            return queryset.published(now).closed(now)
+        return queryset
+
+
+class RescheduleForm(forms.Form):
+    """Move the selected polls by a number of days, or give them all the same end date."""
+
+    days = forms.IntegerField(required=False, help_text="Move both dates by this many days (negative moves back).")
+    end_date = forms.SplitDateTimeField(required=False, widget=admin.widgets.AdminSplitDateTime,
+                                        help_text="Or set this end date on every selected poll.")
+
+    def clean(self):
+        """Ask for exactly one of the two changes."""
+        data = super().clean()
+        if (data.get('days') is None) == (data.get('end_date') is None):
+            raise forms.ValidationError("Give either a number of days or an end date.")
+        return data
 
 
 class QuestionAdmin(admin.ModelAdmin):
     """Make admin site to appear optional menu."""
 
     fieldsets = [
-        (None, {'fields': ['question_text']}),
+        (None, {'fields': ['question_text', 'group']}),
         ('Date information', {'fields': ['pub_date', 'end_date'], 'classes': ['collapse']}),
+        ('Vote counters', {'fields': ['counter_shards'], 'classes': ['collapse']}),
     ]
     inlines = [ChoiceInline]
-    list_display = ('question_text', 'pub_date', 'was_published_recently')
+    list_display = ('question_text', 'pub_date', 'end_date', 'votes', 'is_open')
+    list_filter = (StatusFilter, 'pub_date', 'group')
+    search_fields = ('question_text',)
+    ordering = ('-pub_date',)
+    list_per_page = 50
+    show_full_result_count = False
+    actions = ['close_polls', 'reopen_polls', 'reschedule_polls', 'fold_counter_shards']
+
+    def get_queryset(self, request):
+        """Annotate the vote totals and the open status in SQL so the list doesn't compute them per row."""
+        return super().get_queryset(request).with_vote_totals().with_is_open()
+
+    def votes(self, question):
+        """Return the total votes of the question."""
+        return question.votes_total
+    votes.admin_order_field = 'votes_total'
+
+    def is_open(self, question):
+        """Return whether the question can be voted on."""
+        return question.is_open
+    is_open.admin_order_field = 'is_open'
+    is_open.boolean = True
+    is_open.short_description = 'Open?'
+
+    def save_model(self, request, obj, form, change):
+        """Save only the edited fields, so that the vote tallies are not overwritten.
+
+        Changing the number of counter shards folds the existing shards first.
+        """
+        if not change:
+            return super().save_model(request, obj, form, change)
+        if 'counter_shards' in form.changed_data:
+            Question.objects.filter(pk=obj.pk).fold_shards()
+            invalidate('shards')
+        obj.save(update_fields=form.changed_data)
+
+    def save_formset(self, request, form, formset, change):
+        """Insert new choices in full but write only the text of edited ones, so that their tallies are kept."""
+        if formset.model is not Choice:
+            return super().save_formset(request, form, formset, change)
+        choices = formset.save(commit=False)
+        for choice in formset.deleted_objects:
+            choice.delete()
+        for choice in choices:
+            if choice._state.adding:
+                choice.save()
+            else:
+                choice.save(update_fields=['choice_text'])
+        formset.save_m2m()
+
+    def changed_dates(self, request, ids, message):
+        """Store the status of polls whose dates were changed with an UPDATE and forget their snapshots and pages."""
+        Question.objects.filter(pk__in=ids).refresh_status()
+        ResultSnapshot.objects.filter(question__in=ids).delete()
+        invalidate_all()
+        self.message_user(request, message.format(count=len(ids)))
+
+    def close_polls(self, request, queryset):
+        """End voting on the selected open polls now."""
+        now = timezone.now()
+        ids = list(queryset.open(now).values_list('pk', flat=True))
+        Question.objects.filter(pk__in=ids).update(end_date=now)
+        self.changed_dates(request, ids, "Closed {count} poll(s).")
+    close_polls.short_description = "Close the selected polls now"
+
+    def reopen_polls(self, request, queryset):
+        """Let the selected closed polls take votes for another REOPEN_FOR; archived polls stay closed."""
+        now = timezone.now()
+        ids = list(queryset.published(now).closed(now).filter(archived_at__isnull=True).values_list('pk', flat=True))
+        Question.objects.filter(pk__in=ids).update(end_date=now + REOPEN_FOR)
+        self.changed_dates(request, ids, f"Reopened {{count}} poll(s) for {REOPEN_FOR.days} days.")
+    reopen_polls.short_description = "Reopen the selected polls for a week"
+
+    def reschedule_polls(self, request, queryset):
+        """Ask how to move the selected polls, then move them all with one UPDATE."""
+        form = RescheduleForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            ids = list(queryset.values_list('pk', flat=True))
+            if form.cleaned_data['days'] is not None:
+                shift = datetime.timedelta(days=form.cleaned_data['days'])
+                changes = {'pub_date': F('pub_date') + shift, 'end_date': F('end_date') + shift}
+            else:
+                changes = {'end_date': form.cleaned_data['end_date']}
+            Question.objects.filter(pk__in=ids).update(**changes)
+            self.changed_dates(request, ids, "Rescheduled {count} poll(s).")
+            return None
+        return TemplateResponse(request, 'admin/polls/question/reschedule.html', {
+            **self.admin_site.each_context(request),
+            'title': "Reschedule polls",
+            'opts': self.model._meta,
+            'form': form,
+            'media': self.media + form.media,
+            'queryset': queryset,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'select_across': request.POST.get('select_across', '0'),
+        })
+    reschedule_polls.short_description = "Reschedule the selected polls"
+
+    def fold_counter_shards(self, request, queryset):
+        """Fold the counter shards of the selected questions back into their tallies and stop sharding."""
+        ids = list(queryset.filter(counter_shards__gt=1).values_list('pk', flat=True))
+        Question.objects.filter(pk__in=ids).set_counter_shards(1)
+        invalidate('shards')
+        for pk in ids:
+            invalidate_question(pk)
+        self.message_user(request, f"Folded the counter shards of {len(ids)} question(s).")
+    fold_counter_shards.short_description = "Fold counter shards back into the tallies"
+
+
+class PollGroupAdmin(admin.ModelAdmin):
+    """Surveys, with the number of questions in each."""
+
+    list_display = ('title', 'question_count')
+    search_fields = ('title',)
+
+    def get_queryset(self, request):
+        """Count the questions in SQL."""
+        return super().get_queryset(request).annotate(question_count=Count('questions'))
+
+    def question_count(self, group):
+        """Return how many questions the group has."""
+        return group.question_count
+    question_count.admin_order_field = 'question_count'
+    question_count.short_description = 'Questions'
 
 
 admin.site.register(Question, QuestionAdmin)
+admin.site.register(PollGroup, PollGroupAdmin)
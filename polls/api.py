@@ -0,0 +1,124 @@
+"""Read-only JSON API for polls and their results.
+
+Responses carry a strong ETag (a hash of the body) and a Last-Modified date taken
+from the latest vote, so clients polling with If-None-Match or If-Modified-Since
+get an empty 304 while nothing has changed.
+"""
+import hashlib
+import json
+
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .cache import poll_cache
+from .models import SHARD_STAMP_INTERVAL, ChoiceShard, Question, VoteRollup, prefetch_choices
+from .views import IndexView, question_page
+
+
+def question_json(question, shard_votes=0):
+    """Return the compact JSON form of a question; ``shard_votes`` are its votes still in counter shards."""
+    return {
+        'id': question.pk,
+        'text': question.question_text,
+        'pub_date': question.pub_date.isoformat(),
+        'end_date': question.end_date.isoformat(),
+        'is_open': question.can_vote(),
+        'total_votes': question.total_votes + shard_votes,
+    }
+
+
+def last_modified(question, now):
+    """Return the latest moment that changed what the API shows about the question.
+
+    A question with sharded counters stamps last_vote_at at most once per SHARD_STAMP_INTERVAL,
+    so its votes may be up to one interval newer than the stamp.
+    """
+    voted = question.last_vote_at or question.pub_date
+    if question.last_vote_at and question.counter_shards > 1:
+        voted = min(now, voted + SHARD_STAMP_INTERVAL)
+    moments = [question.pub_date, voted]
+    if question.end_date <= now:
+        moments.append(question.end_date)
+    return max(moments)
+
+
+def conditional_json(request, data, modified):
+    """Return ``data`` as compact JSON with a strong ETag, or a 304 when the client's copy is current."""
+    body = json.dumps(data, separators=(',', ':'))
+    etag = '"%s"' % hashlib.sha256(body.encode()).hexdigest()[:32]
+    modified = int(modified.timestamp()) if modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    if modified:
+        response['Last-Modified'] = http_date(modified)
+    return response
+
+
+@require_safe
+def question_list(request):
+    """List published questions newest first, ``?status=open|closed`` and ``?after=<cursor>`` supported."""
+    status = request.GET.get('status', 'all')
+    if status not in IndexView.statuses:
+        return HttpResponseBadRequest("status must be one of: " + ', '.join(IndexView.statuses))
+    try:
+        page, next_cursor = question_page(status, request.GET.get('after', ''), IndexView.page_size)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid page cursor.")
+    now = timezone.now()
+    shard_votes = ChoiceShard.objects.totals([question.pk for question in page if question.counter_shards > 1])
+    data = {'results': [question_json(question, shard_votes.get(question.pk, 0)) for question in page],
+            'next': next_cursor}
+    return conditional_json(request, data, max((last_modified(q, now) for q in page), default=None))
+
+
+@require_safe
+def question_results(request, pk):
+    """Return the tallies of a published question."""
+    def load():
+        try:
+            question = Question.objects.published().prefetch_related(prefetch_choices()).get(pk=pk)
+        except Question.DoesNotExist:
+            raise Http404("No published question matches the given id.")
+        return {'question': question, **question.results()}
+
+    results = poll_cache.get_or_set('api-results', f'question:{pk}', pk, load)
+    question = results['question']
+    if not question.is_published():
+        raise Http404("No published question matches the given id.")
+    data = question_json(question)
+    data['total_votes'] = results['total_votes']
+    data['choices'] = [
+        {'id': choice.pk, 'text': choice.choice_text, 'votes': choice.votes, 'percentage': choice.percentage}
+        for choice in results['choices']
+    ]
+    return conditional_json(request, data, last_modified(question, timezone.now()))
+
+
+@require_safe
+def question_timeline(request, pk):
+    """Return the running vote count per choice over time, ``?resolution=minute|hour|day`` (hour by default)."""
+    resolution = request.GET.get('resolution', 'hour')
+    if resolution not in VoteRollup.RESOLUTIONS:
+        return HttpResponseBadRequest("resolution must be one of: " + ', '.join(VoteRollup.RESOLUTIONS))
+
+    def load():
+        try:
+            question = Question.objects.published().prefetch_related(prefetch_choices()).get(pk=pk)
+        except Question.DoesNotExist:
+            raise Http404("No published question matches the given id.")
+        shard_votes = ChoiceShard.objects.totals([question.pk] if question.counter_shards > 1 else [])
+        return {'question': question, 'shard_votes': shard_votes.get(question.pk, 0),
+                **question.timeline(resolution)}
+
+    timeline = poll_cache.get_or_set('api-timeline', f'question:{pk}', f'{pk}:{resolution}', load)
+    question = timeline['question']
+    data = question_json(question, timeline['shard_votes'])
+    data['resolution'] = resolution
+    data['choices'] = [{'id': choice.pk, 'text': choice.choice_text} for choice in timeline['choices']]
+    data['points'] = [{**point, 'time': point['time'].isoformat()} for point in timeline['points']]
+    return conditional_json(request, data, last_modified(question, timezone.now()))
@@ -6,3 +6,7 @@ class PollsConfig(AppConfig):
     """This class has to config the name of the app."""
 
     name = 'polls'
+
+    def ready(self):
+        """Connect the database tuning and user cache signal receivers."""
+        from . import auth, db  # noqa: F401
@@ -0,0 +1,101 @@
+"""Move the raw votes of long-closed polls out of the Vote table.
+
+A poll that closed more than GRACE_DAYS ago is archived in three steps. Its votes are
+written to DIRECTORY/question-<id>.jsonl.gz in the import_polls format. Its final count
+per choice is stored in ArchivedTally and the question is marked archived_at, in one
+short transaction. Then its votes are deleted BATCH_SIZE rows at a time, one transaction
+per batch, so that no lock is held for long. Results of archived polls are read from
+ArchivedTally. A run that stops half way is finished by the next one.
+"""
+import datetime
+import os
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .cache import invalidate_question
+from .ingest import flush_pending
+from .models import ArchivedTally, Choice, Question, Vote
+from .transfer import export_records, open_stream, write_records
+
+DEFAULTS = {
+    'GRACE_DAYS': 30,
+    'DIRECTORY': 'archive',
+    'BATCH_SIZE': 1000,
+}
+
+
+def archive_settings():
+    """Return the POLLS_ARCHIVE setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_ARCHIVE', {})}
+
+
+def archivable(grace_days, now=None):
+    """Return the questions that closed more than ``grace_days`` days ago and aren't archived yet."""
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=grace_days)
+    return Question.objects.filter(archived_at__isnull=True, end_date__lt=cutoff)
+
+
+def archive_path(directory, question_id):
+    """Return the archive file of a question."""
+    return os.path.join(directory, f'question-{question_id}.jsonl.gz')
+
+
+def write_archive(question, directory):
+    """Write the question, its choices and its votes to its archive file; return the number of votes written.
+
+    The file is written under a temporary name and renamed when complete.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = archive_path(directory, question.pk)
+    partial = path[:-len('.jsonl.gz')] + '.partial.jsonl.gz'
+    with open_stream(partial, 'w') as stream:
+        counts = write_records(stream, export_records(questions=Question.objects.filter(pk=question.pk)), 'jsonl')
+    os.replace(partial, path)
+    return counts['vote']
+
+
+def archive_question(question, directory):
+    """Archive the votes of a closed question and store its final counts; return the number of votes archived."""
+    written = write_archive(question, directory)
+    counts = dict(Vote.objects.filter(question=question).order_by().values('choice_id')
+                  .annotate(total=Count('*')).values_list('choice_id', 'total'))
+    if sum(counts.values()) != written:
+        raise ValueError(f"Question {question.pk} has {sum(counts.values())} votes but {written} were archived.")
+    with transaction.atomic(using=router.db_for_write(Question)):
+        choices = Choice.objects.filter(question=question).values_list('pk', flat=True)
+        ArchivedTally.objects.filter(question=question).delete()
+        ArchivedTally.objects.bulk_create(ArchivedTally(choice_id=pk, question=question, votes=counts.get(pk, 0))
+                                          for pk in choices)
+        Question.objects.filter(pk=question.pk).update(archived_at=timezone.now())
+        Question.objects.filter(pk=question.pk).refresh_status()
+        Question.objects.filter(pk=question.pk).rebuild_tallies()
+    invalidate_question(question.pk)
+    return written
+
+
+def delete_archived_votes(batch_size=1000):
+    """Delete the votes of archived questions ``batch_size`` at a time and return how many were deleted."""
+    archived = Vote.objects.filter(question__archived_at__isnull=False).order_by('pk')
+    deleted = 0
+    while True:
+        with transaction.atomic(using=router.db_for_write(Vote)):
+            pks = list(archived.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return deleted
+            deleted += Vote.objects.filter(pk__in=pks).delete()[0]
+
+
+def archive_polls(grace_days, directory, batch_size=1000, now=None):
+    """Archive every question closed for more than ``grace_days`` days and delete their votes.
+
+    Return ``(questions, votes archived, votes deleted)``.
+    """
+    flush_pending()
+    questions = archived = 0
+    for question in archivable(grace_days, now).order_by('pk').iterator():
+        archived += archive_question(question, directory)
+        questions += 1
+    return questions, archived, delete_archived_votes(batch_size)
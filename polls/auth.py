@@ -0,0 +1,92 @@
+"""A cheaper authentication path: cached user rows and a tunable password hashing cost.
+
+CachedModelBackend serves the user of a logged-in session from the USER_CACHE
+backend instead of reading the user table on every request, and drops the cached
+copy whenever the user is saved or deleted. It is off by default, and stays off
+unless USER_CACHE is shared by all the workers: with a per-process cache a password
+change or deactivation would only log out the sessions served by the worker that
+made it.
+
+PBKDF2PasswordHasher hashes new passwords with POLLS_AUTH['PASSWORD_ITERATIONS']
+rounds. Django rehashes a stored password whose cost differs on the next
+successful login, so changing the setting moves every active user to the new cost.
+"""
+import warnings
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'USER_CACHE_ENABLED': False,
+    'USER_CACHE': 'polls',
+    'USER_CACHE_TIMEOUT': 300,
+    'PASSWORD_ITERATIONS': 0,
+}
+
+
+def auth_settings():
+    """Return the POLLS_AUTH setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_AUTH', {})}
+
+
+#: Cache backends whose entries only the current process sees.
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def user_cache():
+    """Return the cache of user rows, or None when it is off or would not be shared by the workers."""
+    options = auth_settings()
+    if not options['USER_CACHE_ENABLED']:
+        return None
+    if settings.CACHES[options['USER_CACHE']]['BACKEND'] in LOCAL_BACKENDS:
+        warnings.warn(f"POLLS_AUTH['USER_CACHE'] {options['USER_CACHE']!r} is local to each process; "
+                      f"users are not cached.", RuntimeWarning)
+        return None
+    return caches[options['USER_CACHE']]
+
+
+def user_cache_key(user_id):
+    """Return the cache key of a user row."""
+    return f'polls:user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that reads the users of logged-in sessions from the cache."""
+
+    def get_user(self, user_id):
+        """Return the cached user, loading and caching it on a miss."""
+        cache = user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        user = cache.get(user_cache_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(user_cache_key(user_id), user, auth_settings()['USER_CACHE_TIMEOUT'])
+        return user if self.user_can_authenticate(user) else None
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """A changed password, flag or profile is seen by the next request."""
+    cache = user_cache()
+    if cache is not None:
+        cache.delete(user_cache_key(instance.pk))
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the number of rounds set by POLLS_AUTH['PASSWORD_ITERATIONS'].
+
+    Its algorithm name is Django's, so hashes move between the two without a reset.
+    """
+
+    @property
+    def iterations(self):
+        """Return the configured rounds, or Django's default."""
+        return auth_settings()['PASSWORD_ITERATIONS'] or hashers.PBKDF2PasswordHasher.iterations
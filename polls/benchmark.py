@@ -0,0 +1,114 @@
+"""Helpers for the benchmark commands: concurrent load, latency percentiles and baselines."""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+
+class QueryCounter:
+    """Database execute wrapper that counts the queries of the current thread."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Count the query and run it."""
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(sorted_values, share):
+    """Return the value below which ``share`` (0-1) of the sorted values fall."""
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * share))]
+
+
+def run_load(make_worker, requests, threads):
+    """Run ``requests`` calls spread over ``threads`` threads and return their statistics.
+
+    ``make_worker()`` is called once per thread and returns the callable that performs
+    one request; it returns False (or raises) for a failed request.
+    """
+    latencies, errors, queries = [], [0], [0]
+    lock = threading.Lock()
+    per_thread = [requests // threads + (1 if n < requests % threads else 0) for n in range(threads)]
+
+    def work(count):
+        worker, counter = make_worker(), QueryCounter()
+        mine, failed = [], 0
+        with connections['default'].execute_wrapper(counter):
+            for n in range(count):
+                started = time.perf_counter()
+                try:
+                    ok = worker(n) is not False
+                except Exception:
+                    ok = False
+                mine.append(time.perf_counter() - started)
+                failed += not ok
+        connections.close_all()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+            queries[0] += counter.count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, per_thread))
+    return summarize(latencies, time.perf_counter() - started, queries[0], errors[0])
+
+
+def summarize(latencies, wall, queries, errors):
+    """Return latency percentiles in milliseconds, throughput and queries per request."""
+    latencies = sorted(latencies)
+    count = len(latencies) or 1
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'throughput': round(len(latencies) / wall, 1) if wall else 0,
+        'queries': round(queries / count, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a description of every metric that regressed beyond ``tolerance`` (a share, e.g. 0.2)."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']}/s -> {current['throughput']}/s")
+        if current['queries'] > before['queries'] * (1 + tolerance):
+            regressions.append(f"{name}: queries/request {before['queries']} -> {current['queries']}")
+    return regressions
+
+
+def load_baseline(path):
+    """Read a baseline file written by save_baseline."""
+    with open(path) as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(path, results):
+    """Write the results as the new baseline."""
+    with open(path, 'w') as baseline:
+        json.dump(results, baseline, indent=2, sort_keys=True)
+
+
+def format_table(results):
+    """Return the results as an aligned text table."""
+    lines = [f"{'endpoint':<10} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+             f"{'req/s':>8} {'queries':>7}"]
+    for name, row in results.items():
+        lines.append(f"{name:<10} {row['requests']:>8} {row['errors']:>6} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                     f"{row['p99_ms']:>8} {row['throughput']:>8} {row['queries']:>7}")
+    return '\n'.join(lines)
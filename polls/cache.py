@@ -0,0 +1,172 @@
+"""Two-tier cache for the poll pages.
+
+Entries are keyed by a version counter kept in the shared backend: one counter per
+question for the detail and results data, and one for the question list. Writers
+bump the counter instead of deleting keys, so stale entries simply stop being read.
+A counter the backend evicted restarts from the current time in nanoseconds, above
+any value it reached before, so entries of its older versions are never read again.
+A small in-process LRU sits in front of the shared backend.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Choice, Question
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'polls',
+    'LOCAL_SIZE': 512,
+    'TIMEOUT': 300,
+    'INDEX_TIMEOUT': 30,
+    'SHARD_TIMEOUT': 1,
+}
+
+
+def cache_settings():
+    """Return the POLLS_CACHE setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_CACHE', {})}
+
+
+class LocalLRU:
+    """A bounded, thread-safe least-recently-used map with per-entry expiry."""
+
+    def __init__(self, size):
+        """Keep at most ``size`` entries."""
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the live value stored under key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        """Store the value for ``timeout`` seconds, evicting the oldest entry when full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+class PollCache:
+    """Versioned get-or-set over the local LRU and the shared backend, with hit/miss counters."""
+
+    def __init__(self):
+        """Build the local tier from the current settings."""
+        self.local = LocalLRU(cache_settings()['LOCAL_SIZE'])
+        self.counters = Counter()
+
+    @property
+    def shared(self):
+        """Return the configured shared cache backend."""
+        return caches[cache_settings()['BACKEND']]
+
+    def version(self, *scopes):
+        """Return the combined current version of scopes such as ``question:3`` or ``index``, in one read."""
+        keys = [f'polls:version:{scope}' for scope in scopes]
+        found = self.shared.get_many(keys)
+        for key in keys:
+            if key not in found:
+                seed = time.time_ns()
+                found[key] = seed if self.shared.add(key, seed, timeout=None) else self.shared.get(key, seed)
+        return '.'.join(str(found[key]) for key in keys)
+
+    def bump(self, scope):
+        """Move the scope to a new version so that every entry under it goes stale."""
+        key = f'polls:version:{scope}'
+        self.shared.add(key, time.time_ns(), timeout=None)
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            self.shared.set(key, time.time_ns(), timeout=None)
+
+    def get_or_set(self, view, scope, key, compute, timeout=None):
+        """Return the cached value of key under the scope's version, computing it on a miss."""
+        options = cache_settings()
+        if not options['ENABLED']:
+            return compute()
+        timeout = options['TIMEOUT'] if timeout is None else timeout
+        versioned = f'polls:{view}:{key}:v{self.version("all", scope)}'
+        value = self.local.get(versioned)
+        if value is None:
+            value = self.shared.get(versioned)
+            if value is not None:
+                self.local.set(versioned, value, timeout)
+        if value is not None:
+            self.counters[view, 'hit'] += 1
+            return value
+        self.counters[view, 'miss'] += 1
+        value = compute()
+        self.shared.set(versioned, value, timeout)
+        self.local.set(versioned, value, timeout)
+        return value
+
+    def stats(self):
+        """Return ``{view: {'hit': n, 'miss': n, 'ratio': r}}`` for this process."""
+        views = {view for view, _ in self.counters}
+        result = {}
+        for view in sorted(views):
+            hit, miss = self.counters[view, 'hit'], self.counters[view, 'miss']
+            result[view] = {'hit': hit, 'miss': miss, 'ratio': hit / (hit + miss)}
+        return result
+
+
+poll_cache = PollCache()
+
+
+def invalidate(*scopes):
+    """Bump the scopes now and again when the current transaction commits.
+
+    The second bump covers readers that refilled the cache from the database
+    before the write was visible to them.
+    """
+    def bump():
+        for scope in scopes:
+            poll_cache.bump(scope)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_question(question_id):
+    """Invalidate the detail and results data of one question."""
+    invalidate(f'question:{question_id}')
+
+
+def invalidate_all():
+    """Invalidate every cached poll page, after bulk updates that bypass the models."""
+    invalidate('all')
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    """Admin edits of a question change its pages and the question list."""
+    invalidate(f'question:{instance.pk}', 'index')
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    """Admin edits of a choice change the pages of its question."""
+    invalidate_question(instance.question_id)
@@ -0,0 +1,111 @@
+"""Database tuning and primary/replica routing.
+
+SQLite connections get the POLLS_DATABASE['PRAGMAS'] as they open. Persistent
+connections (CONN_MAX_AGE) that sat idle longer than HEALTH_CHECK_AFTER seconds are
+checked at the start of the next request and replaced if the server dropped them.
+
+With a REPLICA alias in DATABASES, GET and HEAD requests to the REPLICA_VIEWS read
+from it; everything else, and every write, uses the primary. A request that writes
+pins its client to the primary for STICKY_SECONDS through a cookie, so that a voter
+sees their own vote even while the replica lags.
+"""
+import contextvars
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'PRAGMAS': {},
+    'HEALTH_CHECK_AFTER': None,
+    'REPLICA': '',
+    'REPLICA_VIEWS': (),
+    'STICKY_SECONDS': 5,
+    'STICKY_COOKIE': 'polls_primary',
+}
+
+#: The routing of the current request, or None outside requests (which use the primary).
+current_route = contextvars.ContextVar('polls_route', default=None)
+
+
+def database_settings():
+    """Return the POLLS_DATABASE setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_DATABASE', {})}
+
+
+def replica_alias():
+    """Return the replica alias if one is configured in DATABASES, else an empty string."""
+    alias = database_settings()['REPLICA']
+    return alias if alias in settings.DATABASES else ''
+
+
+class Route:
+    """Where the reads of one request go, and whether it wrote anything."""
+
+    def __init__(self, replica=''):
+        """Read from the primary until the view is known."""
+        self.replica = replica
+        self.use_replica = False
+        self.wrote = False
+
+
+class PrimaryReplicaRouter:
+    """Send the reads of read-only views to the replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        """Read from the replica only in a read-only view that has not written yet."""
+        route = current_route.get()
+        if route and route.use_replica and not route.wrote:
+            return route.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        """Write to the primary, and read from it for the rest of the request."""
+        route = current_route.get()
+        if route:
+            route.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """The replica holds the same rows as the primary."""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Only migrate the primary; the replica follows it."""
+        return False if db == database_settings()['REPLICA'] else None
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    """Tune every new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in database_settings()['PRAGMAS'].items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Replace persistent connections that went unusable while idle."""
+    after = database_settings()['HEALTH_CHECK_AFTER']
+    if after is None:
+        return
+    now = time.monotonic()
+    for connection in connections.all():
+        released = getattr(connection, 'polls_released_at', None)
+        if connection.connection is not None and released is not None and now - released > after:
+            if not connection.is_usable():
+                connection.close()
+
+
+@receiver(request_finished)
+def mark_connections_idle(**kwargs):
+    """Remember when the persistent connections went idle."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.polls_released_at = now
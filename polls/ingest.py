@@ -0,0 +1,252 @@
+"""Write-behind ingestion of votes.
+
+When POLLS_VOTE_BUFFER['ENABLED'] is on, vote() only validates the vote, appends it
+to a local journal and queues it here. A background thread applies the queued
+votes in batches with Vote.objects.cast_many, one transaction per batch, at most
+MAX_LATENCY seconds after they arrived. Journal segments are deleted once their
+batch is committed and replayed on start-up, so a crash loses no accepted vote.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+
+from .cache import invalidate_question
+from .models import Vote
+
+logger = logging.getLogger('polls')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_LATENCY': 0.5,
+    'MAX_BATCH': 500,
+    'JOURNAL': 'vote-journal.jsonl',
+    'FSYNC': False,
+}
+
+
+def buffer_settings():
+    """Return the POLLS_VOTE_BUFFER setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_BUFFER', {})}
+
+
+class VoteBuffer:
+    """Queue of accepted votes waiting to be written, backed by an append-only journal."""
+
+    def __init__(self, journal, max_latency=0.5, max_batch=500, fsync=False):
+        """Use ``journal`` as the path of the active journal segment."""
+        self.journal = Path(journal)
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._pending = {}
+        self._oldest = None
+        self._file = None
+        self._segment = 0
+        self._segments = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Replay whatever an earlier process left in the journal and start the flusher thread.
+
+        The flusher starts even if the replay fails; the replayed votes then stay queued for it.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='polls-vote-flusher', daemon=True)
+        try:
+            self.replay()
+        except Exception:
+            logger.exception("Replaying the vote journal failed, leaving its votes to the flusher.")
+        finally:
+            self._thread.start()
+
+    def enqueue(self, user_id, question_id, choice_id):
+        """Journal the vote and queue it for the next batch."""
+        line = json.dumps([user_id, question_id, choice_id]) + '\n'
+        with self._lock:
+            if self._file is None:
+                self.journal.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.journal, 'a')
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._pending[user_id, question_id] = choice_id
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._wake.notify()
+            elif len(self._pending) >= self.max_batch:
+                self._wake.notify()
+
+    def backlog(self):
+        """Return the number of votes waiting to be written."""
+        with self._lock:
+            return len(self._pending)
+
+    def pending_choice(self, user_id, question_id):
+        """Return the id of the choice the user queued for the question, if it isn't written yet."""
+        with self._lock:
+            return self._pending.get((user_id, question_id))
+
+    def _take_batch(self):
+        """Swap out the pending votes and rotate the journal; return the batch and the segments it covers."""
+        with self._lock:
+            batch, self._pending, self._oldest = self._pending, {}, None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._segment += 1
+                segment = self.journal.with_name(f'{self.journal.name}.{self._segment}')
+                os.replace(self.journal, segment)
+                self._segments.append(segment)
+            return batch, list(self._segments)
+
+    def _put_back(self, batch):
+        """Queue a batch that failed to write again, behind any newer vote of the same user."""
+        with self._lock:
+            for key, choice_id in batch.items():
+                self._pending.setdefault(key, choice_id)
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+                self._wake.notify()
+
+    def flush(self):
+        """Write every queued vote now; return the number of votes written."""
+        with self._flush_lock:
+            batch, segments = self._take_batch()
+            if batch:
+                votes = [(user_id, question_id, choice_id) for (user_id, question_id), choice_id in batch.items()]
+                try:
+                    self._apply(votes)
+                except Exception:
+                    self._put_back(batch)
+                    raise
+            with self._lock:
+                for segment in segments:
+                    self._segments.remove(segment)
+                    segment.unlink()
+            return len(batch)
+
+    def _apply(self, votes):
+        """Write a batch in one transaction, falling back to one transaction per vote on a conflict.
+
+        A vote that still conflicts on its own, e.g. because its user, question or choice was
+        deleted after it was queued, is logged and dropped so that it cannot hold up the rest.
+        """
+        try:
+            questions = Vote.objects.cast_many(votes)
+        except IntegrityError:
+            logger.warning("Vote batch of %d conflicted, writing it vote by vote.", len(votes))
+            questions = set()
+            for user_id, question_id, choice_id in votes:
+                try:
+                    questions |= Vote.objects.cast_many([(user_id, question_id, choice_id)])
+                except IntegrityError:
+                    logger.error("Dropping queued vote of user %s for choice %s of question %s.",
+                                 user_id, choice_id, question_id, exc_info=True,
+                                 extra={'event': 'vote_dropped', 'user': user_id,
+                                        'question': question_id, 'choice': choice_id})
+        for question_id in questions:
+            invalidate_question(question_id)
+
+    def _is_own_segment(self, path):
+        """Tell whether ``path`` is this buffer's journal or one of its ``<journal>.<n>`` segments.
+
+        Another process's journal whose name merely starts with ours, like ``votes-10`` for
+        ``votes-1``, is left alone.
+        """
+        if path.name == self.journal.name:
+            return True
+        rest = path.name[len(self.journal.name):]
+        return path.name.startswith(self.journal.name + '.') and rest[1:].isdigit()
+
+    def replay(self):
+        """Queue the votes of the journal segments left behind by a stopped or crashed process and write them.
+
+        Segments are read oldest first, so a user's last journaled vote wins. If the write fails the
+        votes stay queued, and their segments kept, until a later flush succeeds. Replay writes the
+        journaled choice even when the user has since voted again through another process, so a
+        stale journal reverts that newer vote: replay it before the process serves votes, and never
+        point two processes at the same JOURNAL.
+        """
+        with self._flush_lock:
+            segments = sorted((path for path in self.journal.parent.glob(f'{self.journal.name}*')
+                               if self._is_own_segment(path)), key=lambda path: path.stat().st_mtime)
+            batch = {}
+            for segment in segments:
+                with open(segment) as journal:
+                    for line in journal:
+                        try:
+                            user_id, question_id, choice_id = json.loads(line)
+                        except ValueError:
+                            logger.warning("Skipping a torn line in vote journal %s.", segment)
+                            continue
+                        batch[user_id, question_id] = choice_id
+            with self._lock:
+                for segment in segments:
+                    if segment != self.journal:
+                        self._segment = max(self._segment, int(segment.suffix[1:]))
+                for segment in segments:
+                    if segment == self.journal:
+                        self._segment += 1
+                        segment = self.journal.with_name(f'{self.journal.name}.{self._segment}')
+                        os.replace(self.journal, segment)
+                    self._segments.append(segment)
+            self._put_back(batch)
+        if batch:
+            logger.info("Replaying %d vote(s) from %d journal segment(s).", len(batch), len(segments))
+        self.flush()
+
+    def _run(self):
+        """Flush whenever the oldest queued vote reaches MAX_LATENCY or a batch fills up."""
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wake.wait()
+                waited = time.monotonic() - self._oldest
+                if waited < self.max_latency and len(self._pending) < self.max_batch:
+                    self._wake.wait(self.max_latency - waited)
+                    continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing queued votes failed, retrying them with the next batch.")
+                time.sleep(self.max_latency)
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return the process-wide vote buffer, started on first use, or None when write-behind is off."""
+    global _buffer
+    options = buffer_settings()
+    if not options['ENABLED']:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            journal = Path(options['JOURNAL'])
+            if not journal.is_absolute():
+                journal = Path(settings.BASE_DIR) / journal
+            _buffer = VoteBuffer(journal, options['MAX_LATENCY'], options['MAX_BATCH'], options['FSYNC'])
+            _buffer.start()
+    return _buffer
+
+
+def flush_pending():
+    """Write this process's queued votes now, e.g. before a poll's results are frozen."""
+    if _buffer is not None:
+        _buffer.flush()
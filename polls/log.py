@@ -0,0 +1,94 @@
+"""Logging helpers for the polls app, wired up by LOGGING in mysite/settings.py.
+
+Request threads only put records on a bounded queue; a background thread formats
+them as JSON lines and writes them. Messages use %-style arguments so they are
+only formatted by that thread, and records of busy events can be sampled.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+#: Extra record attributes copied into the JSON line when present.
+FIELDS = ('event', 'user', 'ip', 'question', 'choice', 'latency_ms')
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        """Return the record, its message and its structured fields as JSON."""
+        data = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S%z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a share of the records of high-volume events.
+
+    ``rates`` maps an ``event`` name to the share of its records to keep, e.g. ``{'vote': 0.1}``.
+    Records of other events, and warnings and errors, are always kept.
+    """
+
+    def __init__(self, rates=None):
+        """Use the given sampling rates."""
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        """Decide whether the record is kept."""
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """Queue records for a writer thread instead of writing them in the calling thread.
+
+    Records are dropped, and counted in ``dropped``, when the queue is full rather than
+    blocking the request. ``filename`` writes to a file, otherwise to stderr.
+    """
+
+    def __init__(self, filename=None, maxsize=10000):
+        """Start the writer thread."""
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.FileHandler(filename) if filename else logging.StreamHandler(sys.stderr)
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        """Format in the writer thread, with the target handler."""
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """Hand the record over unformatted, so that formatting happens in the writer thread."""
+        return record
+
+    def enqueue(self, record):
+        """Queue the record, dropping it if the writer is too far behind."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write out what is queued and stop the writer thread."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,35 @@
+"""Move the votes of long-closed polls to archive files."""
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.archive import archivable, archive_polls, archive_settings
+
+
+class Command(BaseCommand):
+    """Archive the raw votes of polls closed for longer than the grace period."""
+
+    help = ("Write the votes of polls closed more than --grace-days ago to compressed files in --directory, "
+            "keep their final counts per choice and delete the votes from the database in batches. "
+            "The files can be loaded again with import_polls.")
+
+    def add_arguments(self, parser):
+        """Default to the POLLS_ARCHIVE setting."""
+        options = archive_settings()
+        parser.add_argument('--grace-days', type=int, default=options['GRACE_DAYS'])
+        parser.add_argument('--directory', default=str(options['DIRECTORY']))
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'],
+                            help="Votes deleted per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the polls that would be archived.")
+
+    def handle(self, *args, **options):
+        """Archive the polls, then delete their votes."""
+        if options['grace_days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--grace-days can't be negative and --batch-size must be positive.")
+        if options['dry_run']:
+            for question in archivable(options['grace_days']).order_by('pk'):
+                self.stdout.write(f"{question.pk}\t{question.end_date:%Y-%m-%d}\t{question}")
+            return
+        questions, archived, deleted = archive_polls(options['grace_days'], options['directory'],
+                                                     options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {questions} poll(s) and {archived} vote(s) to {options['directory']}; "
+            f"deleted {deleted} vote row(s)."))
@@ -0,0 +1,113 @@
+"""Compare the login plus first vote flow on Django's default auth path and on the configured one."""
+import datetime
+import json
+import tempfile
+import threading
+
+from django.conf import global_settings, settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import benchmark
+from polls.auth import LOCAL_BACKENDS, auth_settings, user_cache
+from polls.models import Question
+
+PASSWORD = 'bench-login-password'
+
+#: Django's defaults: database sessions, uncached users and the default PBKDF2 cost.
+BEFORE = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    'PASSWORD_HASHERS': global_settings.PASSWORD_HASHERS,
+}
+
+
+class Command(BaseCommand):
+    """Log in, open a poll and vote on it as a new user per flow, once per auth profile."""
+
+    help = ("Measure the login + detail page + first vote flow with Django's default session, user and "
+            "password hashing setup ('before') and with cached sessions and users ('after'). The 'after' "
+            "profile uses the configured USER_CACHE, or a temporary file cache when that one is local to "
+            "the process. The temporary question, users and cache are deleted afterwards.")
+
+    def add_arguments(self, parser):
+        """Configure the load."""
+        parser.add_argument('--logins', type=int, default=200, help="Flows per profile, one per user.")
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--iterations', type=int, help="PBKDF2 rounds of the 'after' profile.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def after_profile(self, directory, options):
+        """Return the settings of the 'after' profile: sessions and users in a cache shared by the workers."""
+        alias, caches = auth_settings()['USER_CACHE'], settings.CACHES
+        if caches[alias]['BACKEND'] in LOCAL_BACKENDS:
+            alias = 'bench-login'
+            caches = {**caches, alias: {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                        'LOCATION': directory}}
+            self.stderr.write(f"USER_CACHE is local to the process; caching sessions and users in {directory}.")
+        after = {
+            'CACHES': caches,
+            'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+            'SESSION_CACHE_ALIAS': alias,
+            'POLLS_AUTH': {**auth_settings(), 'USER_CACHE_ENABLED': True, 'USER_CACHE': alias},
+        }
+        if options['iterations']:
+            after['POLLS_AUTH']['PASSWORD_ITERATIONS'] = options['iterations']
+        return after
+
+    def handle(self, *args, **options):
+        """Run both profiles and report."""
+        directory = tempfile.TemporaryDirectory()
+        after = self.after_profile(directory.name, options)
+        now = timezone.now()
+        question = Question.objects.create(question_text="Login benchmark?",
+                                           pub_date=now - datetime.timedelta(days=1),
+                                           end_date=now + datetime.timedelta(days=1))
+        self.choice = question.choice_set.create(choice_text='Yes')
+        self.question = question
+        results = {}
+        try:
+            for name, profile in (('before', BEFORE), ('after', after)):
+                with override_settings(ALLOWED_HOSTS=['testserver'], POLLS_THROTTLE={'ENABLED': False}, **profile):
+                    if profile is after and user_cache() is None:
+                        raise CommandError("The 'after' profile would not cache users.")
+                    results[name] = self.run_profile(options)
+        finally:
+            question.delete()
+            directory.cleanup()
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(benchmark.format_table(results))
+
+    def run_profile(self, options):
+        """Create users hashed with the profile's hasher, run the flows and return the statistics."""
+        prefix = 'login-bench-user-'
+        User.objects.filter(username__startswith=prefix).delete()
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(User(username=f'{prefix}{n}', password=password) for n in range(options['logins']))
+        users = iter(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+        lock = threading.Lock()
+        login, detail = reverse('login'), reverse('polls:detail', args=(self.question.pk,))
+        vote = reverse('polls:vote', args=(self.question.pk,))
+
+        def make_worker():
+            def worker(n):
+                with lock:
+                    username = next(users)
+                client = Client()
+                if client.post(login, {'username': username, 'password': PASSWORD}).status_code != 302:
+                    return False
+                if client.get(detail).status_code != 200:
+                    return False
+                return client.post(vote, {'choice': self.choice.pk}).status_code == 302
+            return worker
+
+        try:
+            return benchmark.run_load(make_worker, options['logins'], options['threads'])
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
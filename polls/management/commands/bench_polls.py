@@ -0,0 +1,109 @@
+"""Benchmark the poll pages and the vote endpoint against the current database."""
+import itertools
+import json
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from polls import benchmark
+from polls.models import Choice, Question
+
+ENDPOINTS = ('index', 'detail', 'results', 'vote')
+
+
+class Command(BaseCommand):
+    """Drive the views in-process with one Django test client per thread."""
+
+    help = ("Measure p50/p95/p99 latency, throughput and queries per request of the index, detail, "
+            "results and vote endpoints, optionally against a stored baseline. Run seed_polls first.")
+
+    def add_arguments(self, parser):
+        """Configure the load and the baseline handling."""
+        parser.add_argument('endpoints', nargs='*', help=f"Endpoints to run, among {', '.join(ENDPOINTS)}.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint.")
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--users-prefix', default='seed', help="Vote as the users created by seed_polls.")
+        parser.add_argument('--baseline', help="Compare with this baseline file and fail on regressions.")
+        parser.add_argument('--save-baseline', help="Write the results to this baseline file.")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown, as a share.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        """Run the endpoints one after the other and report."""
+        endpoints = options['endpoints'] or ENDPOINTS
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}.")
+        questions = list(Question.objects.published().values_list('pk', flat=True))
+        open_questions = list(Question.objects.published().open().filter(choice__isnull=False)
+                              .values_list('pk', flat=True).distinct())
+        users = list(User.objects.filter(username__startswith=f"{options['users_prefix']}-user-"))
+        if not questions:
+            raise CommandError("No published questions; run seed_polls first.")
+        self.choices = {}
+        for question_id, choice_id in Choice.objects.filter(question__in=open_questions).values_list(
+                'question_id', 'pk'):
+            self.choices.setdefault(question_id, []).append(choice_id)
+        self.questions, self.open_questions, self.users = questions, open_questions, itertools.cycle(users)
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver'], POLLS_THROTTLE={'ENABLED': False}):
+            for endpoint in endpoints:
+                if endpoint == 'vote' and not (open_questions and users):
+                    self.stderr.write("Skipping vote: it needs open questions and seeded users.")
+                    continue
+                results[endpoint] = benchmark.run_load(
+                    getattr(self, f'{endpoint}_worker'), options['requests'], options['threads'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(benchmark.format_table(results))
+        if options['save_baseline']:
+            benchmark.save_baseline(options['save_baseline'], results)
+            self.stdout.write(f"Saved the baseline to {options['save_baseline']}.")
+        if options['baseline']:
+            regressions = benchmark.compare(results, benchmark.load_baseline(options['baseline']),
+                                            options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n  " + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def get_worker(self, url_for):
+        """Return a worker that GETs ``url_for(n)`` and checks for a successful response."""
+        client = Client()
+
+        def worker(n):
+            return client.get(url_for(n)).status_code == 200
+
+        return worker
+
+    def index_worker(self):
+        """Request the first index page, with each status filter in turn."""
+        statuses = ('all', 'open', 'closed')
+        return self.get_worker(lambda n: reverse('polls:index') + f'?status={statuses[n % 3]}')
+
+    def detail_worker(self):
+        """Request the detail page of random open questions."""
+        pool = self.open_questions or self.questions
+        return self.get_worker(lambda n: reverse('polls:detail', args=(random.choice(pool),)))
+
+    def results_worker(self):
+        """Request the results page of random questions, open and closed."""
+        return self.get_worker(lambda n: reverse('polls:results', args=(random.choice(self.questions),)))
+
+    def vote_worker(self):
+        """Vote on random open questions as one seeded user per thread."""
+        client = Client()
+        client.force_login(next(self.users))
+
+        def worker(n):
+            question = random.choice(self.open_questions)
+            response = client.post(reverse('polls:vote', args=(question,)),
+                                   {'choice': random.choice(self.choices[question])})
+            return response.status_code == 302
+
+        return worker
@@ -0,0 +1,73 @@
+"""Compare vote throughput on one hot question with single-row and sharded counters."""
+import datetime
+import json
+import threading
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from polls import benchmark
+from polls.models import Question, Vote
+
+
+class Command(BaseCommand):
+    """Cast votes from many threads on one question, once per counter mode."""
+
+    help = ("Measure votes per second on a single hot question with 1 counter row per choice and with "
+            "--shards rows per choice. The temporary question and users are deleted afterwards.")
+
+    def add_arguments(self, parser):
+        """Configure the load."""
+        parser.add_argument('--votes', type=int, default=2000, help="Votes per mode, one per user.")
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--shards', type=int, default=16)
+        parser.add_argument('--choices', type=int, default=2)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        """Run both modes and check that no vote was lost."""
+        if not 1 < options['shards'] <= 64:
+            raise CommandError("--shards must be between 2 and 64.")
+        prefix = 'shard-bench-user-'
+        User.objects.filter(username__startswith=prefix).delete()
+        password = make_password(None)
+        User.objects.bulk_create(User(username=f'{prefix}{n}', password=password) for n in range(options['votes']))
+        users = list(User.objects.filter(username__startswith=prefix))
+        results = {}
+        try:
+            for name, shards in (('single', 1), ('sharded', options['shards'])):
+                results[name] = self.run_mode(shards, users, options)
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(benchmark.format_table(results))
+
+    def run_mode(self, shards, users, options):
+        """Vote once per user on a fresh question with ``shards`` counter shards and return the statistics."""
+        now = timezone.now()
+        question = Question.objects.create(question_text="Shard benchmark?", counter_shards=shards,
+                                           pub_date=now - datetime.timedelta(days=1),
+                                           end_date=now + datetime.timedelta(days=1))
+        choices = [question.choice_set.create(choice_text=f'Choice {n}') for n in range(options['choices'])]
+        voters, lock = iter(users), threading.Lock()
+
+        def make_worker():
+            def worker(n):
+                with lock:
+                    user = next(voters)
+                Vote.objects.cast(user, question, choices[user.pk % len(choices)])
+            return worker
+
+        try:
+            stats = benchmark.run_load(make_worker, len(users), options['threads'])
+            question = Question.objects.get(pk=question.pk)
+            counted = question.results()['total_votes']
+            if counted != stats['requests'] - stats['errors']:
+                raise CommandError(f"Counted {counted} votes for {stats['requests'] - stats['errors']} cast.")
+            return stats
+        finally:
+            question.delete()
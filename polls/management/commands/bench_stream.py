@@ -0,0 +1,90 @@
+"""Measure how many live results connections one process sustains."""
+import asyncio
+import resource
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls.streaming import TallyFeed, send_events, stream_settings
+
+
+class BenchClient:
+    """In-memory SSE client that records how long each event took to arrive after its tick."""
+
+    def __init__(self, ticks):
+        """Share the tick timestamps written by the synthetic reader."""
+        self.ticks = ticks
+        self.lags = []
+        self.gone = asyncio.Event()
+
+    async def receive(self):
+        """Hang up when the benchmark level ends."""
+        await self.gone.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        """Record the delay since the latest tick for every tally event."""
+        if message.get('body', b'').startswith(b'event: tally'):
+            self.lags.append(time.perf_counter() - self.ticks[-1])
+
+
+class Command(BaseCommand):
+    """Open growing numbers of in-process stream connections and report fan-out latency."""
+
+    help = ("Benchmark the live results stream: connections per process, events per second and "
+            "tick-to-client latency, with a vote on every question on every tick (worst case).")
+
+    def add_arguments(self, parser):
+        """Configure the connection levels and how long each one runs."""
+        parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000, 5000, 10000])
+        parser.add_argument('--questions', type=int, default=10, help="Spread the clients over this many polls.")
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rate', type=float, default=stream_settings()['MAX_UPDATES_PER_SECOND'],
+                            help="Updates per second (defaults to POLLS_STREAM['MAX_UPDATES_PER_SECOND']).")
+
+    def handle(self, *args, **options):
+        """Run every level and print one line per level."""
+        interval = 1 / options['rate']
+        self.stdout.write(f"{'clients':>8} {'connect s':>10} {'events/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+                          f"{'reads/tick':>10} {'max RSS MB':>10}  sustained")
+        for clients in options['clients']:
+            row = asyncio.run(self.run_level(clients, options['questions'], options['seconds'], options['rate']))
+            sustained = 'yes' if row['p99'] < interval and row['events'] else 'no'
+            self.stdout.write(f"{clients:>8} {row['connect']:>10.2f} {row['events']:>10.0f} "
+                              f"{row['p50'] * 1000:>8.1f} {row['p99'] * 1000:>8.1f} {row['reads']:>10.2f} "
+                              f"{row['rss']:>10.1f}  {sustained}")
+
+    async def run_level(self, clients, questions, seconds, rate):
+        """Connect ``clients`` subscribers, run for ``seconds`` and return the measurements."""
+        ticks, counts = [time.perf_counter()], {}
+
+        def reader(question_ids, stamps):
+            ticks.append(time.perf_counter())
+            for question_id in question_ids:
+                counts[question_id] = counts.get(question_id, 0) + 1
+            return {pk: (counts[pk], {pk * 10: counts[pk]}) for pk in question_ids}
+
+        feed = TallyFeed(rate, reader=reader)
+        bench_clients = [BenchClient(ticks) for _ in range(clients)]
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(send_events(client.receive, client.send, 1 + i % questions, feed))
+                 for i, client in enumerate(bench_clients)]
+        while sum(len(watchers) for watchers in feed.subscribers.values()) < clients:
+            await asyncio.sleep(0.01)
+        connect = time.perf_counter() - started
+        reads_before, ticks_before = len(ticks), feed.ticks
+        await asyncio.sleep(seconds)
+        reads = (len(ticks) - reads_before) / max(feed.ticks - ticks_before, 1)
+        for client in bench_clients:
+            client.gone.set()
+        await asyncio.gather(*tasks)
+        lags = sorted(lag for client in bench_clients for lag in client.lags)
+        return {
+            'connect': connect,
+            'events': len(lags) / seconds,
+            'p50': statistics.median(lags) if lags else 0,
+            'p99': lags[int(len(lags) * 0.99)] if lags else 0,
+            'reads': reads,
+            'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
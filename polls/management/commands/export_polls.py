@@ -0,0 +1,38 @@
+"""Write every question, choice and vote to a JSON lines or CSV file."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import transfer
+
+
+class Command(BaseCommand):
+    """Stream the poll tables to a file, reading them in chunks."""
+
+    help = ("Export questions, choices and votes as JSON lines or CSV with constant memory. "
+            "A .gz file name compresses the output; '-' writes to stdout.")
+
+    def add_arguments(self, parser):
+        """Configure the output file, its format and the read chunk size."""
+        parser.add_argument('output', nargs='?', default='-', help="File to write, '-' for stdout.")
+        parser.add_argument('--format', choices=transfer.FORMATS,
+                            help="Output format; guessed from the file name by default.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        """Write the records and report the throughput."""
+        path = options['output']
+        fmt = options['format'] or transfer.guess_format(path)
+        started = time.perf_counter()
+        stream = transfer.open_stream(path, 'w')
+        try:
+            counts = transfer.write_records(stream, transfer.export_records(options['chunk_size']), fmt)
+        finally:
+            if path != '-':
+                stream.close()
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        report = self.stderr if path == '-' else self.stdout
+        report.write(self.style.SUCCESS(
+            f"Exported {counts['question']} questions, {counts['choice']} choices and {counts['vote']} votes "
+            f"in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} records/s)."))
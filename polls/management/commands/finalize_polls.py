@@ -0,0 +1,20 @@
+"""Freeze the results of closed polls."""
+from django.core.management.base import BaseCommand
+
+from polls.models import Question
+from polls.snapshots import finalize
+
+
+class Command(BaseCommand):
+    """Create the result snapshot of every closed poll that doesn't have one yet."""
+
+    help = "Freeze the final tallies and rendered results page of closed polls."
+
+    def handle(self, *args, **options):
+        """Finalize the closed questions one by one."""
+        questions = Question.objects.published().closed().filter(snapshot__isnull=True)
+        count = 0
+        for question in questions.iterator():
+            finalize(question)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Finalized {count} poll(s)."))
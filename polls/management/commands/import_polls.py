@@ -0,0 +1,66 @@
+"""Load questions, choices and votes from a file written by export_polls."""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from polls import transfer
+from polls.cache import invalidate_all
+
+
+class Command(BaseCommand):
+    """Stream a file into the poll tables in batches, one transaction per batch."""
+
+    help = ("Import questions, choices and votes from JSON lines or CSV with constant memory. "
+            "Progress is recorded in a checkpoint file after every batch, so an interrupted "
+            "import resumes where it stopped when run again.")
+
+    def add_arguments(self, parser):
+        """Configure the input file, its format, the batch size and the checkpoint."""
+        parser.add_argument('input', help="File to read, '-' for stdin.")
+        parser.add_argument('--format', choices=transfer.FORMATS,
+                            help="Input format; guessed from the file name by default.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Records saved per transaction.")
+        parser.add_argument('--checkpoint', help="Progress file; defaults to <input>.progress for files.")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        """Import the records, resuming from the checkpoint, and report the throughput."""
+        path = options['input']
+        fmt = options['format'] or transfer.guess_format(path)
+        checkpoint = options['checkpoint'] or (None if path == '-' else f'{path}.progress')
+        skip = 0
+        if checkpoint and os.path.exists(checkpoint) and not options['restart']:
+            with open(checkpoint) as progress:
+                skip = int(progress.read().strip() or 0)
+            self.stdout.write(f"Resuming after {skip} records.")
+
+        def save_progress(done):
+            with open(checkpoint, 'w') as progress:
+                progress.write(str(done))
+
+        started = time.perf_counter()
+        try:
+            stream = transfer.open_stream(path, 'r')
+        except OSError as error:
+            raise CommandError(error)
+        try:
+            counts = transfer.import_records(transfer.read_records(stream, fmt), options['batch_size'], skip,
+                                             save_progress if checkpoint else None)
+        except (ValueError, DatabaseError) as error:
+            raise CommandError(f"{error} The batches saved so far are kept; run the command again to resume.")
+        finally:
+            if path != '-':
+                stream.close()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        invalidate_all()
+
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['question']} questions, {counts['choice']} choices and {counts['vote']} votes "
+            f"in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} records/s)."))
+        if counts['unknown_user']:
+            self.stderr.write(f"Skipped {counts['unknown_user']} votes of users that do not exist here.")
@@ -0,0 +1,28 @@
+"""Recompute the stored vote tallies from the votes."""
+from django.core.management.base import BaseCommand
+
+from polls.cache import invalidate_all
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    """Rebuild the vote tallies of every question, or only the given ones."""
+
+    help = "Recompute Choice.vote_count and Question.total_votes from the Vote table."
+
+    def add_arguments(self, parser):
+        """Accept an optional list of question ids."""
+        parser.add_argument('question_ids', nargs='*', type=int, help="Only rebuild these questions.")
+        parser.add_argument('--rollups', action='store_true',
+                            help="Also rebuild the vote rollups, e.g. after writing votes in bulk.")
+
+    def handle(self, *args, **options):
+        """Run the bulk recount."""
+        questions = Question.objects.all()
+        if options['question_ids']:
+            questions = questions.filter(pk__in=options['question_ids'])
+        updated = questions.rebuild_tallies()
+        if options['rollups']:
+            questions.rebuild_rollups()
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt tallies for {updated} question(s)."))
@@ -0,0 +1,47 @@
+"""Check the vote tallies against the votes, a slice of the questions at a time."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.metrics import metrics_settings, registry
+from polls.reconcile import reconcile, reconcile_settings
+
+
+class Command(BaseCommand):
+    """Find and repair tallies, rollups and cached pages that drifted from the Vote rows."""
+
+    help = ("Check up to --max-questions questions after the last checkpoint against their votes, repair "
+            "the drifted ones and report what was found. With --loop, keep going every --interval seconds.")
+
+    def add_arguments(self, parser):
+        """Default to the POLLS_RECONCILE setting."""
+        options = reconcile_settings()
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument('--max-questions', type=int, default=options['MAX_QUESTIONS'],
+                            help="Questions checked per run.")
+        parser.add_argument('--checkpoint', default=str(options['CHECKPOINT']))
+        parser.add_argument('--dry-run', action='store_true', help="Only report the drift.")
+        parser.add_argument('--loop', action='store_true', help="Run until interrupted.")
+        parser.add_argument('--interval', type=float, default=60, help="Seconds between two runs with --loop.")
+
+    def handle(self, *args, **options):
+        """Run once, or in a loop."""
+        if options['batch_size'] < 1 or options['max_questions'] < 1:
+            raise CommandError("--batch-size and --max-questions must be positive.")
+        try:
+            while True:
+                totals = reconcile(options['checkpoint'], options['batch_size'], options['max_questions'],
+                                   fix=not options['dry_run'])
+                directory = metrics_settings()['DIR']
+                if directory:
+                    registry.maybe_dump(directory, 0)
+                self.stdout.write(
+                    f"Checked {totals['questions_checked']} question(s): {totals['choices']} choice and "
+                    f"{totals['questions']} question tallies off by {totals['votes']} vote(s) in all, "
+                    f"{totals['rollups']} rollup(s) and {totals['stray_votes']} stray vote(s); "
+                    f"repaired {totals['questions_repaired']} question(s).")
+                if not options['loop']:
+                    return
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
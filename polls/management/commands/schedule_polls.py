@@ -0,0 +1,36 @@
+"""Open and close polls on time, with warm caches."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls.scheduler import run_transitions, scheduler_settings, seconds_to_wait
+
+
+class Command(BaseCommand):
+    """Run the scheduled transitions of the polls, once or as a long-running worker."""
+
+    help = ("Warm the cached pages of polls about to open, store the status of polls that opened or "
+            "closed and freeze the results of closed polls. Runs until interrupted unless --once is given. "
+            "Warming reaches the web workers only through a shared poll cache backend.")
+
+    def add_arguments(self, parser):
+        """Default to the POLLS_SCHEDULER setting."""
+        options = scheduler_settings()
+        parser.add_argument('--once', action='store_true', help="Run one pass and exit, e.g. from cron.")
+        parser.add_argument('--lead', type=float, default=options['LEAD'],
+                            help="Seconds before pub_date to warm a poll's pages.")
+        parser.add_argument('--interval', type=float, default=options['INTERVAL'],
+                            help="Longest sleep between two passes, in seconds.")
+
+    def handle(self, *args, **options):
+        """Run passes until interrupted."""
+        try:
+            while True:
+                counts = run_transitions(options['lead'])
+                if any(counts.values()) or options['once']:
+                    self.stdout.write("Warmed {warmed}, opened {opened} and closed {closed} poll(s).".format(**counts))
+                if options['once']:
+                    return
+                time.sleep(seconds_to_wait(options['lead'], options['interval']))
+        except KeyboardInterrupt:
+            pass
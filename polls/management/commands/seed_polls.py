@@ -0,0 +1,95 @@
+"""Fill the database with generated users, polls and votes for load testing."""
+import datetime
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from polls.cache import invalidate_all
+from polls.models import Choice, Question, Vote
+
+
+class Command(BaseCommand):
+    """Create users, questions, choices and votes in bulk."""
+
+    help = "Generate users, questions, choices and votes with bulk inserts, for benchmarks."
+
+    def add_arguments(self, parser):
+        """Configure how much data to generate."""
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--questions', type=int, default=200)
+        parser.add_argument('--choices', type=int, default=4, help="Choices per question.")
+        parser.add_argument('--votes', type=int, default=200, help="Votes per question, at most one per user.")
+        parser.add_argument('--open-ratio', type=float, default=0.5, help="Share of the questions still open.")
+        parser.add_argument('--password', default='seed-password', help="Password of every generated user.")
+        parser.add_argument('--prefix', default='seed', help="Prefix of the generated usernames and questions.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None, help="Random seed, for repeatable data.")
+
+    def handle(self, *args, **options):
+        """Generate everything and report how long it took."""
+        rng = random.Random(options['seed'])
+        batch, prefix = options['batch_size'], options['prefix']
+        started = time.perf_counter()
+
+        password = make_password(options['password'])
+        existing = User.objects.filter(username__startswith=f'{prefix}-user-').count()
+        User.objects.bulk_create(
+            (User(username=f'{prefix}-user-{existing + n}', password=password) for n in range(options['users'])),
+            batch_size=batch)
+        users = list(User.objects.filter(username__startswith=f'{prefix}-user-').values_list('pk', flat=True))
+
+        now = timezone.now()
+        questions = []
+        for n in range(options['questions']):
+            pub_date = now - datetime.timedelta(days=rng.uniform(1, 365))
+            is_open = rng.random() < options['open_ratio']
+            end_date = now + datetime.timedelta(days=rng.uniform(1, 30)) if is_open else pub_date
+            questions.append(Question(question_text=f'{prefix} question {n}?', pub_date=pub_date, end_date=end_date))
+        with transaction.atomic():
+            questions = Question.objects.bulk_create(questions, batch_size=batch)
+        if not questions or questions[0].pk is None:
+            questions = list(Question.objects.filter(question_text__startswith=f'{prefix} question ')
+                             .order_by('-pk')[:options['questions']])
+
+        with transaction.atomic():
+            Choice.objects.bulk_create(
+                (Choice(question=question, choice_text=f'Choice {n}')
+                 for question in questions for n in range(options['choices'])),
+                batch_size=batch)
+        choices = {}
+        for question_id, choice_id in Choice.objects.filter(question__in=questions).values_list('question_id', 'pk'):
+            choices.setdefault(question_id, []).append(choice_id)
+
+        votes = 0
+        pending = []
+        for question in questions:
+            if question.pk not in choices:
+                continue
+            window = min(question.end_date, now) - question.pub_date
+            for user_id in rng.sample(users, min(options['votes'], len(users))):
+                cast_at = question.pub_date + window * rng.random()
+                pending.append(Vote(user_id=user_id, question=question, choice_id=rng.choice(choices[question.pk]),
+                                    created_at=cast_at, updated_at=cast_at))
+            if len(pending) >= batch:
+                with transaction.atomic():
+                    Vote.objects.bulk_create(pending, batch_size=batch, ignore_conflicts=True)
+                votes += len(pending)
+                pending = []
+        with transaction.atomic():
+            Vote.objects.bulk_create(pending, batch_size=batch, ignore_conflicts=True)
+        votes += len(pending)
+
+        seeded = Question.objects.filter(pk__in=[question.pk for question in questions])
+        seeded.refresh_status()
+        seeded.rebuild_tallies()
+        seeded.rebuild_rollups()
+        invalidate_all()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {options['users']} users, {len(questions)} questions, "
+            f"{len(questions) * options['choices']} choices and {votes} votes in {elapsed:.1f}s."))
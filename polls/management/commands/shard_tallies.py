@@ -0,0 +1,38 @@
+"""Change how many counter shards busy questions use, or fold them back into the tallies."""
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.cache import invalidate, invalidate_question
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    """Set Question.counter_shards, folding the existing shards first."""
+
+    help = ("Spread the vote counters of the given questions over --shards rows per choice, or with "
+            "--fold-closed fold the shards of every closed question back into its tallies.")
+
+    def add_arguments(self, parser):
+        """Accept the questions and the number of shards."""
+        parser.add_argument('question_ids', nargs='*', type=int, help="Questions to change.")
+        parser.add_argument('--shards', type=int, help="Counter shards per choice, 1 to stop sharding.")
+        parser.add_argument('--fold-closed', action='store_true',
+                            help="Fold the shards of the closed questions and set them back to 1 shard.")
+
+    def handle(self, *args, **options):
+        """Fold and update the counter shards."""
+        if options['fold_closed']:
+            questions = Question.objects.closed().filter(counter_shards__gt=1)
+            shards = 1
+        elif options['question_ids'] and options['shards']:
+            if not 1 <= options['shards'] <= 64:
+                raise CommandError("--shards must be between 1 and 64.")
+            questions = Question.objects.filter(pk__in=options['question_ids'])
+            shards = options['shards']
+        else:
+            raise CommandError("Give question ids and --shards, or --fold-closed.")
+        ids = list(questions.values_list('pk', flat=True))
+        Question.objects.filter(pk__in=ids).set_counter_shards(shards)
+        invalidate('shards')
+        for pk in ids:
+            invalidate_question(pk)
+        self.stdout.write(self.style.SUCCESS(f"Set {len(ids)} question(s) to {shards} counter shard(s)."))
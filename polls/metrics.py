@@ -0,0 +1,203 @@
+"""Request metrics in Prometheus text format.
+
+Counters and histograms live in a per-process Registry. With POLLS_METRICS['DIR'] set,
+every process writes its registry to ``<DIR>/<pid>.json`` at most once per
+DUMP_INTERVAL seconds, and /metrics adds up the files of all processes, so the
+numbers cover every worker whichever one answers the scrape. /metrics is only routed
+while metrics are enabled, and only answers staff users, the ALLOWED_IPS and
+scrapers sending ``Authorization: Bearer <TOKEN>``.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .cache import poll_cache
+from .views import get_client_ip
+
+DEFAULTS = {
+    'ENABLED': False,
+    'DIR': '',
+    'DUMP_INTERVAL': 1.0,
+    'ALLOWED_IPS': (),
+    'TOKEN': '',
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'polls_http_requests_total': "Requests answered, by URL name, method and status.",
+    'polls_http_request_duration_seconds': "Time spent answering requests, by URL name.",
+    'polls_db_queries_total': "SQL queries issued while answering requests, by URL name.",
+    'polls_db_query_duration_seconds_total': "Time spent in SQL queries while answering requests, by URL name.",
+    'polls_template_render_seconds': "Time spent rendering template responses, by URL name.",
+    'polls_cache_requests_total': "Poll cache lookups, by view and result.",
+    'polls_throttled_total': "Requests refused by the rate limits and load shedding, by URL name and reason.",
+    'polls_reconcile_questions_total': "Questions checked by the tally reconciliation.",
+    'polls_tally_drift_total': "Drifted rows found by the tally reconciliation, by kind.",
+    'polls_tally_drift_votes_total': "Votes of difference between the stored and the recounted tallies.",
+}
+
+
+def metrics_settings():
+    """Return the POLLS_METRICS setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_METRICS', {})}
+
+
+class Registry:
+    """Thread-safe counters and fixed-bucket histograms, keyed by name and labels."""
+
+    def __init__(self):
+        """Start empty."""
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._dumped = 0.0
+
+    def inc(self, name, value=1, **labels):
+        """Add ``value`` to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += value
+
+    def set(self, name, value, **labels):
+        """Set a counter kept elsewhere, such as the poll cache hit counters."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = value
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            histogram[bisect.bisect_left(BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        """Return the registry as JSON-friendly data."""
+        with self._lock:
+            counters = [[name, dict(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, dict(labels), list(values)] for (name, labels), values in self.histograms.items()]
+        return {'counters': counters, 'histograms': histograms}
+
+    def clear(self):
+        """Forget every value."""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def maybe_dump(self, directory, interval):
+        """Write this process's snapshot to the directory if the last write is older than ``interval``."""
+        now = time.monotonic()
+        if now - self._dumped < interval:
+            return
+        self._dumped = now
+        sync_cache_counters()
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        temporary = directory / f'.{os.getpid()}.json.tmp'
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, directory / f'{os.getpid()}.json')
+
+
+registry = Registry()
+
+
+def merge(snapshots):
+    """Add up snapshots of several processes into one."""
+    counters, histograms = defaultdict(float), {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[name, tuple(sorted(labels.items()))] += value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+    return counters, histograms
+
+
+def sync_cache_counters():
+    """Copy the poll cache hit/miss counters of this process into the registry."""
+    for (view, result), value in list(poll_cache.counters.items()):
+        registry.set('polls_cache_requests_total', value, view=view, result=result)
+
+
+def collect():
+    """Return the merged counters and histograms of every process that dumped to the metrics directory."""
+    directory = metrics_settings()['DIR']
+    if not directory:
+        sync_cache_counters()
+        return merge([registry.snapshot()])
+    registry.maybe_dump(directory, 0)
+    snapshots = []
+    for path in Path(directory).glob('*.json'):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return merge(snapshots)
+
+
+def format_labels(labels, **extra):
+    """Render labels as ``{a="1",b="2"}``."""
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(counters, histograms):
+    """Render counters and histograms in the Prometheus text exposition format."""
+    lines = []
+    for kind, family in (('counter', counters), ('histogram', histograms)):
+        for name in sorted({name for name, _ in family}):
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(family.items()):
+                if metric != name:
+                    continue
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {value:g}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative:g}')
+                lines.append(f'{name}_sum{format_labels(labels)} {value[-1]:g}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def can_scrape(request):
+    """Return True for staff users, the ALLOWED_IPS and requests bearing the TOKEN."""
+    options = metrics_settings()
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    if get_client_ip(request) in options['ALLOWED_IPS']:
+        return True
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(options['TOKEN']) and scheme.lower() == 'bearer' and constant_time_compare(token, options['TOKEN'])
+
+
+def metrics_view(request):
+    """Expose the aggregated metrics to a Prometheus scraper."""
+    if not metrics_settings()['ENABLED']:
+        raise Http404
+    if not can_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(*collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,182 @@
+"""Middleware of the polls app."""
+import threading
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+from .db import Route, current_route, database_settings, replica_alias
+from .ingest import get_buffer
+from .metrics import metrics_settings, registry
+from .throttle import VIEW_DEFAULTS, RateLimiter, client_key, parse_rate, throttle_settings
+from .views import get_client_ip
+
+
+class QueryTimer:
+    """Database execute wrapper that counts queries and adds up their duration."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time the query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Record latency, SQL queries, DB time and template render time per URL name.
+
+    Removes itself from the chain when POLLS_METRICS['ENABLED'] is off, so it costs nothing then.
+    """
+
+    def __init__(self, get_response):
+        """Stay out of the way unless metrics are enabled."""
+        options = metrics_settings()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = options['DIR']
+        self.interval = options['DUMP_INTERVAL']
+
+    def __call__(self, request):
+        """Time the request and the queries it runs."""
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        view = self.view_name(request)
+        registry.inc('polls_http_requests_total', view=view, method=request.method,
+                     status=f'{response.status_code // 100}xx')
+        registry.observe('polls_http_request_duration_seconds', elapsed, view=view)
+        registry.inc('polls_db_queries_total', timer.count, view=view)
+        registry.inc('polls_db_query_duration_seconds_total', timer.duration, view=view)
+        if self.directory:
+            registry.maybe_dump(self.directory, self.interval)
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering that follows the template response middleware."""
+        started = time.perf_counter()
+        view = self.view_name(request)
+        response.add_post_render_callback(
+            lambda rendered: registry.observe('polls_template_render_seconds', time.perf_counter() - started,
+                                              view=view))
+        return response
+
+    @staticmethod
+    def view_name(request):
+        """Return the URL name of the request, like ``polls:results``, so that ids don't explode the labels."""
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else 'unmatched'
+
+
+class DatabaseRoutingMiddleware:
+    """Route the reads of read-only views to the replica, with read-your-writes stickiness.
+
+    Removes itself from the chain when no replica is configured.
+    """
+
+    def __init__(self, get_response):
+        """Stay out of the way unless DATABASES has the replica alias."""
+        options = database_settings()
+        self.replica = replica_alias()
+        if not self.replica:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = set(options['REPLICA_VIEWS'])
+        self.sticky_seconds = options['STICKY_SECONDS']
+        self.cookie = options['STICKY_COOKIE']
+
+    def __call__(self, request):
+        """Track the request's route, and pin the client to the primary after a write."""
+        route = Route(self.replica)
+        token = current_route.set(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_route.reset(token)
+        if route.wrote and self.sticky_seconds:
+            response.set_cookie(self.cookie, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Use the replica for safe requests to the read-only views of clients that did not just write."""
+        route = current_route.get()
+        route.use_replica = (request.method in ('GET', 'HEAD') and self.cookie not in request.COOKIES
+                             and request.resolver_match.view_name in self.views)
+
+
+class ThrottleMiddleware:
+    """Refuse requests over their client's rate (429) or beyond what a view can take (503).
+
+    Removes itself from the chain when POLLS_THROTTLE['ENABLED'] is off or no view is listed.
+    """
+
+    def __init__(self, get_response):
+        """Build the limits of the listed views."""
+        options = throttle_settings()
+        if not options['ENABLED'] or not options['VIEWS']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = {name: {**VIEW_DEFAULTS, **view} for name, view in options['VIEWS'].items()}
+        self.limiter = RateLimiter(caches[options['CACHE']])
+        self.slots = {name: threading.BoundedSemaphore(view['CONCURRENCY'])
+                      for name, view in self.views.items() if view['CONCURRENCY']}
+
+    def __call__(self, request):
+        """Give the concurrency slot taken in process_view back once the response is ready."""
+        try:
+            return self.get_response(request)
+        finally:
+            slot = request.__dict__.pop('polls_throttle_slot', None)
+            if slot is not None:
+                slot.release()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Check the rates, the vote backlog and the free slots of the view, in that order."""
+        name = request.resolver_match.view_name
+        view = self.views.get(name)
+        if view is None or request.method not in view['METHODS']:
+            return None
+        session = getattr(request, 'session', None)
+        user_id = session.get(SESSION_KEY) if session is not None else None
+        for key, rate in ((f'user:{user_id}' if user_id else None, view['RATE']),
+                          (f'ip:{client_key(get_client_ip(request) or "")}', view['IP_RATE'])):
+            limit = parse_rate(rate)
+            if key and limit:
+                retry = self.limiter.hit(f'{name}:{key}', *limit)
+                if retry:
+                    return self.refuse(name, 'rate', 429, retry)
+        buffer = get_buffer()
+        if view['MAX_QUEUE'] and buffer and buffer.backlog() >= view['MAX_QUEUE']:
+            return self.refuse(name, 'queue', 503, view['RETRY_AFTER'])
+        slot = self.slots.get(name)
+        if slot is not None:
+            if not slot.acquire(blocking=False):
+                return self.refuse(name, 'concurrency', 503, view['RETRY_AFTER'])
+            request.polls_throttle_slot = slot
+        return None
+
+    @staticmethod
+    def refuse(view, reason, status, retry_after):
+        """Count the refusal and answer with Retry-After."""
+        registry.inc('polls_throttled_total', view=view, reason=reason)
+        message = "Too many requests." if status == 429 else "The server is busy."
+        response = HttpResponse(f"{message} Try again in {retry_after} second(s).", status=status,
+                                content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
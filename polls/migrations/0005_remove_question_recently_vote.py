@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0004_question_recently_vote'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='question',
+            name='recently_vote',
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_tallies(apps, schema_editor):
+    """Count the existing votes into the new tally columns."""
+    Choice = apps.get_model('polls', 'Choice')
+    Question = apps.get_model('polls', 'Question')
+    Vote = apps.get_model('polls', 'Vote')
+
+    def counted(field):
+        votes = Vote.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        return Coalesce(Subquery(votes.annotate(total=Count('*')).values('total')), 0)
+
+    Choice.objects.update(vote_count=counted('choice'))
+    Question.objects.update(total_votes=counted('question'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_remove_question_recently_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='total_votes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_tallies, migrations.RunPython.noop),
+    ]
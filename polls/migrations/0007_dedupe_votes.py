@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def dedupe_votes(apps, schema_editor):
+    """Keep only the latest vote of each user per question and recount the affected tallies."""
+    Choice = apps.get_model('polls', 'Choice')
+    Question = apps.get_model('polls', 'Question')
+    Vote = apps.get_model('polls', 'Vote')
+
+    duplicates = (Vote.objects.order_by().values('user', 'question')
+                  .annotate(rows=Count('id'), keep=Max('id')).filter(rows__gt=1))
+    affected = set()
+    for row in duplicates.iterator():
+        Vote.objects.filter(user=row['user'], question=row['question']).exclude(pk=row['keep']).delete()
+        affected.add(row['question'])
+    if not affected:
+        return
+
+    def counted(field):
+        votes = Vote.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        return Coalesce(Subquery(votes.annotate(total=Count('*')).values('total')), 0)
+
+    Choice.objects.filter(question__in=affected).update(vote_count=counted('choice'))
+    Question.objects.filter(pk__in=affected).update(total_votes=counted('question'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0006_vote_tallies'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_votes, migrations.RunPython.noop),
+    ]
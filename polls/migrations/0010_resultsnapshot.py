@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_question_dates_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultSnapshot',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='polls.question')),
+                ('tallies', models.JSONField(help_text='[[choice id, choice text, votes], ...]')),
+                ('total_votes', models.PositiveIntegerField()),
+                ('html', models.TextField()),
+                ('etag', models.CharField(max_length=66)),
+                ('finalized_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_resultsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='last_vote_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:35
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMinute
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill_rollups(apps, schema_editor):
+    """Count the existing votes, whose time is unknown, at the minute their question was published."""
+    Vote = apps.get_model('polls', 'Vote')
+    VoteRollup = apps.get_model('polls', 'VoteRollup')
+    buckets = (Vote.objects.annotate(bucket=TruncMinute('question__pub_date')).order_by()
+               .values('question_id', 'choice_id', 'bucket').annotate(votes=Count('*')))
+    VoteRollup.objects.bulk_create((VoteRollup(**row) for row in buckets.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_question_last_vote_at'),
+    ]
+
+    operations = [
+        # Added without a default so that the existing votes keep an unknown (NULL) time.
+        migrations.AddField(
+            model_name='vote',
+            name='created_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='updated_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Start of the minute.')),
+                ('votes', models.IntegerField(default=0, help_text='Votes gained minus votes moved to another choice.')),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='voterollup',
+            index=models.Index(fields=['question', 'bucket'], name='polls_rollup_question_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='voterollup',
+            constraint=models.UniqueConstraint(fields=('choice', 'bucket'), name='polls_rollup_unique_choice_bucket'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
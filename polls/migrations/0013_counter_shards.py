@@ -0,0 +1,55 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:41
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0012_vote_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('votes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='voterollup',
+            name='polls_rollup_unique_choice_bucket',
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='counter_shards',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Spread the vote counters of a very busy poll over this many rows per choice.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)]),
+        ),
+        migrations.AddField(
+            model_name='voterollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, help_text="0 unless the question's counters are sharded."),
+        ),
+        migrations.AddConstraint(
+            model_name='voterollup',
+            constraint=models.UniqueConstraint(fields=('choice', 'bucket', 'shard'), name='polls_rollup_unique_bucket_shard'),
+        ),
+        migrations.AddField(
+            model_name='choiceshard',
+            name='choice',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.choice'),
+        ),
+        migrations.AddField(
+            model_name='choiceshard',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.AddConstraint(
+            model_name='choiceshard',
+            constraint=models.UniqueConstraint(fields=('choice', 'shard'), name='polls_shard_unique_choice_shard'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_counter_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the votes were moved out of the Vote table; the results come from ArchivedTally.', null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedTally',
+            fields=[
+                ('choice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archived_tally', serialize=False, to='polls.choice')),
+                ('votes', models.PositiveIntegerField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:50
+
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+
+def fill_status(apps, schema_editor):
+    """Store the current status of the existing questions."""
+    Question = apps.get_model('polls', 'Question')
+    now = timezone.now()
+    is_open = Q(end_date__gte=now) & Q(end_date__gte=F('pub_date')) & Q(archived_at__isnull=True)
+    Question.objects.update(status=Case(When(pub_date__gt=now, then=Value('scheduled')),
+                                        When(is_open, then=Value('open')),
+                                        default=Value('closed')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0014_vote_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('open', 'Open'), ('closed', 'Closed')], default='scheduled', editable=False, max_length=9),
+        ),
+        migrations.RunPython(fill_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['status', 'pub_date'], name='polls_question_status'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0015_question_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollGroup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='group',
+            field=models.ForeignKey(blank=True, help_text='The survey this question is answered in, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='questions', to='polls.pollgroup'),
+        ),
+    ]
@@ -1,22 +1,268 @@
 """The overview of the webserver."""
 import datetime
+import itertools
+import random
+from collections import Counter, defaultdict
+from operator import itemgetter
 
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import BooleanField, Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Trunc, TruncMinute
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
+
+
+#: How often the last_vote_at of a question with sharded counters is stamped, at most.
+SHARD_STAMP_INTERVAL = datetime.timedelta(seconds=1)
+
+
+def _vote_count_subquery(field):
+    """Return a subquery counting the votes that point at the outer row through ``field``."""
+    votes = Vote.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(votes.annotate(total=Count('*')).values('total')), 0)
+
+
+def _shard_votes_subquery(field):
+    """Return a subquery adding up the counter shards that point at the outer row through ``field``."""
+    shards = ChoiceShard.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(shards.annotate(total=Sum('votes')).values('total')), 0)
+
+
+def _archived_votes_subquery(field):
+    """Return a subquery adding up the archived tallies that point at the outer row through ``field``."""
+    tallies = ArchivedTally.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(tallies.annotate(total=Sum('votes')).values('total')), 0)
+
+
+def _rollup_votes_subquery(field):
+    """Return a subquery adding up the vote rollups that point at the outer row through ``field``."""
+    rollups = VoteRollup.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(rollups.annotate(total=Sum('votes')).values('total')), 0)
+
+
+def _add_votes(using, model, columns, conflict, rows):
+    """Insert ``rows`` of ``columns + (votes,)`` values in one statement, adding to the votes of existing rows.
+
+    ``conflict`` names the columns of the unique constraint that makes a row already exist.
+    """
+    if not rows:
+        return
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    votes = quote('votes')
+    names = ', '.join(quote(column) for column in columns + ('votes',))
+    values = ', '.join(['(' + ', '.join(['%s'] * (len(columns) + 1)) + ')'] * len(rows))
+    if connection.vendor == 'mysql':
+        sql = (f'INSERT INTO {table} ({names}) VALUES {values} '
+               f'ON DUPLICATE KEY UPDATE {votes} = {votes} + VALUES({votes})')
+    else:
+        sql = (f'INSERT INTO {table} ({names}) VALUES {values} '
+               f'ON CONFLICT ({", ".join(quote(column) for column in conflict)}) '
+               f'DO UPDATE SET {votes} = {table}.{votes} + EXCLUDED.{votes}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+class QuestionStatus(models.TextChoices):
+    """Where a question is in its life, stored so that the poll lists can filter on an index."""
+
+    SCHEDULED = 'scheduled', "Scheduled"
+    OPEN = 'open', "Open"
+    CLOSED = 'closed', "Closed"
+
+
+def _open_condition(now):
+    """Return the condition matching questions that can still be voted on at ``now``."""
+    return Q(end_date__gte=now) & Q(end_date__gte=F('pub_date')) & Q(archived_at__isnull=True)
+
+
+def _status_expression(now):
+    """Return an expression computing the status of a question at ``now`` from its dates."""
+    return Case(When(pub_date__gt=now, then=Value(QuestionStatus.SCHEDULED)),
+                When(_open_condition(now), then=Value(QuestionStatus.OPEN)),
+                default=Value(QuestionStatus.CLOSED), output_field=models.CharField())
+
+
+class QuestionQuerySet(models.QuerySet):
+    """Queries that work on many questions at once.
+
+    The stored status may lag behind the clock until schedule_polls or a save moves it on,
+    but never runs ahead of it, so the filters trust a later status and check the dates
+    of the rows whose status may be stale.
+    """
+
+    def published(self, now=None):
+        """Questions whose pub_date has passed."""
+        now = now or timezone.now()
+        return self.filter(Q(status__in=[QuestionStatus.OPEN, QuestionStatus.CLOSED])
+                           | Q(status=QuestionStatus.SCHEDULED, pub_date__lte=now))
+
+    def open(self, now=None):
+        """Questions that can still be voted on, the same rule as Question.can_vote()."""
+        return self.filter(Q(status__in=[QuestionStatus.SCHEDULED, QuestionStatus.OPEN])
+                           & _open_condition(now or timezone.now()))
+
+    def closed(self, now=None):
+        """Questions that can no longer be voted on."""
+        return self.filter(Q(status=QuestionStatus.CLOSED) | ~_open_condition(now or timezone.now()))
+
+    def stale(self, now=None):
+        """Questions whose stored status is behind the clock, annotated with their ``status_now``."""
+        return self.annotate(status_now=_status_expression(now or timezone.now())).exclude(status=F('status_now'))
+
+    def refresh_status(self, now=None):
+        """Store the status of these questions at ``now``; return the number that changed."""
+        status = _status_expression(now or timezone.now())
+        return self.exclude(status=status).update(status=status)
+
+    def with_is_open(self, now=None):
+        """Annotate each question with ``is_open`` computed in SQL."""
+        condition = When(_open_condition(now or timezone.now()), then=Value(True))
+        return self.annotate(is_open=Case(condition, default=Value(False), output_field=BooleanField()))
+
+    def with_vote_totals(self):
+        """Annotate each question with ``votes_total``, its stored tally plus its counter shards."""
+        return self.annotate(votes_total=F('total_votes') + _shard_votes_subquery('question'))
+
+    def with_expected_votes(self):
+        """Annotate each question with ``votes_expected``, its count of votes, or its archived tally once archived."""
+        return self.annotate(votes_expected=Case(When(archived_at__isnull=True, then=_vote_count_subquery('question')),
+                                                 default=_archived_votes_subquery('question'),
+                                                 output_field=models.IntegerField()))
+
+    def rebuild_tallies(self):
+        """Recompute the stored tallies of these questions from their votes, dropping their counter shards.
+
+        Archived questions have no votes left, so theirs are restored from their ArchivedTally rows.
+        """
+        live, archived = self.filter(archived_at__isnull=True), self.filter(archived_at__isnull=False)
+        with transaction.atomic():
+            Choice.objects.filter(question__in=live).update(vote_count=_vote_count_subquery('choice'))
+            Choice.objects.filter(question__in=archived).update(vote_count=_archived_votes_subquery('choice'))
+            ChoiceShard.objects.filter(question__in=self).delete()
+            return (live.update(total_votes=_vote_count_subquery('question'))
+                    + archived.update(total_votes=_archived_votes_subquery('question')))
+
+    def fold_shards(self):
+        """Add the counter shards of these questions into their tallies and delete the shards.
+
+        Only the shard rows locked here are folded, so a vote landing meanwhile is kept for
+        the next fold. Return the number of shard rows folded.
+        """
+        with transaction.atomic():
+            shards = list(ChoiceShard.objects.select_for_update().filter(question__in=self)
+                          .values_list('pk', 'question_id', 'choice_id', 'votes'))
+            choice_deltas, question_deltas = Counter(), Counter()
+            for _, question_id, choice_id, votes in shards:
+                choice_deltas[choice_id] += votes
+                question_deltas[question_id] += votes
+            for model, field, deltas in ((Choice, 'vote_count', choice_deltas),
+                                         (Question, 'total_votes', question_deltas)):
+                pks_by_delta = defaultdict(list)
+                for pk, delta in deltas.items():
+                    if delta:
+                        pks_by_delta[delta].append(pk)
+                for delta, pks in pks_by_delta.items():
+                    model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+            ChoiceShard.objects.filter(pk__in=[shard[0] for shard in shards]).delete()
+        return len(shards)
+
+    def set_counter_shards(self, shards):
+        """Fold the existing shards and spread the future votes of these questions over ``shards`` rows."""
+        with transaction.atomic():
+            self.fold_shards()
+            return self.update(counter_shards=shards)
+
+    def rebuild_rollups(self):
+        """Recompute the vote rollups of these questions from the vote timestamps.
+
+        Only the latest change of each vote is known, so the rebuilt series counts every vote
+        at the minute it was last cast; votes older than the timestamps count at pub_date.
+        The rollups of archived questions are kept, as their votes are gone.
+        """
+        live = self.filter(archived_at__isnull=True)
+        when = TruncMinute(Coalesce('updated_at', 'question__pub_date'))
+        buckets = (Vote.objects.filter(question__in=live).annotate(bucket=when).order_by()
+                   .values('question_id', 'choice_id', 'bucket').annotate(votes=Count('*')))
+        with transaction.atomic():
+            VoteRollup.objects.filter(question__in=live).delete()
+            rollups = (VoteRollup(**row) for row in buckets.iterator())
+            while True:
+                batch = list(itertools.islice(rollups, 1000))
+                if not batch:
+                    break
+                VoteRollup.objects.bulk_create(batch)
+
+
+class PollGroup(models.Model):
+    """A survey: related questions answered together with one batch vote."""
+
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+
+    def __str__(self):
+        """Return the title of the group."""
+        return self.title
+
+    def published_questions(self, now=None):
+        """Return the published questions of the group in order, with their choices prefetched."""
+        return self.questions.published(now).order_by('pub_date', 'pk').prefetch_related(prefetch_choices())
+
 
 class Question(models.Model):
     """Have to create question which have deadline."""
 
     question_text = models.CharField(max_length=200)
-    recently_vote = models.CharField(max_length=200, default ="You haven't do this polls")
     pub_date = models.DateTimeField('date published')
     end_date = models.DateTimeField('end dated')
+    total_votes = models.PositiveIntegerField(default=0, editable=False)
+    last_vote_at = models.DateTimeField(null=True, blank=True, editable=False)
+    archived_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="When the votes were moved out of the Vote table; the results come from ArchivedTally.")
+    counter_shards = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1), MaxValueValidator(64)],
+        help_text="Spread the vote counters of a very busy poll over this many rows per choice.")
+    status = models.CharField(max_length=9, choices=QuestionStatus.choices, default=QuestionStatus.SCHEDULED,
+                              editable=False)
+    group = models.ForeignKey(PollGroup, on_delete=models.SET_NULL, null=True, blank=True, related_name='questions',
+                              help_text="The survey this question is answered in, if any.")
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        """Index the status and dates that the poll lists filter and sort on."""
+
+        indexes = [
+            models.Index(fields=['pub_date', 'end_date'], name='polls_question_dates'),
+            models.Index(fields=['status', 'pub_date'], name='polls_question_status'),
+        ]
 
     def __str__(self):
         """Return the question in text form."""
         return self.question_text
 
+    def save(self, *args, **kwargs):
+        """Store the status implied by the dates, also when only the dates are saved."""
+        self.status = self.current_status()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'pub_date', 'end_date', 'archived_at'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'status'}
+        super().save(*args, **kwargs)
+
+    def current_status(self, now=None):
+        """Return the status of the question at ``now``, computed from its dates."""
+        now = now or timezone.now()
+        if self.pub_date > now:
+            return QuestionStatus.SCHEDULED
+        if self.end_date >= now and self.end_date >= self.pub_date and self.archived_at is None:
+            return QuestionStatus.OPEN
+        return QuestionStatus.CLOSED
+
     def was_published_recently(self):
         """Check that polls is published recently."""
         now = timezone.now()
@@ -24,38 +270,394 @@ class Question(models.Model):
 
     def is_published(self):
         """Check that this question is published."""
-        now = timezone.now()
-        return now >= self.pub_date
+        if self.status != QuestionStatus.SCHEDULED:
+            return True
+        return timezone.now() >= self.pub_date
 
     def can_vote(self):
         """Check what questions user can vote."""
+        if self.status == QuestionStatus.CLOSED:
+            return False
         now = timezone.now()
-        return self.end_date >= now and self.end_date >= self.pub_date
+        return self.end_date >= now and self.end_date >= self.pub_date and self.archived_at is None
+
+    def is_final(self):
+        """Check that the poll was published and voting is over, so its results can't change."""
+        return self.is_published() and not self.can_vote()
+
+    def results(self):
+        """Return the choices with each one's share of the votes, plus the total."""
+        choices = list(self.choice_set.all())
+        if self.archived_at is not None:
+            archived_votes = dict(ArchivedTally.objects.filter(question=self).values_list('choice_id', 'votes'))
+            for choice in choices:
+                choice.archived_votes = archived_votes.get(choice.pk, 0)
+        elif self.counter_shards > 1:
+            shard_votes = ChoiceShard.objects.sums(self.pk)
+            for choice in choices:
+                choice.shard_votes = shard_votes.get(choice.pk, 0)
+        total = sum(choice.votes for choice in choices)
+        for choice in choices:
+            choice.percentage = round(100 * choice.votes / total, 1) if total else 0
+        return {'choices': choices, 'total_votes': total}
+
+    def timeline(self, resolution='hour'):
+        """Return the running vote count of every choice at the end of each period in which votes changed.
+
+        Only the VoteRollup rows are read, summed per ``resolution`` (one of VoteRollup.RESOLUTIONS).
+        Each point holds the period start, the count per choice in choice_set order, the running
+        total and the new votes of the period.
+        """
+        choices = list(self.choice_set.all())
+        rows = (self.voterollup_set.annotate(period=Trunc('bucket', resolution)).order_by('period')
+                .values('period', 'choice_id').annotate(change=Sum('votes')))
+        running, points = Counter(), []
+        for period, changes in itertools.groupby(rows, key=itemgetter('period')):
+            new = 0
+            for change in changes:
+                running[change['choice_id']] += change['change']
+                new += change['change']
+            votes = [running[choice.pk] for choice in choices]
+            points.append({'time': period, 'votes': votes, 'total': sum(votes), 'new': new})
+        return {'choices': choices, 'points': points}
 
     was_published_recently.admin_order_field = 'pub_date'
     was_published_recently.boolean = True
     was_published_recently.short_description = 'Published recently?'
 
 
+class ChoiceQuerySet(models.QuerySet):
+    """Queries that work on many choices at once."""
+
+    def with_vote_totals(self):
+        """Annotate each choice with ``votes_total``, its stored tally plus its counter shards."""
+        return self.annotate(votes_total=F('vote_count') + _shard_votes_subquery('choice'))
+
+    def with_expected_votes(self):
+        """Annotate each choice with ``votes_expected`` and ``rollup_votes``.
+
+        ``votes_expected`` is its count of votes, or its archived tally once archived, and
+        ``rollup_votes`` the sum of its vote rollups; both should match its tally.
+        """
+        expected = Case(When(question__archived_at__isnull=True, then=_vote_count_subquery('choice')),
+                        default=_archived_votes_subquery('choice'), output_field=models.IntegerField())
+        return self.annotate(votes_expected=expected, rollup_votes=_rollup_votes_subquery('choice'))
+
+
 class Choice(models.Model):
     """Have to create many choices for answer the polls."""
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
+    vote_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ChoiceQuerySet.as_manager()
 
     @ property
     def votes(self):
         """:return sum of all vote in the particular question"""
-        return self.question.vote_set.filter(choice=self).count()
+        archived_votes = getattr(self, 'archived_votes', None)
+        if archived_votes is not None:
+            return archived_votes
+        return self.vote_count + getattr(self, 'shard_votes', 0)
 
     def __str__(self):
         """Return choice in text form."""
         return self.choice_text
 
 
+def prefetch_choices():
+    """Return the prefetch of a question's choices in id order, the order every page and the API list them in."""
+    return models.Prefetch('choice_set', queryset=Choice.objects.order_by('pk'))
+
+
+class VoteManager(models.Manager):
+    """Keep the stored tallies in step with the votes."""
+
+    def _insert_if_absent(self, using, user_id, question_id, choice_id, now):
+        """Insert the vote in one statement unless the user already voted; return True if it was inserted."""
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        columns = ', '.join(quote(column) for column in
+                            ('user_id', 'question_id', 'choice_id', 'created_at', 'updated_at'))
+        if connection.vendor == 'mysql':
+            sql = f'INSERT IGNORE INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s)'
+        else:
+            sql = (f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s) '
+                   f'ON CONFLICT ({quote("user_id")}, {quote("question_id")}) DO NOTHING')
+        now = connection.ops.adapt_datetimefield_value(now)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user_id, question_id, choice_id, now, now])
+            return cursor.rowcount == 1
+
+    def _apply_tallies(self, using, choice_deltas, question_deltas, now, shards=None):
+        """Add the deltas to the stored tallies and to the current rollup bucket.
+
+        ``choice_deltas`` is keyed by ``(question_id, choice_id)``. The tallies take one UPDATE per
+        distinct delta, and every question in ``question_deltas`` gets its last_vote_at stamped,
+        even with a delta of 0. The deltas of the questions in ``shards``, a
+        ``{question_id: counter_shards}`` map, go to a random one of their shard rows instead, and
+        their last_vote_at is stamped at most once per SHARD_STAMP_INTERVAL.
+        """
+        shards = shards or {}
+        picks = {key: random.randrange(shards[key[0]]) if key[0] in shards else 0 for key in choice_deltas}
+        by_choice = {choice_id: delta for (question_id, choice_id), delta in choice_deltas.items()
+                     if question_id not in shards}
+        by_question = {pk: delta for pk, delta in question_deltas.items() if pk not in shards}
+        for model, field, deltas in ((Choice, 'vote_count', by_choice),
+                                     (Question, 'total_votes', by_question)):
+            pks_by_delta = defaultdict(list)
+            for pk, delta in deltas.items():
+                if delta or model is Question:
+                    pks_by_delta[delta].append(pk)
+            for delta, pks in pks_by_delta.items():
+                changes = {field: F(field) + delta} if delta else {}
+                if model is Question:
+                    changes['last_vote_at'] = now
+                model.objects.using(using).filter(pk__in=pks).update(**changes)
+        sharded = [pk for pk in question_deltas if pk in shards]
+        if sharded:
+            rows = [(question_id, choice_id, picks[question_id, choice_id], delta)
+                    for (question_id, choice_id), delta in sorted(choice_deltas.items())
+                    if question_id in shards and delta]
+            _add_votes(using, ChoiceShard, ('question_id', 'choice_id', 'shard'), ('choice_id', 'shard'), rows)
+            stale = Q(last_vote_at__isnull=True) | Q(last_vote_at__lt=now - SHARD_STAMP_INTERVAL)
+            Question.objects.using(using).filter(stale, pk__in=sharded).update(last_vote_at=now)
+        VoteRollup.objects.add(using, choice_deltas, now, picks)
+
+    def cast(self, user, question, choice):
+        """Record the user's choice for the question and update the tallies in the same transaction.
+
+        Return the id of the choice the user had picked before, or None for a first vote.
+        """
+        using, now = router.db_for_write(self.model), timezone.now()
+        with transaction.atomic(using=using):
+            shards = {question.pk: question.counter_shards} if question.counter_shards > 1 else None
+            if self._insert_if_absent(using, user.pk, question.pk, choice.pk, now):
+                self._apply_tallies(using, {(question.pk, choice.pk): 1}, {question.pk: 1}, now, shards)
+                return None
+            votes = self.using(using).filter(user=user, question=question)
+            previous = votes.select_for_update().values_list('choice_id', flat=True).get()
+            if previous != choice.pk:
+                votes.update(choice=choice, updated_at=now)
+                self._apply_tallies(using, {(question.pk, choice.pk): 1, (question.pk, previous): -1},
+                                    {question.pk: 0}, now, shards)
+            return previous
+
+    def _locked_votes(self, using, keys):
+        """Return the existing votes of the ``(user_id, question_id)`` keys, locked, keyed like them."""
+        candidates = self.using(using).select_for_update().filter(
+            user_id__in={user_id for user_id, _ in keys}, question_id__in={question_id for _, question_id in keys})
+        return {(vote.user_id, vote.question_id): vote for vote in candidates
+                if (vote.user_id, vote.question_id) in keys}
+
+    def _insert_missing(self, using, votes, now):
+        """Insert the ``{(user_id, question_id): choice_id}`` votes; return the keys that were inserted.
+
+        They are inserted in bulk, or one at a time with _insert_if_absent when another
+        transaction voted for some of the same users and questions since they were read.
+        """
+        try:
+            with transaction.atomic(using=using):
+                self.using(using).bulk_create([
+                    self.model(user_id=user_id, question_id=question_id, choice_id=choice_id,
+                               created_at=now, updated_at=now)
+                    for (user_id, question_id), choice_id in votes.items()], batch_size=500)
+            return set(votes)
+        except IntegrityError:
+            return {(user_id, question_id) for (user_id, question_id), choice_id in votes.items()
+                    if self._insert_if_absent(using, user_id, question_id, choice_id, now)}
+
+    def cast_many(self, votes):
+        """Apply many ``(user_id, question_id, choice_id)`` votes and their tallies in one transaction.
+
+        When the same user votes on a question more than once the last vote wins. Votes are
+        upserted: a first vote that another transaction inserts meanwhile is changed instead.
+        Return the ids of the questions whose tallies changed.
+        """
+        latest = {}
+        for user_id, question_id, choice_id in votes:
+            latest[user_id, question_id] = choice_id
+        if not latest:
+            return set()
+        using, now = router.db_for_write(self.model), timezone.now()
+        with transaction.atomic(using=using):
+            existing = self._locked_votes(using, latest)
+            missing = {key: choice_id for key, choice_id in latest.items() if key not in existing}
+            inserted = self._insert_missing(using, missing, now) if missing else set()
+            if len(inserted) < len(missing):
+                existing.update(self._locked_votes(using, set(missing) - inserted))
+            changed = []
+            choice_deltas, question_deltas = Counter(), Counter()
+            for (user_id, question_id), choice_id in latest.items():
+                vote = existing.get((user_id, question_id))
+                if (user_id, question_id) in inserted:
+                    question_deltas[question_id] += 1
+                elif vote.choice_id != choice_id:
+                    question_deltas[question_id] += 0
+                    choice_deltas[question_id, vote.choice_id] -= 1
+                    vote.choice_id, vote.updated_at = choice_id, now
+                    changed.append(vote)
+                else:
+                    continue
+                choice_deltas[question_id, choice_id] += 1
+            self.using(using).bulk_update(changed, ['choice', 'updated_at'], batch_size=500)
+            shards = dict(Question.objects.using(using).filter(pk__in=question_deltas, counter_shards__gt=1)
+                          .values_list('pk', 'counter_shards'))
+            self._apply_tallies(using, choice_deltas, question_deltas, now, shards)
+        return set(question_deltas)
+
+
 class Vote(models.Model):
     """For voting queations in ku polls."""
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now, null=True, editable=False)
+    updated_at = models.DateTimeField(default=timezone.now, null=True, editable=False)
+
+    objects = VoteManager()
+
+    class Meta:
+        """One vote per user and question, indexed for counting per choice."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='polls_vote_unique_user_question'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'choice'], name='polls_vote_question_choice'),
+        ]
+
+
+class VoteRollupManager(models.Manager):
+    """Write the per-minute vote changes in the voting transaction."""
+
+    def add(self, using, deltas, now, shards=None):
+        """Add the ``{(question_id, choice_id): delta}`` changes to the bucket of ``now`` in one upsert.
+
+        ``shards`` picks the shard row of each change, for questions with sharded counters.
+        """
+        bucket = connections[using].ops.adapt_datetimefield_value(now.replace(second=0, microsecond=0))
+        shards = shards or {}
+        rows = [(question_id, choice_id, bucket, shards.get((question_id, choice_id), 0), delta)
+                for (question_id, choice_id), delta in sorted(deltas.items()) if delta]
+        _add_votes(using, self.model, ('question_id', 'choice_id', 'bucket', 'shard'),
+                   ('choice_id', 'bucket', 'shard'), rows)
+
+
+class VoteRollup(models.Model):
+    """The net change in a choice's votes during one minute, for charts of a poll over time."""
+
+    RESOLUTIONS = ('minute', 'hour', 'day')
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    bucket = models.DateTimeField(help_text="Start of the minute.")
+    shard = models.PositiveSmallIntegerField(default=0, help_text="0 unless the question's counters are sharded.")
+    votes = models.IntegerField(default=0, help_text="Votes gained minus votes moved to another choice.")
+
+    objects = VoteRollupManager()
+
+    class Meta:
+        """One row per choice, minute and shard, read per question in time order."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'bucket', 'shard'], name='polls_rollup_unique_bucket_shard'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'bucket'], name='polls_rollup_question_bucket'),
+        ]
+
+    def __str__(self):
+        """Return the choice and the minute."""
+        return f"{self.choice_id} at {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class ChoiceShardManager(models.Manager):
+    """Read the counter shards of busy questions."""
+
+    def sums(self, question_id):
+        """Return ``{choice_id: votes}`` summed over the question's shards, cached for SHARD_TIMEOUT seconds."""
+        from .cache import cache_settings, poll_cache
+
+        def load():
+            return dict(self.filter(question_id=question_id).order_by().values('choice_id')
+                        .annotate(total=Sum('votes')).values_list('choice_id', 'total'))
+
+        return poll_cache.get_or_set('shards', 'shards', question_id, load, cache_settings()['SHARD_TIMEOUT'])
+
+    def totals(self, question_ids):
+        """Return ``{question_id: votes}`` summed over the shards of the given questions, in one query."""
+        if not question_ids:
+            return {}
+        return dict(self.filter(question_id__in=question_ids).order_by().values('question_id')
+                    .annotate(total=Sum('votes')).values_list('question_id', 'total'))
+
+
+class ChoiceShard(models.Model):
+    """Part of a choice's vote count, added to Choice.vote_count, for questions with sharded counters.
+
+    Votes land on a random one of the question's counter_shards rows per choice so that
+    concurrent votes seldom wait on the same row lock. QuestionQuerySet.fold_shards() moves
+    them back into the tallies.
+    """
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    votes = models.IntegerField(default=0)
+
+    objects = ChoiceShardManager()
+
+    class Meta:
+        """One row per choice and shard."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'shard'], name='polls_shard_unique_choice_shard'),
+        ]
+
+    def __str__(self):
+        """Return the choice and the shard number."""
+        return f"{self.choice_id} shard {self.shard}"
+
+
+class ArchivedTally(models.Model):
+    """The final vote count of a choice of an archived question, whose raw votes were deleted."""
+
+    choice = models.OneToOneField(Choice, on_delete=models.CASCADE, primary_key=True, related_name='archived_tally')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    votes = models.PositiveIntegerField()
+
+    def __str__(self):
+        """Return the choice and its count."""
+        return f"{self.choice_id}: {self.votes}"
+
+
+class ResultSnapshot(models.Model):
+    """The final results of a closed poll, frozen on first access after it closed."""
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    tallies = models.JSONField(help_text="[[choice id, choice text, votes], ...]")
+    total_votes = models.PositiveIntegerField()
+    html = models.TextField()
+    etag = models.CharField(max_length=66)
+    finalized_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return the question the snapshot belongs to."""
+        return f"Results of {self.question_id}"
+
+
+@receiver(post_save, sender=Question)
+def drop_snapshot_of_reopened_question(sender, instance, **kwargs):
+    """A question whose end date is moved back into the future is no longer final."""
+    if not instance.is_final():
+        ResultSnapshot.objects.filter(question=instance).delete()
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def drop_snapshot_of_edited_choices(sender, instance, **kwargs):
+    """Editing the choices of a closed poll in the admin refreshes its snapshot."""
+    ResultSnapshot.objects.filter(question_id=instance.question_id).delete()
@@ -0,0 +1,36 @@
+"""Keyset pagination over questions, newest first."""
+import base64
+import binascii
+import datetime
+
+
+def encode_cursor(question):
+    """Return an opaque cursor pointing just after the question."""
+    raw = f'{question.pub_date.isoformat()}|{question.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (pub_date, id) pair encoded in the cursor, or raise ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        pub_date, pk = raw.split('|')
+        return datetime.datetime.fromisoformat(pub_date), int(pk)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as error:
+        raise ValueError(f"Invalid cursor {cursor!r}") from error
+
+
+def keyset_page(queryset, cursor=None, size=20):
+    """Return one page of the queryset ordered by (-pub_date, -id) and the cursor of the next page.
+
+    The next cursor is None on the last page. Only ``size + 1`` rows are read, however
+    deep the page is.
+    """
+    queryset = queryset.order_by('-pub_date', '-pk')
+    if cursor:
+        pub_date, pk = decode_cursor(cursor)
+        queryset = queryset.filter(pub_date__lte=pub_date).exclude(pub_date=pub_date, pk__gte=pk)
+    rows = list(queryset[:size + 1])
+    if len(rows) > size:
+        return rows[:size], encode_cursor(rows[size - 1])
+    return rows, None
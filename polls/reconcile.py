@@ -0,0 +1,150 @@
+"""Find and repair tallies that drifted from the votes.
+
+Tallies, counter shards, rollups and cached pages are derived from the Vote rows and
+can drift after a crash, manual SQL or a CASCADE delete of users or choices.
+reconcile() walks the questions in id order, BATCH_SIZE at a time and at most
+MAX_QUESTIONS per run, and remembers the last id checked in the CHECKPOINT file so
+that the next run carries on from there and a full pass spreads over many runs.
+
+Each batch is checked with a few set-based queries that only read the batch's rows
+through their indexes:
+
+* choices whose tally plus shards, or whose rollups, differ from their votes (the
+  rollups of archived questions are left alone, as their votes are gone);
+* questions whose total plus shards differs from their votes;
+* stray votes, whose choice belongs to another question.
+
+Drifted questions are repaired in a transaction that first locks their choices,
+shards and questions, in the order votes take them, so that a vote landing meanwhile
+is neither lost nor counted twice. Archived questions are checked against their
+ArchivedTally rows. Findings are counted in the metrics registry.
+"""
+import logging
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Abs
+
+from .cache import invalidate, invalidate_question
+from .metrics import registry
+from .models import Choice, ChoiceShard, Question, ResultSnapshot, Vote
+
+logger = logging.getLogger('polls')
+
+DEFAULTS = {
+    'BATCH_SIZE': 200,
+    'MAX_QUESTIONS': 5000,
+    'CHECKPOINT': 'reconcile.checkpoint',
+}
+
+
+def reconcile_settings():
+    """Return the POLLS_RECONCILE setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_RECONCILE', {})}
+
+
+def read_checkpoint(path):
+    """Return the last question id checked, or 0 to start from the beginning."""
+    try:
+        with open(path) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def write_checkpoint(path, question_id):
+    """Remember the last question id checked, replacing the file in one step."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as checkpoint:
+        checkpoint.write(str(question_id))
+    os.replace(temporary, path)
+
+
+def find_drift(question_ids):
+    """Return the drift among the given questions as ``(counts, tally ids, rollup ids, stray vote ids)``.
+
+    ``counts`` holds the drifted choices, questions and rollups, the stray votes and the
+    total votes of difference; the id lists name the questions to repair.
+    """
+    choices = (Choice.objects.filter(question_id__in=question_ids).with_vote_totals().with_expected_votes()
+               .filter(~Q(votes_total=F('votes_expected')) | ~Q(rollup_votes=F('votes_expected')))
+               .values_list('question_id', 'votes_total', 'votes_expected', 'rollup_votes', 'question__archived_at'))
+    questions = (Question.objects.filter(pk__in=question_ids).with_vote_totals().with_expected_votes()
+                 .exclude(votes_total=F('votes_expected'))
+                 .annotate(difference=Abs(F('votes_total') - F('votes_expected')))
+                 .values_list('pk', 'difference'))
+    stray = list(Vote.objects.filter(question_id__in=question_ids).exclude(choice__question_id=F('question_id'))
+                 .values_list('pk', 'question_id', 'choice__question_id'))
+    counts, tallies, rollups = Counter(), set(), set()
+    for question_id, total, expected, rollup, archived_at in choices:
+        if total != expected:
+            counts['choices'] += 1
+            counts['votes'] += abs(total - expected)
+            tallies.add(question_id)
+        # The rollups of archived questions can't be rebuilt without their votes.
+        if rollup != expected and archived_at is None:
+            counts['rollups'] += 1
+            rollups.add(question_id)
+    for question_id, difference in questions:
+        counts['questions'] += 1
+        counts['votes'] += difference
+        tallies.add(question_id)
+    counts['stray_votes'] = len(stray)
+    for _, question_id, choice_question_id in stray:
+        tallies.update((question_id, choice_question_id))
+    return counts, sorted(tallies), sorted(rollups), [pk for pk, _, _ in stray]
+
+
+def repair(tally_ids, rollup_ids, stray_vote_ids):
+    """Delete the stray votes, recount the tallies and rollups of the given questions and drop their cached pages."""
+    ids = sorted(set(tally_ids) | set(rollup_ids))
+    with transaction.atomic():
+        list(Choice.objects.select_for_update().filter(question_id__in=ids).values_list('pk', flat=True))
+        list(ChoiceShard.objects.select_for_update().filter(question_id__in=ids).values_list('pk', flat=True))
+        list(Question.objects.select_for_update().filter(pk__in=ids).values_list('pk', flat=True))
+        Vote.objects.filter(pk__in=stray_vote_ids).delete()
+        Question.objects.filter(pk__in=tally_ids).rebuild_tallies()
+        Question.objects.filter(pk__in=rollup_ids).rebuild_rollups()
+        ResultSnapshot.objects.filter(question__in=ids).delete()
+    invalidate('shards')
+    for pk in ids:
+        invalidate_question(pk)
+
+
+def reconcile(checkpoint, batch_size=200, max_questions=5000, fix=True):
+    """Check up to ``max_questions`` questions after the checkpoint, repairing drift when ``fix`` is true.
+
+    Stop early after wrapping around to the first question. Return the counts of the run.
+    """
+    totals = Counter()
+    last = read_checkpoint(checkpoint)
+    while totals['questions_checked'] < max_questions:
+        size = min(batch_size, max_questions - totals['questions_checked'])
+        ids = list(Question.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:size])
+        if not ids:
+            last = 0
+            totals['passes'] += 1
+            write_checkpoint(checkpoint, last)
+            break
+        counts, tally_ids, rollup_ids, stray_vote_ids = find_drift(ids)
+        if fix and (tally_ids or rollup_ids):
+            repair(tally_ids, rollup_ids, stray_vote_ids)
+            totals['questions_repaired'] += len(set(tally_ids) | set(rollup_ids))
+        if tally_ids or rollup_ids:
+            logger.warning("Tallies drifted on %s question(s) between ids %s and %s.",
+                           len(set(tally_ids) | set(rollup_ids)), ids[0], ids[-1],
+                           extra={'event': 'tally_drift'})
+        totals.update(counts)
+        totals['questions_checked'] += len(ids)
+        last = ids[-1]
+        write_checkpoint(checkpoint, last)
+    registry.inc('polls_reconcile_questions_total', totals['questions_checked'])
+    for kind in ('choices', 'questions', 'rollups', 'stray_votes'):
+        if totals[kind]:
+            registry.inc('polls_tally_drift_total', totals[kind], kind=kind)
+    if totals['votes']:
+        registry.inc('polls_tally_drift_votes_total', totals['votes'])
+    return totals
@@ -0,0 +1,99 @@
+"""Move questions through their scheduled transitions and warm the caches around them.
+
+Each pass of run_transitions:
+
+* loads the detail, results and API contexts of the questions opening within LEAD
+  seconds into the poll cache, so that the first voters don't all miss it at once;
+* stores the new status of the questions whose pub_date or end_date passed, and
+  invalidates their cached contexts, which still hold the old status;
+* finalizes the questions that closed, folding their counter shards into the
+  tallies and freezing their results snapshot;
+* reloads the first page of each index list when anything changed.
+
+The schedule_polls command runs it in a loop, waking up at the next transition.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Min
+from django.utils import timezone
+
+from .cache import invalidate, poll_cache
+from .models import Question, QuestionStatus, prefetch_choices
+from .snapshots import finalize
+from .views import IndexView, question_page
+
+DEFAULTS = {
+    'LEAD': 60,
+    'INTERVAL': 30,
+}
+
+#: The views whose cached question contexts are warmed before a question opens.
+WARMED_VIEWS = ('detail', 'results', 'api-results')
+
+
+def scheduler_settings():
+    """Return the POLLS_SCHEDULER setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_SCHEDULER', {})}
+
+
+def warm_question(question_id):
+    """Load the question and its choices once and cache the context of every view showing it."""
+    question = Question.objects.prefetch_related(prefetch_choices()).get(pk=question_id)
+    context = {'question': question, **question.results()}
+    for view in WARMED_VIEWS:
+        poll_cache.get_or_set(view, f'question:{question_id}', question_id, lambda: context)
+
+
+def warm_index():
+    """Forget the cached question lists and load the first page of each."""
+    invalidate('index')
+    for status in IndexView.statuses:
+        question_page(status, '', IndexView.page_size)
+
+
+def run_transitions(lead, now=None):
+    """Handle the transitions due at ``now``; return how many questions were warmed, opened and closed."""
+    now = now or timezone.now()
+    upcoming = Question.objects.filter(status=QuestionStatus.SCHEDULED, pub_date__gt=now,
+                                       pub_date__lte=now + datetime.timedelta(seconds=lead))
+    warmed = list(upcoming.values_list('pk', flat=True))
+    for pk in warmed:
+        warm_question(pk)
+    due = list(Question.objects.exclude(status=QuestionStatus.CLOSED).stale(now))
+    Question.objects.filter(pk__in=[question.pk for question in due]).refresh_status(now)
+    if due:
+        invalidate(*(f'question:{question.pk}' for question in due))
+    opened = [question for question in due if question.status_now == QuestionStatus.OPEN]
+    closed = [question for question in due if question.status_now == QuestionStatus.CLOSED]
+    for question in closed:
+        question.status = QuestionStatus.CLOSED
+        poll_cache.get_or_set('snapshot', f'question:{question.pk}', question.pk, lambda: finalize(question))
+    for question in opened:
+        warm_question(question.pk)
+    if due:
+        warm_index()
+    return {'warmed': len(warmed), 'opened': len(opened), 'closed': len(closed)}
+
+
+def next_transition(now=None):
+    """Return when the next question opens or closes, or None if none is scheduled."""
+    now = now or timezone.now()
+    opening = Question.objects.filter(status=QuestionStatus.SCHEDULED, pub_date__gt=now).aggregate(
+        at=Min('pub_date'))['at']
+    closing = Question.objects.filter(status__in=[QuestionStatus.SCHEDULED, QuestionStatus.OPEN],
+                                      end_date__gte=now).aggregate(at=Min('end_date'))['at']
+    return min(filter(None, (opening, closing)), default=None)
+
+
+def seconds_to_wait(lead, interval, now=None):
+    """Return how long to sleep before the next pass: until the next warm-up or transition, at most ``interval``."""
+    now = now or timezone.now()
+    at = next_transition(now)
+    if at is None:
+        return interval
+    wake = at - datetime.timedelta(seconds=lead)
+    if wake <= now:
+        # Transitions happen once end_date has passed, so wake up just after it.
+        wake = at + datetime.timedelta(milliseconds=50)
+    return min(interval, max((wake - now).total_seconds(), 0.05))
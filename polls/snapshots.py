@@ -0,0 +1,73 @@
+"""Frozen results of closed polls.
+
+Once a poll is closed its results are counted one last time, rendered once and
+served from the ResultSnapshot row from then on. The snapshot is dropped again when
+the poll is reopened, rescheduled or repaired, or one of its choices is edited, so
+clients revalidate it with its ETag instead of keeping it for good.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .ingest import flush_pending
+from .models import Question, ResultSnapshot, prefetch_choices
+
+#: Clients and proxies may store the snapshot but must check its ETag before reusing it.
+CACHE_CONTROL = 'public, no-cache'
+
+
+def render_results(question, request=None):
+    """Render the results page of ``question`` from its stored tallies."""
+    question = Question.objects.prefetch_related(prefetch_choices()).get(pk=question.pk)
+    results = question.results()
+    return render_to_string('polls/results.html', {'question': question, **results}, request), results
+
+
+def finalize(question):
+    """Return the snapshot of a closed question, creating it on first use."""
+    snapshot = ResultSnapshot.objects.filter(question=question).first()
+    if snapshot is not None:
+        return snapshot
+    if not question.is_final():
+        raise ValueError(f"Question {question.pk} is still open.")
+    flush_pending()
+    Question.objects.filter(pk=question.pk).rebuild_tallies()
+    html, results = render_results(question)
+    snapshot = ResultSnapshot(
+        question=question,
+        tallies=[[choice.pk, choice.choice_text, choice.votes] for choice in results['choices']],
+        total_votes=results['total_votes'],
+        html=html,
+        etag='"%s"' % hashlib.sha256(html.encode()).hexdigest()[:32],
+    )
+    try:
+        with transaction.atomic():
+            snapshot.save(force_insert=True)
+    except IntegrityError:
+        snapshot = ResultSnapshot.objects.get(question=question)
+    return snapshot
+
+
+def snapshot_response(request, snapshot):
+    """Serve the snapshot's HTML with its validators, or a 304 when the client has it.
+
+    The snapshot is shared by every client, so a request with messages waiting to be shown
+    gets the page rendered for it instead, and that copy is not stored.
+    """
+    if len(get_messages(request)):
+        response = HttpResponse(render_results(snapshot.question, request)[0])
+        response['Cache-Control'] = 'private, no-store'
+        return response
+    last_modified = int(snapshot.finalized_at.timestamp())
+    response = get_conditional_response(request, etag=snapshot.etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(snapshot.html)
+    response['ETag'] = snapshot.etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
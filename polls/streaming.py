@@ -0,0 +1,214 @@
+"""Live results over Server-Sent Events, served from the ASGI entry point.
+
+``GET /polls/<id>/stream/`` is answered by a small ASGI handler in front of the
+Django application (see mysite/asgi.py). Every connection of a process shares one
+TallyFeed: once per tick it reads which watched questions got new votes and pushes
+only the changed tallies to their subscribers. The tick length caps the updates
+per second, so a burst of votes between two ticks reaches clients as one event, and
+the database sees the same two queries per tick whatever the number of clients.
+"""
+import asyncio
+import json
+import logging
+import re
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import Choice, ChoiceShard, Question
+
+logger = logging.getLogger('polls')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_UPDATES_PER_SECOND': 2,
+    'KEEPALIVE': 15,
+}
+
+STREAM_PATH = re.compile(r'^/polls/(?P<pk>\d+)/stream/$')
+
+
+def stream_settings():
+    """Return the POLLS_STREAM setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_STREAM', {})}
+
+
+def read_changes(question_ids, stamps):
+    """Return ``{question_id: (stamp, {choice_id: votes})}`` for the questions voted on since ``stamps``.
+
+    Questions with sharded counters only stamp last_vote_at once per SHARD_STAMP_INTERVAL,
+    so they are read on every call; the feed only sends the tallies that changed.
+    """
+    rows = Question.objects.filter(pk__in=question_ids).values_list('pk', 'last_vote_at', 'counter_shards')
+    changed = {pk: stamp for pk, stamp, shards in rows if pk not in stamps or stamps[pk] != stamp or shards > 1}
+    if not changed:
+        return {}
+    tallies = defaultdict(dict)
+    choices = Choice.objects.filter(question__in=changed).values_list('question_id', 'pk', 'vote_count')
+    for question_id, choice_id, votes in choices:
+        tallies[question_id][choice_id] = votes
+    sharded = [pk for pk, _, shards in rows if pk in changed and shards > 1]
+    if sharded:
+        shard_votes = ChoiceShard.objects.filter(question__in=sharded).order_by().values('question_id', 'choice_id')
+        for row in shard_votes.annotate(total=Sum('votes')):
+            tallies[row['question_id']][row['choice_id']] += row['total']
+    return {pk: (stamp, tallies[pk]) for pk, stamp in changed.items()}
+
+
+class Subscriber:
+    """One client's pending changes; pushes between two sends are merged into one event."""
+
+    def __init__(self):
+        """Start with nothing to send."""
+        self.changes = {}
+        self.total = 0
+        self.ready = asyncio.Event()
+
+    def push(self, changes, total):
+        """Merge changed tallies into what the client hasn't been sent yet."""
+        self.changes.update(changes)
+        self.total = total
+        self.ready.set()
+
+    def take(self):
+        """Return the pending event data and start collecting the next one."""
+        changes, self.changes = self.changes, {}
+        self.ready.clear()
+        return {'changes': changes, 'total': self.total}
+
+
+class TallyFeed:
+    """Single change feed of a process, fanned out to every subscriber."""
+
+    def __init__(self, rate, reader=read_changes):
+        """Tick ``rate`` times a second, reading changes with ``reader(question_ids, stamps)``."""
+        self.interval = 1 / rate
+        self.reader = sync_to_async(reader)
+        self.subscribers = defaultdict(set)
+        self.tallies = {}
+        self.stamps = {}
+        self.ticks = 0
+        self._task = None
+
+    async def subscribe(self, question_id):
+        """Register a subscriber for the question and return it with the current tallies queued."""
+        if question_id not in self.tallies:
+            await self._refresh([question_id])
+        subscriber = Subscriber()
+        tallies = self.tallies.get(question_id, {})
+        subscriber.push(tallies, sum(tallies.values()))
+        self.subscribers[question_id].add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return subscriber
+
+    def unsubscribe(self, question_id, subscriber):
+        """Forget a subscriber, and the question once nobody watches it."""
+        watchers = self.subscribers.get(question_id)
+        if watchers is None:
+            return
+        watchers.discard(subscriber)
+        if not watchers:
+            del self.subscribers[question_id]
+            self.tallies.pop(question_id, None)
+            self.stamps.pop(question_id, None)
+
+    async def _refresh(self, question_ids):
+        """Read the changes of the questions and push the changed tallies to their subscribers."""
+        changed = await self.reader(question_ids, {pk: self.stamps[pk] for pk in question_ids if pk in self.stamps})
+        for question_id, (stamp, tallies) in changed.items():
+            old = self.tallies.get(question_id, {})
+            delta = {choice_id: votes for choice_id, votes in tallies.items() if old.get(choice_id) != votes}
+            self.stamps[question_id], self.tallies[question_id] = stamp, tallies
+            if delta:
+                total = sum(tallies.values())
+                for subscriber in self.subscribers.get(question_id, ()):
+                    subscriber.push(delta, total)
+
+    async def _run(self):
+        """Tick while anybody is subscribed; a failed refresh is logged and retried on the next tick."""
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            self.ticks += 1
+            if self.subscribers:
+                try:
+                    await self._refresh(list(self.subscribers))
+                except Exception:
+                    logger.exception("Reading the live tallies failed, retrying on the next tick.")
+
+
+_feed = None
+
+
+def get_feed():
+    """Return the change feed of this process."""
+    global _feed
+    if _feed is None:
+        _feed = TallyFeed(stream_settings()['MAX_UPDATES_PER_SECOND'])
+    return _feed
+
+
+def event(name, data):
+    """Encode one Server-Sent Event."""
+    return f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+async def wait_for_disconnect(receive):
+    """Return once the client has gone away."""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_results(scope, receive, send, question_id, feed=None):
+    """Stream the tallies of a published question, or answer 404."""
+    published = Question.objects.published().filter(pk=question_id)
+    if not await sync_to_async(published.exists)():
+        await send({'type': 'http.response.start', 'status': 404,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': b'No published question matches the given id.'})
+        return
+    await send_events(receive, send, question_id, feed or get_feed())
+
+
+async def send_events(receive, send, question_id, feed):
+    """Send one ``snapshot`` event, then ``tally`` events with the changes, until the client leaves."""
+    subscriber = await feed.subscribe(question_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    keepalive = stream_settings()['KEEPALIVE']
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        name = 'snapshot'
+        while not disconnected.done():
+            ready = asyncio.ensure_future(subscriber.ready.wait())
+            await asyncio.wait({ready, disconnected}, timeout=keepalive, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                ready.cancel()
+                break
+            if ready.done():
+                body = event(name, {'question': question_id, **subscriber.take()})
+                name = 'tally'
+            else:
+                ready.cancel()
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        feed.unsubscribe(question_id, subscriber)
+
+
+def with_results_stream(application):
+    """Wrap an ASGI application so that ``/polls/<id>/stream/`` is served by stream_results."""
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = STREAM_PATH.match(scope['path'])
+            if match:
+                return await stream_results(scope, receive, send, int(match['pk']))
+        return await application(scope, receive, send)
+
+    return router
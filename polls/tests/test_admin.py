@@ -0,0 +1,113 @@
+"""Test the question admin: annotated list, bulk actions and the tally inline."""
+import datetime
+from unittest import mock
+
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..admin import QuestionAdmin
+from ..models import Choice, Question, ResultSnapshot, Vote
+
+
+def create_question(question_text, days):
+    """Create a question published a day ago that closes in ``days`` days."""
+    now = timezone.now()
+    return Question.objects.create(question_text=question_text, pub_date=now - datetime.timedelta(days=1),
+                                   end_date=now + datetime.timedelta(days=days))
+
+
+class QuestionAdminTests(TestCase):
+    """The changelist and the actions work on many questions at once."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', '12345')
+        self.client.force_login(self.admin)
+        self.changelist = reverse('admin:polls_question_changelist')
+
+    def act(self, action, questions, **data):
+        """Run an admin action on the questions."""
+        return self.client.post(self.changelist, {
+            'action': action, helpers.ACTION_CHECKBOX_NAME: [question.pk for question in questions], **data})
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Totals and status come from the list query, not from one query per row."""
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(self.changelist).status_code, 200)
+            return len(queries)
+
+        create_question("First?", days=1)
+        few = count_queries()
+        for n in range(10):
+            create_question(f"Question {n}?", days=-n)
+        self.assertEqual(count_queries(), few)
+
+    def test_votes_are_sortable_and_status_filterable(self):
+        """The vote totals sort in SQL and the status filter uses the poll rules."""
+        busy, quiet = create_question("Busy?", days=1), create_question("Quiet?", days=-1)
+        choice = busy.choice_set.create(choice_text="Yes")
+        Vote.objects.cast(self.admin, busy, choice)
+        response = self.client.get(self.changelist, {'o': '-4'})
+        self.assertEqual([q.pk for q in response.context['cl'].result_list], [busy.pk, quiet.pk])
+        response = self.client.get(self.changelist, {'status': 'closed'})
+        self.assertEqual([q.pk for q in response.context['cl'].result_list], [quiet.pk])
+
+    def test_close_and_reopen(self):
+        """Closing ends voting now; reopening drops the snapshot and opens the poll again."""
+        question = create_question("Open?", days=1)
+        self.act('close_polls', [question])
+        self.assertFalse(Question.objects.get(pk=question.pk).can_vote())
+        ResultSnapshot.objects.create(question=question, tallies=[], total_votes=0, html='', etag='"x"')
+        self.act('reopen_polls', [question])
+        self.assertTrue(Question.objects.get(pk=question.pk).can_vote())
+        self.assertFalse(ResultSnapshot.objects.exists())
+
+    def test_reschedule(self):
+        """The reschedule form moves both dates of every selected poll."""
+        questions = [create_question(f"Question {n}?", days=1) for n in range(3)]
+        before = {q.pk: (q.pub_date, q.end_date) for q in questions}
+        response = self.act('reschedule_polls', questions)
+        self.assertContains(response, "Reschedule 3 poll(s)")
+        self.act('reschedule_polls', questions, apply='1', days='2')
+        shift = datetime.timedelta(days=2)
+        for question in Question.objects.all():
+            self.assertEqual((question.pub_date, question.end_date),
+                             (before[question.pk][0] + shift, before[question.pk][1] + shift))
+
+    def test_change_page_shows_tallies(self):
+        """The choice inline shows each choice's votes."""
+        question = create_question("Tallied?", days=1)
+        choice = question.choice_set.create(choice_text="Yes")
+        Vote.objects.cast(self.admin, question, choice)
+        response = self.client.get(reverse('admin:polls_question_change', args=(question.pk,)))
+        self.assertContains(response, '<td class="field-tally"><p>1</p></td>', html=True)
+
+    def test_editing_a_choice_keeps_votes_cast_meanwhile(self):
+        """Saving the inline writes only the choice text, not the tally read when the page was submitted."""
+        question = create_question("Tallied?", days=1)
+        choice = question.choice_set.create(choice_text="Yes")
+        save_model = QuestionAdmin.save_model
+
+        def vote_then_save(admin, request, obj, form, change):
+            Vote.objects.cast(self.admin, question, choice)
+            save_model(admin, request, obj, form, change)
+
+        data = {
+            'question_text': question.question_text, 'group': '', 'counter_shards': 1,
+            'pub_date_0': question.pub_date.strftime('%Y-%m-%d'), 'pub_date_1': question.pub_date.strftime('%H:%M:%S'),
+            'end_date_0': question.end_date.strftime('%Y-%m-%d'), 'end_date_1': question.end_date.strftime('%H:%M:%S'),
+            'choice_set-TOTAL_FORMS': 2, 'choice_set-INITIAL_FORMS': 1,
+            'choice_set-MIN_NUM_FORMS': 0, 'choice_set-MAX_NUM_FORMS': 1000,
+            'choice_set-0-id': choice.pk, 'choice_set-0-question': question.pk, 'choice_set-0-choice_text': "Yes!",
+            'choice_set-1-id': '', 'choice_set-1-question': question.pk, 'choice_set-1-choice_text': "No",
+        }
+        with mock.patch.object(QuestionAdmin, 'save_model', autospec=True, side_effect=vote_then_save):
+            response = self.client.post(reverse('admin:polls_question_change', args=(question.pk,)), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Choice.objects.filter(question=question).order_by('pk')
+                              .values_list('choice_text', 'vote_count')), [("Yes!", 1), ("No", 0)])
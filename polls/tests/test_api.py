@@ -0,0 +1,76 @@
+"""Test the JSON API."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..models import Question, Vote
+
+
+def create_question(question_text, days):
+    """Create a question with the given `question_text`."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time, end_date=time)
+
+
+class ApiTests(TestCase):
+    """The API returns compact JSON and honours conditional requests."""
+
+    def setUp(self):
+        self.question = create_question(question_text='Api question.', days=-1)
+        self.question.end_date = timezone.now() + datetime.timedelta(days=1)
+        self.question.save()
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.results_url = reverse('polls:api-results', args=(self.question.id,))
+
+    def test_question_list(self):
+        """Published questions are listed with their status and totals."""
+        create_question(question_text='Future question.', days=5)
+        response = self.client.get(reverse('polls:api-questions'), {'status': 'open'})
+        data = response.json()
+        self.assertEqual([q['text'] for q in data['results']], ['Api question.'])
+        self.assertIs(data['results'][0]['is_open'], True)
+        self.assertIsNone(data['next'])
+
+    def test_unknown_status_is_rejected(self):
+        """A status other than all, open or closed is a bad request."""
+        response = self.client.get(reverse('polls:api-questions'), {'status': 'maybe'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_results(self):
+        """The results endpoint returns each choice's votes."""
+        Vote.objects.cast(User.objects.create_user('voter'), self.question, self.choice)
+        data = self.client.get(self.results_url).json()
+        self.assertEqual(data['total_votes'], 1)
+        self.assertEqual(data['choices'], [{'id': self.choice.id, 'text': 'Yes', 'votes': 1, 'percentage': 100.0}])
+
+    def test_choices_are_in_id_order(self):
+        """Choices are listed in the order of the HTML pages, so the body and its ETag are deterministic."""
+        no = self.question.choice_set.create(choice_text='No')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(self.results_url).json()
+        self.assertEqual([choice['id'] for choice in data['choices']], [self.choice.id, no.id])
+        choice_queries = [query['sql'] for query in queries if 'FROM "polls_choice"' in query['sql']]
+        self.assertTrue(choice_queries)
+        self.assertTrue(all('ORDER BY "polls_choice"."id"' in sql for sql in choice_queries))
+
+    def test_unchanged_results_are_not_modified(self):
+        """The ETag of unchanged results gets a 304, and a new vote changes it."""
+        Vote.objects.cast(User.objects.create_user('voter'), self.question, self.choice)
+        first = self.client.get(self.results_url)
+        self.assertTrue(first.has_header('Last-Modified'))
+        response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Vote.objects.cast(User.objects.create_user('another'), self.question, self.choice)
+        response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_unpublished_results_are_hidden(self):
+        """Questions that aren't published yet are not found."""
+        future = create_question(question_text='Future question.', days=5)
+        response = self.client.get(reverse('polls:api-results', args=(future.id,)))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,87 @@
+"""Test the archiving of the votes of long-closed polls."""
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..archive import archive_path
+from ..models import ArchivedTally, Question, Vote
+
+
+def create_question(question_text, closed_days):
+    """Create a question that closed ``closed_days`` days ago."""
+    now = timezone.now()
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=now - datetime.timedelta(days=closed_days + 7),
+                                   end_date=now - datetime.timedelta(days=closed_days))
+
+
+class ArchivePollsTests(TestCase):
+    """Polls past the grace period lose their raw votes but keep their results."""
+
+    def setUp(self):
+        self.old = create_question("Old question.", closed_days=60)
+        self.recent = create_question("Recent question.", closed_days=2)
+        self.yes = self.old.choice_set.create(choice_text='Yes')
+        self.no = self.old.choice_set.create(choice_text='No')
+        recent_choice = self.recent.choice_set.create(choice_text='Maybe')
+        for n in range(5):
+            user = User.objects.create_user(f'voter{n}')
+            Vote.objects.cast(user, self.old, self.yes if n < 3 else self.no)
+            Vote.objects.cast(user, self.recent, recent_choice)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def archive(self):
+        """Run archive_polls with a 30 day grace period and small batches."""
+        call_command('archive_polls', grace_days=30, directory=self.directory, batch_size=2, stdout=io.StringIO())
+
+    def test_votes_are_archived(self):
+        """The old poll's votes are in its archive file and gone from Vote; the recent poll is untouched."""
+        self.archive()
+        self.assertFalse(Vote.objects.filter(question=self.old).exists())
+        self.assertEqual(Vote.objects.filter(question=self.recent).count(), 5)
+        self.assertIsNotNone(Question.objects.get(pk=self.old.pk).archived_at)
+        self.assertIsNone(Question.objects.get(pk=self.recent.pk).archived_at)
+        with gzip.open(archive_path(self.directory, self.old.pk), 'rt') as archive:
+            records = [json.loads(line) for line in archive]
+        self.assertEqual([record['type'] for record in records], ['question', 'choice', 'choice'] + ['vote'] * 5)
+        self.assertEqual(os.listdir(self.directory), [f'question-{self.old.pk}.jsonl.gz'])
+
+    def test_results_come_from_the_summary(self):
+        """Choice.votes and the results page keep the final counts, even after the tallies are rebuilt."""
+        self.archive()
+        self.assertEqual(dict(ArchivedTally.objects.values_list('choice_id', 'votes')),
+                         {self.yes.pk: 3, self.no.pk: 2})
+        Question.objects.rebuild_tallies()
+        Question.objects.rebuild_rollups()
+        question = Question.objects.get(pk=self.old.pk)
+        results = question.results()
+        self.assertEqual([choice.votes for choice in results['choices']], [3, 2])
+        self.assertEqual((results['total_votes'], question.total_votes), (5, 5))
+        self.assertEqual(sum(question.voterollup_set.values_list('votes', flat=True)), 5)
+        response = self.client.get(reverse('polls:results', args=(self.old.pk,)))
+        self.assertContains(response, f'<td id="votes-{self.yes.pk}">3</td>', html=True)
+
+    def test_archived_poll_stays_closed(self):
+        """An archived poll can't be voted on again, even if its end date moves."""
+        self.archive()
+        Question.objects.filter(pk=self.old.pk).update(end_date=timezone.now() + datetime.timedelta(days=1))
+        question = Question.objects.get(pk=self.old.pk)
+        self.assertFalse(question.can_vote())
+        self.assertFalse(Question.objects.open().filter(pk=self.old.pk).exists())
+
+    def test_interrupted_run_is_finished(self):
+        """Votes of a poll archived by an interrupted run are deleted by the next one."""
+        Question.objects.filter(pk=self.old.pk).update(archived_at=timezone.now())
+        self.archive()
+        self.assertFalse(Vote.objects.filter(question=self.old).exists())
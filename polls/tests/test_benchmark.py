@@ -0,0 +1,43 @@
+"""Test the load generation and benchmark helpers."""
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Choice, Question, Vote
+
+
+class SeedPollsTests(TestCase):
+    """seed_polls creates consistent data in bulk."""
+
+    def test_seed_polls(self):
+        """The requested rows are created and the tallies match the votes."""
+        call_command('seed_polls', users=20, questions=5, choices=3, votes=10, seed=1, stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='seed-user-').count(), 20)
+        self.assertEqual(Question.objects.count(), 5)
+        self.assertEqual(Choice.objects.count(), 15)
+        self.assertEqual(Vote.objects.count(), 50)
+        self.assertEqual(Choice.objects.aggregate(total=Sum('vote_count'))['total'], 50)
+        self.assertEqual(set(Question.objects.values_list('total_votes', flat=True)), {10})
+
+
+class BenchmarkHelperTests(TestCase):
+    """Percentiles and baseline comparison."""
+
+    def test_percentile(self):
+        """Percentiles pick from the sorted values."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 51)
+        self.assertEqual(benchmark.percentile(values, 0.99), 100)
+        self.assertEqual(benchmark.percentile([], 0.5), 0)
+
+    def test_compare_flags_regressions(self):
+        """Slower latency, lower throughput or more queries beyond the tolerance are reported."""
+        before = {'p95_ms': 10, 'throughput': 100, 'queries': 2}
+        same = {'p95_ms': 11, 'throughput': 95, 'queries': 2}
+        worse = {'p95_ms': 20, 'throughput': 50, 'queries': 5}
+        self.assertEqual(benchmark.compare({'index': same}, {'index': before}, 0.2), [])
+        self.assertEqual(len(benchmark.compare({'index': worse}, {'index': before}, 0.2)), 3)
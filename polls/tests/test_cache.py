@@ -0,0 +1,81 @@
+"""Test the poll page cache."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..cache import LocalLRU, poll_cache
+from ..models import Question
+
+
+def create_question(question_text, days):
+    """Create a question with the given `question_text`."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time, end_date=time)
+
+
+@override_settings(POLLS_CACHE={'ENABLED': True})
+class PollCacheTests(TestCase):
+    """Cached pages are served without queries until a write bumps their version."""
+
+    def setUp(self):
+        caches['polls'].clear()
+        poll_cache.local.clear()
+        poll_cache.counters.clear()
+        self.question = create_question(question_text='Cached question.', days=-1)
+        self.question.end_date = timezone.now() + datetime.timedelta(days=1)
+        self.question.save()
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+
+    def test_results_are_served_from_cache(self):
+        """The second request for the results page does not touch the database."""
+        url = reverse('polls:results', args=(self.question.id,))
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_votes'], 0)
+        self.assertEqual(poll_cache.stats()['results'], {'hit': 1, 'miss': 1, 'ratio': 0.5})
+
+    def test_vote_invalidates_results(self):
+        """A vote bumps the question version so the new tally is shown."""
+        url = reverse('polls:results', args=(self.question.id,))
+        self.client.get(url)
+        User.objects.create_user('admin', password='12345')
+        self.client.login(username='admin', password='12345')
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        response = self.client.get(url)
+        self.assertEqual(response.context['total_votes'], 1)
+
+    def test_question_save_invalidates_index(self):
+        """Saving a question, as the admin does, refreshes the question list."""
+        self.client.get(reverse('polls:index'))
+        self.question.question_text = 'Renamed question.'
+        self.question.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, 'Renamed question.')
+
+    def test_evicted_version_does_not_repeat(self):
+        """A version counter dropped by the backend restarts above every value it had before."""
+        before = poll_cache.version('question:1')
+        poll_cache.bump('question:1')
+        bumped = poll_cache.version('question:1')
+        caches['polls'].delete('polls:version:question:1')
+        after = poll_cache.version('question:1')
+        self.assertGreater(int(bumped), int(before))
+        self.assertGreater(int(after), int(bumped))
+
+
+class LocalLRUTests(TestCase):
+    """The in-process tier stays bounded."""
+
+    def test_oldest_entry_is_evicted(self):
+        """Past its size the least recently used entry is dropped."""
+        lru = LocalLRU(2)
+        lru.set('a', 1, 60)
+        lru.set('b', 2, 60)
+        lru.get('a')
+        lru.set('c', 3, 60)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
@@ -0,0 +1,81 @@
+"""Test the database tuning and the primary/replica routing."""
+from unittest import mock
+
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve
+
+from ..db import PrimaryReplicaRouter, apply_pragmas, check_connections, mark_connections_idle
+from ..middleware import DatabaseRoutingMiddleware
+from ..models import Question, Vote
+
+ROUTING = {'REPLICA': 'default', 'REPLICA_VIEWS': ['polls:index'], 'STICKY_SECONDS': 5}
+
+
+@override_settings(POLLS_DATABASE=ROUTING)
+class RoutingTests(TestCase):
+    """Reads of read-only views go to the replica until the client writes."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.reads = []
+        self.middleware = DatabaseRoutingMiddleware(self.respond)
+        # The router answers None for the primary; a fake alias tells the replica apart.
+        self.middleware.replica = 'replica'
+
+    def respond(self, request):
+        """Stand in for the view: note where a read goes, and write on POST."""
+        self.middleware.process_view(request, None, (), {})
+        self.reads.append(self.router.db_for_read(Question))
+        if request.method == 'POST':
+            self.router.db_for_write(Vote)
+            self.reads.append(self.router.db_for_read(Question))
+        return HttpResponse()
+
+    def request(self, method, path, **cookies):
+        """Run a request through the middleware."""
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies)
+        request.resolver_match = resolve(path)
+        return self.middleware(request)
+
+    def test_read_only_view_reads_from_replica(self):
+        """A GET of a listed view reads from the replica; other views read from the primary."""
+        self.request('get', '/polls/')
+        self.request('get', '/polls/1/')
+        self.assertEqual(self.reads, ['replica', None])
+
+    def test_write_pins_client_to_primary(self):
+        """After a write the request and the client's next reads use the primary."""
+        response = self.request('post', '/polls/')
+        self.assertEqual(self.reads, [None, None])
+        self.assertEqual(response.cookies['polls_primary']['max-age'], 5)
+        self.request('get', '/polls/', polls_primary='1')
+        self.assertEqual(self.reads[-1], None)
+
+    def test_outside_requests_use_primary(self):
+        """Management commands and tests are not routed."""
+        self.assertIsNone(self.router.db_for_read(Question))
+
+
+class ConnectionTests(TestCase):
+    """Connections are tuned when opened and checked after being idle."""
+
+    @override_settings(POLLS_DATABASE={'PRAGMAS': {'cache_size': -4000, 'temp_store': 'memory'}})
+    def test_pragmas_are_applied(self):
+        """The configured pragmas are set on new SQLite connections."""
+        apply_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -4000)
+            self.assertEqual(cursor.execute('PRAGMA temp_store').fetchone()[0], 2)
+
+    @override_settings(POLLS_DATABASE={'HEALTH_CHECK_AFTER': 0})
+    def test_unusable_idle_connection_is_closed(self):
+        """A persistent connection that fails its check is closed before the next request."""
+        connection.ensure_connection()
+        mark_connections_idle()
+        with mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            check_connections()
+        close.assert_called_once_with()
@@ -0,0 +1,70 @@
+"""Test the cached users and the tunable password hashing cost."""
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+USER_CACHE = {'USER_CACHE_ENABLED': True, 'USER_CACHE': 'users', 'USER_CACHE_TIMEOUT': 60}
+
+
+def user_queries(queries):
+    """Return the captured queries that read the user table."""
+    return [query for query in queries if 'FROM "auth_user"' in query['sql']]
+
+
+@override_settings(POLLS_AUTH=USER_CACHE)
+class CachedUserTests(TestCase):
+    """The user of a logged-in session is read from the cache until it changes."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = override_settings(CACHES={**settings.CACHES, 'users': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}})
+        shared.enable()
+        self.addCleanup(shared.disable)
+        self.user = User.objects.create_user('admin', password='12345')
+        self.client.login(username='admin', password='12345')
+
+    def test_user_is_cached(self):
+        """Only the first request after login reads the user row."""
+        self.client.get(reverse('polls:index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('polls:index'))
+        self.assertEqual(response.context['user'], self.user)
+        self.assertEqual(user_queries(queries), [])
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        """A deactivated user is logged out by their next request."""
+        self.client.get(reverse('polls:index'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_local_cache_is_refused(self):
+        """A per-process cache would keep other workers' sessions alive, so users are not cached in it."""
+        with override_settings(POLLS_AUTH={**USER_CACHE, 'USER_CACHE': 'polls'}):
+            self.client.get(reverse('polls:index'))
+            with CaptureQueriesContext(connection) as queries, self.assertWarns(RuntimeWarning):
+                self.client.get(reverse('polls:index'))
+        self.assertEqual(len(user_queries(queries)), 1)
+
+
+class PasswordCostTests(TestCase):
+    """Passwords are hashed with the configured cost and rehashed at login when it changes."""
+
+    def test_rehash_on_login(self):
+        """A password stored with another number of rounds is rehashed by a successful login."""
+        with override_settings(POLLS_AUTH={'PASSWORD_ITERATIONS': 1000}):
+            user = User.objects.create_user('admin', password='12345')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        with override_settings(POLLS_AUTH={'PASSWORD_ITERATIONS': 2000}):
+            self.assertTrue(self.client.login(username='admin', password='12345'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(user.check_password('12345'))
@@ -0,0 +1,110 @@
+"""Test poll groups and the batch vote."""
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import PollGroup, Question, Vote
+
+
+def create_question(question_text, days, group=None):
+    """Create a question published a day ago that closes in ``days`` days, with two choices."""
+    now = timezone.now()
+    question = Question.objects.create(question_text=question_text, pub_date=now - datetime.timedelta(days=1),
+                                       end_date=now + datetime.timedelta(days=days), group=group)
+    question.choice_set.create(choice_text='Yes')
+    question.choice_set.create(choice_text='No')
+    return question
+
+
+class GroupVoteTests(TestCase):
+    """All the answers of a survey are applied together, or not at all."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('admin', password='12345')
+        self.client.login(username='admin', password='12345')
+        self.group = PollGroup.objects.create(title="Survey")
+        self.questions = [create_question(f"Question {n}?", days=1, group=self.group) for n in range(3)]
+
+    def answers(self, questions):
+        """Return the POST data picking the first choice of every question."""
+        return {f'question-{question.pk}': question.choice_set.order_by('pk')[0].pk for question in questions}
+
+    def test_batch_vote(self):
+        """One request votes on every question and redirects to the combined results."""
+        response = self.client.post(reverse('polls:group-vote', args=(self.group.pk,)), self.answers(self.questions))
+        self.assertRedirects(response, reverse('polls:group-results', args=(self.group.pk,)))
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 3)
+        self.assertEqual([Question.objects.get(pk=q.pk).total_votes for q in self.questions], [1, 1, 1])
+        response = self.client.get(reverse('polls:group-results', args=(self.group.pk,)))
+        for question in self.questions:
+            self.assertContains(response, f'<td id="total-votes-{question.pk}">1</td>', html=True)
+
+    def test_vote_cast_meanwhile_is_changed(self):
+        """A first vote inserted by another request between the read and the insert is updated, not duplicated."""
+        question = self.questions[0]
+        no = question.choice_set.order_by('pk')[1]
+        bulk_create = QuerySet.bulk_create
+
+        def vote_first(queryset, objs, *args, **kwargs):
+            if not Vote.objects.filter(user=self.user, question=question).exists():
+                Vote.objects.cast(self.user, question, no)
+            return bulk_create(queryset, objs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_create', autospec=True, side_effect=vote_first):
+            response = self.client.post(reverse('polls:group-vote', args=(self.group.pk,)),
+                                        self.answers(self.questions))
+        self.assertRedirects(response, reverse('polls:group-results', args=(self.group.pk,)))
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 3)
+        yes = question.choice_set.order_by('pk')[0]
+        self.assertEqual(Vote.objects.get(user=self.user, question=question).choice, yes)
+        self.assertEqual(Question.objects.get(pk=question.pk).total_votes, 1)
+        self.assertEqual([choice.vote_count for choice in question.choice_set.order_by('pk')], [1, 0])
+
+    def test_missing_answer_saves_nothing(self):
+        """The form comes back with an error and no vote is recorded."""
+        response = self.client.post(reverse('polls:group-vote', args=(self.group.pk,)),
+                                    self.answers(self.questions[:2]))
+        self.assertEqual(response.context['error_message'], "You didn't select a choice for: Question 2?")
+        self.assertFalse(Vote.objects.exists())
+
+    def test_choice_of_another_question_is_rejected(self):
+        """An answer must be one of the question's own choices."""
+        data = self.answers(self.questions)
+        data[f'question-{self.questions[0].pk}'] = self.questions[1].choice_set.first().pk
+        self.client.post(reverse('polls:group-vote', args=(self.group.pk,)), data)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_closed_questions_are_skipped(self):
+        """Closed questions of the group need no answer and take none."""
+        closed = create_question("Closed?", days=-1, group=self.group)
+        response = self.client.post(reverse('polls:group-vote', args=(self.group.pk,)),
+                                    self.answers(self.questions + [closed]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Vote.objects.filter(question=closed).exists())
+
+    def test_query_count_does_not_depend_on_group_size(self):
+        """The whole survey is validated and saved with the same queries, however many questions it has."""
+        def count_queries(group, questions):
+            data = self.answers(questions)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('polls:group-vote', args=(group.pk,)), data)
+            self.assertEqual(response.status_code, 302)
+            return len(queries)
+
+        survey = PollGroup.objects.create(title="Long survey")
+        questions = [create_question(f"Long {n}?", days=1, group=survey) for n in range(6)]
+        self.assertEqual(count_queries(self.group, self.questions), count_queries(survey, questions))
+
+    def test_login_required(self):
+        """Anonymous users are sent to the login page."""
+        self.client.logout()
+        response = self.client.post(reverse('polls:group-vote', args=(self.group.pk,)), self.answers(self.questions))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Vote.objects.exists())
@@ -1,11 +1,16 @@
 """Test index pages."""
 import datetime
+from unittest import mock
 
+from django.contrib.auth.models import User
+from django.db import connection
 from django.shortcuts import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from ..models import Question
+from ..models import Question, Vote
+from ..views import IndexView
 
 def create_question(question_text, days):
     """Create a question with the given `question_text`."""
@@ -58,3 +63,64 @@ class QuestionIndexViewTests(TestCase):
             ['<Question: Past question 2.>', '<Question: Past question 1.>']
         )
 
+    def test_questions_are_paginated_by_cursor(self):
+        """Each page holds page_size questions and links to the next one."""
+        for day in range(1, 6):
+            create_question(question_text=f"Past question {day}.", days=-day)
+        seen = []
+        with mock.patch.object(IndexView, 'page_size', 2):
+            response = self.client.get(reverse('polls:index'))
+            while True:
+                seen += [q.question_text for q in response.context['latest_question_list']]
+                cursor = response.context['next_cursor']
+                if not cursor:
+                    break
+                response = self.client.get(reverse('polls:index'), {'after': cursor})
+        self.assertEqual(seen, [f"Past question {day}." for day in range(1, 6)])
+
+    def test_status_filter(self):
+        """The open and closed filters are applied in the query."""
+        closed = create_question(question_text="Closed question.", days=-5)
+        opened = create_question(question_text="Open question.", days=-5)
+        opened.end_date = timezone.now() + datetime.timedelta(days=5)
+        opened.save()
+        response = self.client.get(reverse('polls:index'), {'status': 'open'})
+        self.assertEqual(list(response.context['latest_question_list']), [opened])
+        self.assertIs(response.context['latest_question_list'][0].is_open, True)
+        response = self.client.get(reverse('polls:index'), {'status': 'closed'})
+        self.assertEqual(list(response.context['latest_question_list']), [closed])
+
+    def test_invalid_cursor(self):
+        """A malformed cursor is a 404 like an out of range page."""
+        response = self.client.get(reverse('polls:index'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class UserVoteBadgeTests(TestCase):
+    """The index shows which polls the logged-in user already answered."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('admin', password='12345')
+        self.client.force_login(self.user)
+        for day in range(1, 7):
+            question = create_question(question_text=f"Past question {day}.", days=-day)
+            choice = question.choice_set.create(choice_text=f"Choice {day}")
+            if day % 2:
+                Vote.objects.cast(self.user, question, choice)
+
+    def test_badges_show_the_users_choice(self):
+        """Answered polls get a "voted: <choice>" badge, the others none."""
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "voted: Choice 1")
+        self.assertContains(response, "voted: Choice 5")
+        self.assertNotContains(response, "voted: Choice 2")
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """The user's votes for the whole page are read in a single query."""
+        def count_queries(size):
+            with mock.patch.object(IndexView, 'page_size', size), CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('polls:index'))
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(6))
+        self.assertEqual(count_queries(6), 4)
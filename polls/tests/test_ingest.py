@@ -0,0 +1,133 @@
+"""Test the write-behind vote buffer."""
+import datetime
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, IntegrityError
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from ..ingest import VoteBuffer
+from ..models import Choice, Question, Vote
+
+
+def create_question(question_text, days):
+    """Create a question with the given `question_text`."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time, end_date=time)
+
+
+class VoteBufferTests(TestCase):
+    """Queued votes are journaled, written in batches and replayed after a crash."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = Path(directory.name) / 'votes.jsonl'
+        self.buffer = VoteBuffer(self.journal)
+        self.user = User.objects.create_user('admin', password='12345')
+        self.question = create_question(question_text='Busy question.', days=-1)
+        self.question.end_date = timezone.now() + datetime.timedelta(days=1)
+        self.question.save()
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def test_vote_is_written_on_flush(self):
+        """A queued vote is visible to its user at once and in the database after the flush."""
+        self.buffer.enqueue(self.user.pk, self.question.pk, self.first.pk)
+        self.assertEqual(self.buffer.pending_choice(self.user.pk, self.question.pk), self.first.pk)
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Vote.objects.get().choice, self.first)
+        self.assertEqual(Choice.objects.get(pk=self.first.pk).votes, 1)
+        self.assertEqual(list(self.journal.parent.iterdir()), [])
+
+    def test_last_vote_in_a_batch_wins(self):
+        """Several votes of one user in a batch count once, for the last choice."""
+        self.buffer.enqueue(self.user.pk, self.question.pk, self.first.pk)
+        self.buffer.enqueue(self.user.pk, self.question.pk, self.second.pk)
+        self.buffer.flush()
+        self.assertEqual(Vote.objects.get().choice, self.second)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).total_votes, 1)
+
+    def test_journal_is_replayed(self):
+        """Votes journaled by a process that died before flushing are written by the next one."""
+        self.buffer.enqueue(self.user.pk, self.question.pk, self.second.pk)
+        VoteBuffer(self.journal).replay()
+        self.assertEqual(Vote.objects.get().choice, self.second)
+        self.assertFalse(self.journal.exists())
+
+    def test_other_journals_are_left_alone(self):
+        """Replay skips the journals of other processes whose names start with this one's."""
+        other = self.journal.with_name(f'{self.journal.name}0')
+        other_segment = self.journal.with_name(f'{self.journal.name}0.3')
+        for path in (other, other_segment):
+            path.write_text(f'[{self.user.pk}, {self.question.pk}, {self.first.pk}]\n')
+        self.buffer.enqueue(self.user.pk, self.question.pk, self.second.pk)
+        VoteBuffer(self.journal).replay()
+        self.assertEqual(Vote.objects.get().choice, self.second)
+        self.assertTrue(other.exists() and other_segment.exists())
+
+    def test_bad_vote_is_dropped(self):
+        """A vote that cannot be written is dropped and the rest of its batch is committed."""
+        other = User.objects.create_user('other', password='12345')
+        cast_many = Vote.objects.cast_many
+
+        def fail_for_other(votes):
+            if any(user_id == other.pk for user_id, _, _ in votes):
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return cast_many(votes)
+
+        self.buffer.enqueue(other.pk, self.question.pk, self.first.pk)
+        self.buffer.enqueue(self.user.pk, self.question.pk, self.second.pk)
+        with mock.patch.object(Vote.objects, 'cast_many', side_effect=fail_for_other), \
+                self.assertLogs('polls', 'ERROR'):
+            self.buffer.flush()
+        self.assertEqual(Vote.objects.get().user, self.user)
+        self.assertEqual(self.buffer.backlog(), 0)
+        self.assertEqual(list(self.journal.parent.iterdir()), [])
+
+    def test_failed_replay_is_retried(self):
+        """Votes whose replay failed stay queued, with their journal, until a flush writes them."""
+        self.buffer.enqueue(self.user.pk, self.question.pk, self.second.pk)
+        buffer = VoteBuffer(self.journal)
+        with mock.patch.object(Vote.objects, 'cast_many', side_effect=DatabaseError('database is locked')):
+            with self.assertRaises(DatabaseError):
+                buffer.replay()
+        self.assertEqual(buffer.backlog(), 1)
+        self.assertTrue(any(self.journal.parent.iterdir()))
+        buffer.flush()
+        self.assertEqual(Vote.objects.get().choice, self.second)
+        self.assertEqual(list(self.journal.parent.iterdir()), [])
+
+    def test_vote_view_enqueues(self):
+        """With write-behind on, vote() queues the vote and the detail page already shows it."""
+        self.client.login(username='admin', password='12345')
+        with mock.patch('polls.views.get_buffer', return_value=self.buffer):
+            self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.first.id})
+            self.assertFalse(Vote.objects.exists())
+            response = self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        self.assertContains(response, "Your latest vote is First")
+
+
+class VoteFlusherTests(TestCase):
+    """The background thread writes queued votes without being asked."""
+
+    def test_small_batch_is_written_within_max_latency(self):
+        """A lone vote, far from a full batch, is written once it has waited MAX_LATENCY."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        buffer = VoteBuffer(Path(directory.name) / 'votes.jsonl', max_latency=0.2)
+        written = threading.Event()
+        buffer._apply = lambda votes: written.set()
+        buffer.start()
+        started = time.monotonic()
+        buffer.enqueue(1, 2, 3)
+        self.assertTrue(written.wait(2))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(buffer.backlog(), 0)
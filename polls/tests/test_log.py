@@ -0,0 +1,89 @@
+"""Test the structured, background logging of the polls app."""
+import datetime
+import json
+import logging
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.log import BackgroundHandler, JsonFormatter, SamplingFilter
+from polls.models import Question
+
+
+def make_record(level=logging.INFO, **extra):
+    """Return a log record carrying the given extra fields."""
+    record = logging.LogRecord('polls', level, __file__, 1, "%s voted.", ('admin',), None)
+    record.__dict__.update(extra)
+    return record
+
+
+class JsonFormatterTests(TestCase):
+    """Records become one JSON object per line."""
+
+    def test_fields_are_included(self):
+        """The message is formatted lazily and the extra fields are kept."""
+        line = JsonFormatter().format(make_record(event='vote', user='admin', question=3, latency_ms=1.5))
+        data = json.loads(line)
+        self.assertEqual(data['message'], "admin voted.")
+        self.assertEqual(data['level'], 'INFO')
+        self.assertEqual((data['event'], data['user'], data['question'], data['latency_ms']),
+                         ('vote', 'admin', 3, 1.5))
+        self.assertNotIn('choice', data)
+
+
+class SamplingFilterTests(TestCase):
+    """High-volume events can be sampled."""
+
+    def test_sampled_event_is_dropped(self):
+        """A rate of 0 drops the event, but not other events or warnings."""
+        sampling = SamplingFilter({'vote': 0})
+        self.assertFalse(sampling.filter(make_record(event='vote')))
+        self.assertTrue(sampling.filter(make_record(event='login')))
+        self.assertTrue(sampling.filter(make_record(logging.WARNING, event='vote')))
+
+
+class BackgroundHandlerTests(TestCase):
+    """Records are written by the writer thread."""
+
+    def test_records_reach_the_file(self):
+        """A closed handler has written every queued record to its file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'polls.log')
+            handler = BackgroundHandler(path)
+            handler.setFormatter(JsonFormatter())
+            handler.handle(make_record(event='vote'))
+            handler.close()
+            with open(path) as log:
+                self.assertEqual(json.loads(log.readline())['event'], 'vote')
+
+    def test_full_queue_drops_records(self):
+        """Records are counted and dropped instead of blocking when the queue is full."""
+        handler = BackgroundHandler(maxsize=1)
+        handler.listener.stop()
+        handler.handle(make_record())
+        handler.handle(make_record())
+        self.assertEqual(handler.dropped, 1)
+        handler.close()
+
+
+class VoteLoggingTests(TestCase):
+    """A vote is logged with its structured fields."""
+
+    def test_vote_is_logged(self):
+        """The vote record carries the user, question, choice and latency."""
+        User.objects.create_user('admin', password='12345')
+        self.client.login(username='admin', password='12345')
+        now = timezone.now()
+        question = Question.objects.create(question_text="Open question.", pub_date=now - datetime.timedelta(days=1),
+                                           end_date=now + datetime.timedelta(days=1))
+        choice = question.choice_set.create(choice_text="Yes")
+        with self.assertLogs('polls', 'INFO') as logs:
+            self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+        record = logs.records[-1]
+        self.assertEqual((record.event, record.user, record.question, record.choice),
+                         ('vote', 'admin', question.id, choice.id))
+        self.assertGreaterEqual(record.latency_ms, 0)
@@ -0,0 +1,78 @@
+"""Test the request metrics."""
+import json
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.shortcuts import reverse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import NoReverseMatch
+
+from ..metrics import Registry, collect, merge, metrics_view, registry, render
+
+
+@override_settings(POLLS_METRICS={'ENABLED': True, 'TOKEN': 'secret'})
+class MetricsMiddlewareTests(TestCase):
+    """Requests are counted per URL name and exposed at /metrics."""
+
+    def setUp(self):
+        registry.clear()
+        self.factory = RequestFactory()
+
+    def test_requests_are_recorded(self):
+        """Latency, status and SQL queries of a request show up in /metrics."""
+        self.client.get(reverse('polls:index'))
+        text = metrics_view(self.factory.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')).content.decode()
+        self.assertIn('polls_http_requests_total{method="GET",status="2xx",view="polls:index"} 1', text)
+        self.assertIn('polls_http_request_duration_seconds_count{view="polls:index"} 1', text)
+        self.assertIn('polls_db_queries_total{view="polls:index"}', text)
+        self.assertIn('polls_template_render_seconds_bucket{view="polls:index",le="+Inf"} 1', text)
+
+    @override_settings(POLLS_METRICS={'ENABLED': False})
+    def test_disabled_middleware_records_nothing(self):
+        """With metrics off the middleware is left out of the chain."""
+        self.client.get(reverse('polls:index'))
+        self.assertEqual(registry.snapshot(), {'counters': [], 'histograms': []})
+
+    def test_scrapers_must_be_allowed(self):
+        """Anonymous clients are refused; staff users, allowed addresses and the token are served."""
+        self.assertEqual(metrics_view(self.factory.get('/metrics')).status_code, 403)
+        self.assertEqual(metrics_view(self.factory.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong')).status_code,
+                         403)
+        request = self.factory.get('/metrics')
+        request.user = User(username='admin', is_staff=True)
+        self.assertEqual(metrics_view(request).status_code, 200)
+        with self.settings(POLLS_METRICS={'ENABLED': True, 'ALLOWED_IPS': ['127.0.0.1']}):
+            self.assertEqual(metrics_view(self.factory.get('/metrics')).status_code, 200)
+
+    def test_not_routed_while_disabled(self):
+        """The URL is only registered when metrics are enabled at start-up."""
+        with self.assertRaises(NoReverseMatch):
+            reverse('metrics')
+
+
+class AggregationTests(TestCase):
+    """Metrics of several processes add up."""
+
+    def test_process_dumps_are_merged(self):
+        """collect() adds the dumps found in the metrics directory to this process's numbers."""
+        other = Registry()
+        other.inc('polls_http_requests_total', 2, view='polls:index')
+        other.observe('polls_http_request_duration_seconds', 0.2, view='polls:index')
+        registry.clear()
+        registry.inc('polls_http_requests_total', 3, view='polls:index')
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, '1.json').write_text(json.dumps(other.snapshot()))
+            with self.settings(POLLS_METRICS={'DIR': directory}):
+                text = render(*collect())
+        self.assertIn('polls_http_requests_total{view="polls:index"} 5', text)
+        self.assertIn('polls_http_request_duration_seconds_bucket{view="polls:index",le="0.25"} 1', text)
+
+    def test_merge_adds_histograms(self):
+        """Histogram buckets, sums and counts are added element by element."""
+        first, second = Registry(), Registry()
+        first.observe('latency', 0.001)
+        second.observe('latency', 7)
+        _, histograms = merge([first.snapshot(), second.snapshot()])
+        values = histograms['latency', ()]
+        self.assertEqual((values[0], values[-2], values[-1]), (1, 0, 7.001))
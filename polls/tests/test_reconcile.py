@@ -0,0 +1,81 @@
+"""Test the tally reconciliation."""
+import datetime
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from ..metrics import registry
+from ..models import Choice, Question, Vote
+from ..reconcile import find_drift, read_checkpoint, reconcile
+
+
+def create_question(question_text, days):
+    """Create a question published ``days`` days ago and still open, with two choices."""
+    now = timezone.now()
+    question = Question.objects.create(question_text=question_text, pub_date=now - datetime.timedelta(days=days),
+                                       end_date=now + datetime.timedelta(days=1))
+    question.choice_set.create(choice_text='Yes')
+    question.choice_set.create(choice_text='No')
+    return question
+
+
+class ReconcileTests(TestCase):
+    """Drifted tallies are found with set-based queries and repaired."""
+
+    def setUp(self):
+        registry.clear()
+        self.questions = [create_question(f"Question {n}?", days=1) for n in range(4)]
+        self.users = [User.objects.create_user(f'voter{n}') for n in range(3)]
+        for question in self.questions:
+            for user in self.users:
+                Vote.objects.cast(user, question, question.choice_set.order_by('pk')[0])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, 'reconcile.checkpoint')
+        self.ids = [question.pk for question in self.questions]
+
+    def test_consistent_tallies_have_no_drift(self):
+        """Tallies kept by the vote paths match the votes."""
+        counts, tallies, rollups, stray = find_drift(self.ids)
+        self.assertEqual((sum(counts.values()), tallies, rollups, stray), (0, [], [], []))
+
+    def test_cascade_delete_is_repaired(self):
+        """Deleting a voter leaves the tallies and rollups too high until the reconciliation recounts them."""
+        self.users[0].delete()
+        Choice.objects.filter(question=self.questions[1]).update(vote_count=7)
+        totals = reconcile(self.checkpoint, batch_size=3, max_questions=10)
+        self.assertEqual(totals['questions_repaired'], 4)
+        self.assertEqual(totals['questions'], 4)
+        self.assertEqual(totals['rollups'], 4)
+        self.assertEqual(find_drift(self.ids)[1:], ([], [], []))
+        self.assertEqual([Question.objects.get(pk=pk).total_votes for pk in self.ids], [2, 2, 2, 2])
+        self.assertEqual(registry.counters[('polls_tally_drift_total', (('kind', 'questions'),))], 4)
+        self.assertEqual(registry.counters[('polls_reconcile_questions_total', ())], 4)
+
+    def test_dry_run_only_reports(self):
+        """Without fix the drift is counted but left in place."""
+        Choice.objects.filter(question=self.questions[0]).update(vote_count=0)
+        totals = reconcile(self.checkpoint, fix=False)
+        self.assertEqual((totals['choices'], totals['votes'], totals['questions_repaired']), (1, 3, 0))
+        self.assertEqual(find_drift(self.ids)[1], [self.questions[0].pk])
+
+    def test_stray_votes_are_deleted(self):
+        """A vote pointing at another question's choice is removed and both questions recounted."""
+        user = User.objects.create_user('stray')
+        Vote.objects.create(user=user, question=self.questions[0], choice=self.questions[1].choice_set.first())
+        totals = reconcile(self.checkpoint)
+        self.assertEqual(totals['stray_votes'], 1)
+        self.assertFalse(Vote.objects.filter(user=user).exists())
+        self.assertEqual(find_drift(self.ids)[1:], ([], [], []))
+
+    def test_work_is_bounded_and_resumes(self):
+        """A run stops after max_questions and the next one carries on from the checkpoint, then wraps."""
+        totals = reconcile(self.checkpoint, batch_size=2, max_questions=3)
+        self.assertEqual(totals['questions_checked'], 3)
+        self.assertEqual(read_checkpoint(self.checkpoint), self.ids[2])
+        totals = reconcile(self.checkpoint, batch_size=2, max_questions=3)
+        self.assertEqual((totals['questions_checked'], totals['passes']), (1, 1))
+        self.assertEqual(read_checkpoint(self.checkpoint), 0)
@@ -0,0 +1,116 @@
+"""Test the results and detail pages."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Question, ResultSnapshot, Vote
+
+
+def create_question(question_text, days):
+    """Create a question with the given `question_text`."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time, end_date=time)
+
+
+def create_open_question(question_text):
+    """Create a question published yesterday that can be voted on until tomorrow."""
+    question = create_question(question_text, days=-1)
+    question.end_date = timezone.now() + datetime.timedelta(days=1)
+    question.save()
+    return question
+
+
+def create_votes(question, choices, voters):
+    """Give the question `choices` choices and spread `voters` votes over them."""
+    choices = [question.choice_set.create(choice_text=f'Choice {i}') for i in range(choices)]
+    for i in range(voters):
+        user = User.objects.create_user(f'voter{question.id}-{i}')
+        Vote.objects.cast(user, question, choices[i % len(choices)])
+    return choices
+
+
+class ResultsViewTests(TestCase):
+    """The results page shows tallies without a query per choice."""
+
+    def test_results_show_totals_and_percentages(self):
+        """Each choice shows its votes and share, and the total is shown."""
+        question = create_open_question('Results question.')
+        create_votes(question, choices=2, voters=3)
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertEqual(response.context['total_votes'], 3)
+        self.assertEqual([c.percentage for c in response.context['choices']], [66.7, 33.3])
+        self.assertContains(response, '66.7%')
+
+    def test_results_query_count_is_fixed(self):
+        """The number of queries does not grow with the number of choices or votes."""
+        small = create_open_question('Small.')
+        large = create_open_question('Large.')
+        create_votes(small, choices=1, voters=1)
+        create_votes(large, choices=12, voters=30)
+        for question in (small, large):
+            with self.assertNumQueries(2):
+                self.client.get(reverse('polls:results', args=(question.id,)))
+
+    def test_detail_query_count_is_fixed(self):
+        """The detail page also loads the question and its choices in two queries."""
+        small = create_question(question_text='Small.', days=-1)
+        large = create_question(question_text='Large.', days=-1)
+        create_votes(small, choices=1, voters=0)
+        create_votes(large, choices=12, voters=5)
+        for question in (small, large):
+            with self.assertNumQueries(2):
+                self.client.get(reverse('polls:detail', args=(question.id,)))
+
+
+class ClosedResultsTests(TestCase):
+    """Closed polls are served from their frozen snapshot."""
+
+    def setUp(self):
+        self.question = create_question(question_text='Closed question.', days=-2)
+        create_votes(self.question, choices=2, voters=3)
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_first_access_freezes_the_results(self):
+        """The first request after closing creates the snapshot with the final tallies."""
+        response = self.client.get(self.url)
+        snapshot = ResultSnapshot.objects.get(question=self.question)
+        self.assertEqual(snapshot.total_votes, 3)
+        self.assertEqual([votes for _, _, votes in snapshot.tallies], [2, 1])
+        self.assertEqual(response.content.decode(), snapshot.html)
+        self.assertEqual(response['ETag'], snapshot.etag)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+
+    def test_snapshot_is_served_without_recounting(self):
+        """Later requests read the question and the snapshot only."""
+        self.client.get(self.url)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, '66.7%')
+
+    def test_matching_etag_is_not_modified(self):
+        """A client that already has the snapshot gets a 304."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_pending_messages_are_shown(self):
+        """A client with a message waiting gets its own copy of the page, which is not stored."""
+        User.objects.create_user('admin', password='12345')
+        self.client.login(username='admin', password='12345')
+        self.client.get(self.url)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': 1})
+        response = self.client.get(self.url)
+        self.assertContains(response, "The poll that you selected is not allowed.")
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+        self.assertNotIn('ETag', response)
+        self.assertNotContains(self.client.get(self.url), "The poll that you selected is not allowed.")
+
+    def test_reopened_question_drops_its_snapshot(self):
+        """Moving the end date into the future makes the results live again."""
+        self.client.get(self.url)
+        self.question.end_date = timezone.now() + datetime.timedelta(days=1)
+        self.question.save()
+        self.assertFalse(ResultSnapshot.objects.filter(question=self.question).exists())
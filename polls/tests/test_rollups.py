@@ -0,0 +1,82 @@
+"""Test the vote timestamps, the per-minute rollups and the results over time."""
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Question, Vote, VoteRollup
+
+
+def create_question(question_text, days):
+    """Create a question published ``days`` days ago and still open."""
+    now = timezone.now()
+    return Question.objects.create(question_text=question_text, pub_date=now - datetime.timedelta(days=days),
+                                   end_date=now + datetime.timedelta(days=1))
+
+
+class RollupTests(TestCase):
+    """Votes update their timestamps and the rollup of the minute they were cast in."""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user-{n}', password='12345') for n in range(3)]
+        self.question = create_question("Rollup question.", days=2)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        self.start = timezone.now().replace(second=0, microsecond=0) - datetime.timedelta(hours=1)
+
+    def cast_at(self, minutes, user, choice):
+        """Cast a vote as if ``minutes`` minutes after self.start."""
+        with mock.patch('django.utils.timezone.now', return_value=self.start + datetime.timedelta(minutes=minutes)):
+            Vote.objects.cast(user, self.question, choice)
+
+    def rollups(self):
+        """Return the rollup rows as (minute offset, choice id, votes)."""
+        return sorted((int((row.bucket - self.start).total_seconds() // 60), row.choice_id, row.votes)
+                      for row in VoteRollup.objects.all())
+
+    def test_votes_are_rolled_up_per_minute(self):
+        """New votes count in their minute, and a changed vote moves between choices in its minute."""
+        self.cast_at(0, self.users[0], self.first)
+        self.cast_at(0.5, self.users[1], self.first)
+        self.cast_at(2, self.users[0], self.second)
+        self.assertEqual(self.rollups(), [(0, self.first.pk, 2), (2, self.first.pk, -1), (2, self.second.pk, 1)])
+        vote = Vote.objects.get(user=self.users[0])
+        self.assertEqual(vote.created_at, self.start)
+        self.assertEqual(vote.updated_at, self.start + datetime.timedelta(minutes=2))
+
+    def test_cast_many_rolls_up(self):
+        """Batched votes update the rollups in the same transaction."""
+        Vote.objects.cast_many([(user.pk, self.question.pk, self.second.pk) for user in self.users])
+        self.assertEqual(list(VoteRollup.objects.values_list('choice_id', 'votes')), [(self.second.pk, 3)])
+
+    def test_timeline(self):
+        """The timeline gives the running count per choice at the end of each period with votes."""
+        self.cast_at(0, self.users[0], self.first)
+        self.cast_at(1, self.users[1], self.second)
+        self.cast_at(1, self.users[0], self.second)
+        points = self.question.timeline('minute')['points']
+        self.assertEqual([(p['votes'], p['total'], p['new']) for p in points], [([1, 0], 1, 1), ([0, 2], 2, 1)])
+        self.assertEqual(len(self.question.timeline('day')['points']), 1)
+
+    def test_rebuild_rollups(self):
+        """Rebuilt rollups count every vote at its last change."""
+        self.cast_at(0, self.users[0], self.first)
+        self.cast_at(3, self.users[0], self.second)
+        VoteRollup.objects.all().delete()
+        call_command('rebuild_tallies', rollups=True, stdout=StringIO())
+        self.assertEqual(self.rollups(), [(3, self.second.pk, 1)])
+
+    def test_timeline_page_and_api(self):
+        """The page and the API show the timeline at the requested resolution."""
+        self.cast_at(0, self.users[0], self.first)
+        response = self.client.get(reverse('polls:timeline', args=(self.question.id,)), {'resolution': 'minute'})
+        self.assertContains(response, '<td>1</td>')
+        url = reverse('polls:api-timeline', args=(self.question.id,))
+        data = self.client.get(url, {'resolution': 'day'}).json()
+        self.assertEqual([point['votes'] for point in data['points']], [[1, 0]])
+        self.assertEqual(self.client.get(url, {'resolution': 'week'}).status_code, 400)
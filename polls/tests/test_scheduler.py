@@ -0,0 +1,97 @@
+"""Test the stored question status and the scheduled transitions."""
+import datetime
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..cache import poll_cache
+from ..models import Question, QuestionStatus, ResultSnapshot
+from ..scheduler import next_transition, run_transitions, seconds_to_wait
+
+
+def create_question(question_text, days, open_days=1):
+    """Create a question published ``days`` from now and open for ``open_days`` days after that."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time,
+                                   end_date=time + datetime.timedelta(days=open_days))
+
+
+class QuestionStatusTests(TestCase):
+    """The status follows the dates on save and lags behind the clock safely between passes."""
+
+    def test_status_is_stored_on_save(self):
+        """Saving a question stores the status its dates imply."""
+        self.assertEqual(create_question("Future.", days=1).status, QuestionStatus.SCHEDULED)
+        self.assertEqual(create_question("Open.", days=-1, open_days=2).status, QuestionStatus.OPEN)
+        question = create_question("Closed.", days=-3)
+        self.assertEqual(question.status, QuestionStatus.CLOSED)
+        question.end_date = timezone.now() + datetime.timedelta(days=1)
+        question.save(update_fields=['end_date'])
+        self.assertEqual(Question.objects.get(pk=question.pk).status, QuestionStatus.OPEN)
+
+    def test_stale_status_still_filters_by_date(self):
+        """A question whose pub_date passed before the scheduler ran is already listed and open."""
+        question = create_question("Opening.", days=1)
+        Question.objects.filter(pk=question.pk).update(pub_date=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertEqual(Question.objects.get(pk=question.pk).status, QuestionStatus.SCHEDULED)
+        self.assertTrue(Question.objects.published().open().filter(pk=question.pk).exists())
+        self.assertTrue(Question.objects.get(pk=question.pk).can_vote())
+
+
+class RunTransitionsTests(TestCase):
+    """A pass stores the new statuses, finalizes closed polls and reports what it did."""
+
+    def test_open_and_close(self):
+        """Questions past their pub_date open, and those past their end_date close with a snapshot."""
+        opening = create_question("Opening.", days=1)
+        closing = create_question("Closing.", days=-2, open_days=3)
+        closing.choice_set.create(choice_text="Yes")
+        now = timezone.now()
+        Question.objects.filter(pk=opening.pk).update(pub_date=now - datetime.timedelta(seconds=1))
+        Question.objects.filter(pk=closing.pk).update(end_date=now - datetime.timedelta(seconds=1))
+        self.assertEqual(run_transitions(lead=60), {'warmed': 0, 'opened': 1, 'closed': 1})
+        self.assertEqual(Question.objects.get(pk=opening.pk).status, QuestionStatus.OPEN)
+        self.assertEqual(Question.objects.get(pk=closing.pk).status, QuestionStatus.CLOSED)
+        self.assertTrue(ResultSnapshot.objects.filter(question=closing).exists())
+        self.assertEqual(run_transitions(lead=60), {'warmed': 0, 'opened': 0, 'closed': 0})
+
+    def test_wakes_up_for_the_next_transition(self):
+        """The worker sleeps until LEAD seconds before the next poll opens, at most INTERVAL."""
+        now = timezone.now()
+        question = create_question("Later.", days=1)
+        Question.objects.filter(pk=question.pk).update(pub_date=now + datetime.timedelta(seconds=100))
+        self.assertEqual(next_transition(now), now + datetime.timedelta(seconds=100))
+        self.assertAlmostEqual(seconds_to_wait(lead=60, interval=300, now=now), 40)
+        self.assertEqual(seconds_to_wait(lead=60, interval=10, now=now), 10)
+
+
+@override_settings(POLLS_CACHE={'ENABLED': True})
+class WarmingTests(TestCase):
+    """Polls about to open are loaded into the poll cache, but not shown early."""
+
+    def setUp(self):
+        caches['polls'].clear()
+        poll_cache.local.clear()
+        poll_cache.counters.clear()
+
+    def test_upcoming_question_is_warmed(self):
+        """The detail page is cached before pub_date and still a 404 until then."""
+        question = create_question("Soon.", days=1)
+        Question.objects.filter(pk=question.pk).update(pub_date=timezone.now() + datetime.timedelta(seconds=30))
+        self.assertEqual(run_transitions(lead=60)['warmed'], 1)
+        self.assertEqual(poll_cache.stats()['detail']['miss'], 1)
+        response = self.client.get(reverse('polls:detail', args=(question.id,)))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(poll_cache.stats()['detail']['hit'], 1)
+
+    def test_opened_question_is_warmed_again(self):
+        """The context warmed while the question was scheduled is replaced once it opens."""
+        question = create_question("Soon.", days=1)
+        Question.objects.filter(pk=question.pk).update(pub_date=timezone.now() + datetime.timedelta(seconds=30))
+        run_transitions(lead=60)
+        Question.objects.filter(pk=question.pk).update(pub_date=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(run_transitions(lead=60)['opened'], 1)
+        context = poll_cache.get_or_set('detail', f'question:{question.pk}', question.pk, lambda: None)
+        self.assertEqual(context['question'].status, QuestionStatus.OPEN)
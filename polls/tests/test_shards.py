@@ -0,0 +1,109 @@
+"""Test the sharded vote counters of busy questions."""
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..api import last_modified
+from ..models import SHARD_STAMP_INTERVAL, Choice, ChoiceShard, Question, Vote
+from ..streaming import read_changes
+
+
+def create_question(question_text, days, shards=4):
+    """Create a question that closes in ``days`` days, with sharded counters."""
+    now = timezone.now()
+    return Question.objects.create(question_text=question_text, pub_date=now - datetime.timedelta(days=2),
+                                   end_date=now + datetime.timedelta(days=days), counter_shards=shards)
+
+
+class ShardedCounterTests(TestCase):
+    """Votes on a sharded question land on shard rows and reads add them up."""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user-{n}', password='12345') for n in range(6)]
+        self.question = create_question("Hot question.", days=1)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def vote(self, users, choice):
+        """Cast a vote for ``choice`` as each user."""
+        for user in users:
+            Vote.objects.cast(user, self.question, choice)
+
+    def results(self):
+        """Return the votes per choice and the total as read by the results page."""
+        question = Question.objects.get(pk=self.question.pk)
+        results = question.results()
+        return [choice.votes for choice in results['choices']], results['total_votes']
+
+    def test_votes_go_to_shards(self):
+        """The choice and question rows stay untouched and the results add the shards up."""
+        self.vote(self.users[:4], self.first)
+        self.vote(self.users[:1], self.second)
+        self.assertEqual(Choice.objects.get(pk=self.first.pk).vote_count, 0)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).total_votes, 0)
+        self.assertLessEqual(ChoiceShard.objects.filter(choice=self.first).count(), 4)
+        self.assertEqual(self.results(), ([3, 1], 4))
+
+    def test_cast_many_uses_shards(self):
+        """Batched votes on a sharded question go to the shards too."""
+        Vote.objects.cast_many([(user.pk, self.question.pk, self.second.pk) for user in self.users])
+        self.assertEqual(Choice.objects.get(pk=self.second.pk).vote_count, 0)
+        self.assertEqual(self.results(), ([0, 6], 6))
+
+    def test_fold_closed_questions(self):
+        """Folding adds the shards to the tallies, deletes them and stops sharding."""
+        self.vote(self.users[:3], self.first)
+        self.vote(self.users[3:5], self.second)
+        Question.objects.filter(pk=self.question.pk).update(end_date=timezone.now() - datetime.timedelta(days=1))
+        call_command('shard_tallies', fold_closed=True, stdout=StringIO())
+        question = Question.objects.get(pk=self.question.pk)
+        self.assertEqual((question.counter_shards, question.total_votes), (1, 5))
+        self.assertEqual(Choice.objects.get(pk=self.first.pk).vote_count, 3)
+        self.assertFalse(ChoiceShard.objects.exists())
+        self.assertEqual(self.results(), ([3, 2], 5))
+
+    def test_change_shard_count(self):
+        """Changing the number of shards keeps every vote."""
+        self.vote(self.users[:3], self.first)
+        call_command('shard_tallies', self.question.pk, shards=8, stdout=StringIO())
+        self.vote(self.users[3:], self.second)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).counter_shards, 8)
+        self.assertEqual(self.results(), ([3, 3], 6))
+
+    def test_api_list_adds_shards(self):
+        """The question list reports the votes still in shards."""
+        self.vote(self.users[:2], self.first)
+        data = self.client.get(reverse('polls:api-questions')).json()
+        self.assertEqual(data['results'][0]['total_votes'], 2)
+
+    def test_timeline_totals_add_shards(self):
+        """The timeline page and API report the votes still in shards."""
+        self.vote(self.users[:3], self.first)
+        response = self.client.get(reverse('polls:timeline', args=(self.question.pk,)))
+        self.assertEqual(response.context['total_votes'], 3)
+        data = self.client.get(reverse('polls:api-timeline', args=(self.question.pk,))).json()
+        self.assertEqual(data['total_votes'], 3)
+
+    def test_votes_within_the_stamp_interval_are_seen(self):
+        """Votes that did not move last_vote_at still reach the live feed and the API's Last-Modified."""
+        self.vote(self.users[:1], self.first)
+        stamp, tallies = read_changes([self.question.pk], {})[self.question.pk]
+        self.vote(self.users[1:2], self.first)
+        question = Question.objects.get(pk=self.question.pk)
+        self.assertEqual(question.last_vote_at, stamp)
+        self.assertEqual(read_changes([self.question.pk], {self.question.pk: stamp})[self.question.pk][1],
+                         {self.first.pk: 2, self.second.pk: 0})
+        now = timezone.now()
+        self.assertEqual(last_modified(question, now), min(now, stamp + SHARD_STAMP_INTERVAL))
+
+    def test_rebuild_tallies_drops_shards(self):
+        """Rebuilding the tallies from the votes replaces the shards."""
+        self.vote(self.users[:2], self.first)
+        call_command('rebuild_tallies', stdout=StringIO())
+        self.assertFalse(ChoiceShard.objects.exists())
+        self.assertEqual(self.results(), ([2, 0], 2))
@@ -0,0 +1,125 @@
+"""Test the live results stream."""
+import asyncio
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Question, Vote
+from ..streaming import TallyFeed, stream_results
+
+
+def create_question(question_text, days):
+    """Create a question with the given `question_text`."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time, end_date=time)
+
+
+class FakeClient:
+    """In-memory ASGI client that records the response and can hang up."""
+
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.gone = asyncio.Event()
+
+    async def receive(self):
+        await self.gone.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        await self.messages.put(message)
+
+    async def next_event(self):
+        """Return the name and data of the next event, skipping keep-alives."""
+        while True:
+            message = await asyncio.wait_for(self.messages.get(), timeout=5)
+            body = message.get('body', b'').decode()
+            if body.startswith('event:'):
+                name, data = body.strip().split('\n')
+                return name.split(': ')[1], json.loads(data[len('data: '):])
+
+
+class StreamTests(TestCase):
+    """Clients get the tallies at once and then only what changed."""
+
+    def setUp(self):
+        self.question = create_question(question_text='Live question.', days=-1)
+        self.question.end_date = timezone.now() + datetime.timedelta(days=1)
+        self.question.save()
+        self.yes = self.question.choice_set.create(choice_text='Yes')
+        self.no = self.question.choice_set.create(choice_text='No')
+
+    async def test_snapshot_then_changes(self):
+        """The first event holds every tally; a vote sends only the changed choice."""
+        feed = TallyFeed(rate=50)
+        client = FakeClient()
+        stream = asyncio.ensure_future(
+            stream_results({}, client.receive, client.send, self.question.id, feed=feed))
+        self.assertEqual((await client.messages.get())['status'], 200)
+        name, data = await client.next_event()
+        self.assertEqual((name, data['changes'], data['total']),
+                         ('snapshot', {str(self.yes.id): 0, str(self.no.id): 0}, 0))
+        user = await sync_to_async(User.objects.create_user)('voter')
+        await sync_to_async(Vote.objects.cast)(user, self.question, self.no)
+        name, data = await client.next_event()
+        self.assertEqual((name, data['changes'], data['total']), ('tally', {str(self.no.id): 1}, 1))
+        client.gone.set()
+        await asyncio.wait_for(stream, timeout=5)
+        self.assertEqual(feed.subscribers, {})
+
+    async def test_unpublished_question_is_not_found(self):
+        """Streams of future questions are refused."""
+        future = await sync_to_async(create_question)('Future question.', 5)
+        client = FakeClient()
+        await stream_results({}, client.receive, client.send, future.id, feed=TallyFeed(rate=50))
+        self.assertEqual((await client.messages.get())['status'], 404)
+
+
+class TallyFeedTests(TestCase):
+    """The feed reads once per tick for everyone and merges bursts."""
+
+    async def test_burst_is_coalesced_and_read_once_per_tick(self):
+        """Many subscribers cost one read per tick, and changes between sends merge."""
+        reads = []
+        tallies = {1: 0}
+
+        def reader(question_ids, stamps):
+            reads.append(list(question_ids))
+            return {7: (len(reads), dict(tallies))}
+
+        feed = TallyFeed(rate=1000, reader=reader)
+        subscribers = [await feed.subscribe(7) for _ in range(50)]
+        self.assertEqual(len(reads), 1)
+        for subscriber in subscribers:
+            subscriber.take()
+        for votes in range(1, 4):
+            tallies[1] = votes
+            await feed._refresh([7])
+        self.assertEqual(subscribers[0].take(), {'changes': {1: 3}, 'total': 3})
+        for subscriber in subscribers:
+            feed.unsubscribe(7, subscriber)
+
+    async def test_failed_read_does_not_stop_the_feed(self):
+        """An error while reading is logged and the subscribers get the next tick's changes."""
+        tallies = {1: 0}
+        failures = []
+
+        def reader(question_ids, stamps):
+            if tallies[1] == 1 and not failures:
+                failures.append(True)
+                raise RuntimeError("database is locked")
+            return {7: (tallies[1], dict(tallies))}
+
+        feed = TallyFeed(rate=100, reader=reader)
+        subscriber = await feed.subscribe(7)
+        subscriber.take()
+        tallies[1] = 1
+        with self.assertLogs('polls', 'ERROR'):
+            await asyncio.wait_for(subscriber.ready.wait(), timeout=5)
+        self.assertEqual(subscriber.take(), {'changes': {1: 1}, 'total': 1})
+        self.assertFalse(feed._task.done())
+        feed.unsubscribe(7, subscriber)
+        await asyncio.wait_for(feed._task, timeout=5)
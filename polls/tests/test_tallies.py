@@ -0,0 +1,69 @@
+"""Test the stored vote tallies."""
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Choice, Question, Vote
+
+
+def create_question(question_text, days):
+    """Create a question with the given `question_text`."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time, end_date=time)
+
+
+class TallyTests(TestCase):
+    """Votes keep Choice.vote_count and Question.total_votes up to date."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('admin', password='12345')
+        self.question = create_question(question_text='Tally question.', days=-1)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def assertTallies(self, first, second, total):
+        """Check the stored tallies against the expected numbers."""
+        self.assertEqual(Choice.objects.get(pk=self.first.pk).votes, first)
+        self.assertEqual(Choice.objects.get(pk=self.second.pk).votes, second)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).total_votes, total)
+
+    def test_new_vote_increments_choice_and_total(self):
+        """The first vote of a user counts once for the choice and the question."""
+        Vote.objects.cast(self.user, self.question, self.first)
+        self.assertTallies(1, 0, 1)
+
+    def test_changed_vote_moves_the_tally(self):
+        """Changing a vote decrements the old choice and keeps the total."""
+        Vote.objects.cast(self.user, self.question, self.first)
+        Vote.objects.cast(self.user, self.question, self.second)
+        self.assertTallies(0, 1, 1)
+
+    def test_repeated_vote_is_not_counted_twice(self):
+        """Voting for the same choice again leaves the tallies alone."""
+        Vote.objects.cast(self.user, self.question, self.first)
+        Vote.objects.cast(self.user, self.question, self.first)
+        self.assertTallies(1, 0, 1)
+
+    def test_rebuild_tallies_command(self):
+        """rebuild_tallies recounts drifted tallies from the votes."""
+        Vote.objects.create(user=self.user, question=self.question, choice=self.second)
+        Choice.objects.filter(pk=self.first.pk).update(vote_count=7)
+        call_command('rebuild_tallies', stdout=StringIO())
+        self.assertTallies(0, 1, 1)
+
+    def test_unique_vote_per_user_and_question(self):
+        """The database refuses a second vote row for the same user and question."""
+        Vote.objects.create(user=self.user, question=self.question, choice=self.first)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(user=self.user, question=self.question, choice=self.second)
+
+    def test_cast_returns_previous_choice(self):
+        """cast() reports the choice that the vote replaced and never duplicates the row."""
+        self.assertIsNone(Vote.objects.cast(self.user, self.question, self.first))
+        self.assertEqual(Vote.objects.cast(self.user, self.question, self.second), self.first.pk)
+        self.assertEqual(Vote.objects.filter(user=self.user, question=self.question).count(), 1)
@@ -0,0 +1,159 @@
+"""Test the rate limits and load shedding in front of the vote view."""
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from ..metrics import registry
+from ..middleware import ThrottleMiddleware
+from ..models import Question
+from ..throttle import RateLimiter, parse_rate
+from ..views import get_client_ip
+
+
+def create_question(question_text, days):
+    """Create a question published ``days`` ago and open for two more days."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time,
+                                   end_date=timezone.now() + datetime.timedelta(days=2))
+
+
+def throttle(**view):
+    """Return POLLS_THROTTLE limiting the vote view with ``view``."""
+    return {'ENABLED': True, 'CACHE': 'throttle', 'VIEWS': {'polls:vote': view}}
+
+
+class RateLimiterTests(TestCase):
+    """The sliding window counts the previous window by how much of it still overlaps."""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.limiter = RateLimiter(caches['throttle'])
+
+    def test_parse_rate(self):
+        """Rates are a count per second, minute, hour or day."""
+        self.assertEqual(parse_rate('20/m'), (20, 60))
+        self.assertEqual(parse_rate('5/hour'), (5, 3600))
+        self.assertIsNone(parse_rate(None))
+
+    def test_limit_within_a_window(self):
+        """Requests over the limit are told to wait until the window ends."""
+        self.assertEqual([self.limiter.hit('a', 2, 60, now=600) for _ in range(2)], [0, 0])
+        self.assertEqual(self.limiter.hit('a', 2, 60, now=615), 45)
+        self.assertEqual(self.limiter.hit('b', 2, 60, now=615), 0)
+
+    def test_previous_window_decays(self):
+        """Requests of the previous window weigh less as the window slides away from them."""
+        for _ in range(4):
+            self.limiter.hit('a', 4, 60, now=600)
+        self.assertGreater(self.limiter.hit('a', 4, 60, now=665), 0)
+        self.assertEqual(self.limiter.hit('a', 4, 60, now=710), 0)
+
+
+class ThrottleViewTests(TestCase):
+    """Clients over their rate get a 429 before the database is queried."""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        registry.clear()
+        User.objects.create_user('admin', password='12345')
+        self.client.login(username='admin', password='12345')
+        self.question = create_question("Throttled?", days=-1)
+        self.choice = self.question.choice_set.create(choice_text="Yes")
+        self.url = reverse('polls:vote', args=(self.question.id,))
+
+    @override_settings(POLLS_THROTTLE=throttle(RATE='2/m'))
+    def test_session_rate(self):
+        """The third vote in a minute is refused with Retry-After, reading nothing but the session."""
+        for _ in range(2):
+            self.assertEqual(self.client.post(self.url, {'choice': self.choice.id}).status_code, 302)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual([query['sql'] for query in queries if 'django_session' not in query['sql']], [])
+        self.assertEqual(registry.counters[('polls_throttled_total', (('reason', 'rate'), ('view', 'polls:vote')))],
+                         1)
+
+    @override_settings(POLLS_THROTTLE=throttle(RATE='1/m'))
+    def test_new_session_keeps_the_user_rate(self):
+        """Logging in again, with a fresh session cookie, does not reset the user's window."""
+        self.assertEqual(self.client.post(self.url, {'choice': self.choice.id}).status_code, 302)
+        self.client.logout()
+        self.client.login(username='admin', password='12345')
+        self.assertEqual(self.client.post(self.url, {'choice': self.choice.id}).status_code, 429)
+
+    @override_settings(POLLS_THROTTLE=throttle(IP_RATE='1/m'))
+    def test_ip_rate(self):
+        """The address is limited even for clients without a session."""
+        self.client.logout()
+        self.assertEqual(self.client.post(self.url).status_code, 302)
+        self.assertEqual(self.client.post(self.url).status_code, 429)
+
+    @override_settings(POLLS_THROTTLE=throttle(RATE='1/m'))
+    def test_reads_are_not_limited(self):
+        """Only the configured methods count."""
+        for _ in range(3):
+            self.assertNotEqual(self.client.get(self.url).status_code, 429)
+
+
+class LoadSheddingTests(TestCase):
+    """A saturated view answers 503 instead of queueing more work."""
+
+    def setUp(self):
+        registry.clear()
+        self.factory = RequestFactory()
+
+    def request(self):
+        """Return a vote POST as the middleware sees it."""
+        request = self.factory.post('/polls/1/vote/')
+        request.resolver_match = resolve('/polls/1/vote/')
+        return request
+
+    @override_settings(POLLS_THROTTLE=throttle(CONCURRENCY=1))
+    def test_concurrency(self):
+        """A second request is shed while the first holds the only slot, and admitted once it is done."""
+        middleware = ThrottleMiddleware(HttpResponse)
+        first, second = self.request(), self.request()
+        self.assertIsNone(middleware.process_view(first, None, (), {}))
+        response = middleware.process_view(second, None, (), {})
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        middleware(first)
+        self.assertIsNone(middleware.process_view(self.request(), None, (), {}))
+
+    @override_settings(POLLS_THROTTLE=throttle(MAX_QUEUE=10))
+    def test_write_queue(self):
+        """Votes are shed while the write-behind buffer holds MAX_QUEUE of them."""
+        middleware = ThrottleMiddleware(HttpResponse)
+        buffer = mock.Mock(**{'backlog.return_value': 10})
+        with mock.patch('polls.middleware.get_buffer', return_value=buffer):
+            response = middleware.process_view(self.request(), None, (), {})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(registry.counters[('polls_throttled_total', (('reason', 'queue'), ('view', 'polls:vote')))],
+                         1)
+
+
+class ClientIPTests(TestCase):
+    """X-Forwarded-For only counts behind a trusted proxy."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_forwarded_for_is_ignored_from_clients(self):
+        """A client cannot pick its own address."""
+        request = self.factory.get('/', REMOTE_ADDR='203.0.113.7', HTTP_X_FORWARDED_FOR='198.51.100.1')
+        self.assertEqual(get_client_ip(request), '203.0.113.7')
+
+    @override_settings(POLLS_TRUSTED_PROXIES=['10.0.0.1', '10.0.0.2'])
+    def test_forwarded_for_behind_trusted_proxies(self):
+        """The address the trusted proxies received the request from is used, not one the client sent."""
+        request = self.factory.get('/', REMOTE_ADDR='10.0.0.1',
+                                   HTTP_X_FORWARDED_FOR='198.51.100.1, 203.0.113.7, 10.0.0.2')
+        self.assertEqual(get_client_ip(request), '203.0.113.7')
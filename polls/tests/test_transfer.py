@@ -0,0 +1,104 @@
+"""Test the streaming import and export commands."""
+import datetime
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from polls.models import Choice, Question, QuestionQuerySet, Vote
+
+
+def create_question(question_text, days):
+    """Create a question open for ``days`` days with two choices."""
+    now = timezone.now()
+    question = Question.objects.create(question_text=question_text, pub_date=now - datetime.timedelta(days=1),
+                                       end_date=now + datetime.timedelta(days=days))
+    question.choice_set.create(choice_text="Yes")
+    question.choice_set.create(choice_text="No")
+    return question
+
+
+class TransferTests(TestCase):
+    """Polls survive an export and an import into an empty database."""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user-{n}', password='12345') for n in range(3)]
+        for n in range(2):
+            question = create_question(f"Question {n}?", days=n + 1)
+            yes, no = question.choice_set.order_by('pk')
+            for user, choice in zip(self.users, (yes, yes, no)):
+                Vote.objects.cast(user, question, choice)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def snapshot(self):
+        """Return the poll tables in a comparable form."""
+        return (list(Question.objects.order_by('pk').values_list('pk', 'question_text', 'pub_date', 'end_date',
+                                                                 'total_votes')),
+                list(Choice.objects.order_by('pk').values_list('pk', 'question_id', 'choice_text', 'vote_count')),
+                sorted(Vote.objects.values_list('user__username', 'question_id', 'choice_id')))
+
+    def round_trip(self, name, **options):
+        """Export to ``name``, empty the tables, import the file and return the import output."""
+        path = os.path.join(self.directory.name, name)
+        call_command('export_polls', path, stdout=StringIO())
+        Question.objects.all().delete()
+        out = StringIO()
+        call_command('import_polls', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_jsonl_round_trip(self):
+        """Questions, choices, votes and recomputed tallies come back unchanged."""
+        before = self.snapshot()
+        output = self.round_trip('polls.jsonl', batch_size=3)
+        self.assertEqual(self.snapshot(), before)
+        self.assertIn("Imported 2 questions, 4 choices and 6 votes", output)
+
+    def test_compressed_csv_round_trip(self):
+        """The CSV format and gzip compression are picked from the file name."""
+        before = self.snapshot()
+        self.round_trip('polls.csv.gz')
+        self.assertEqual(self.snapshot(), before)
+
+    def test_resume_after_checkpoint(self):
+        """Records before the checkpoint are not read again, and the checkpoint is removed at the end."""
+        path = os.path.join(self.directory.name, 'polls.jsonl')
+        call_command('export_polls', path, stdout=StringIO())
+        Vote.objects.all().delete()
+        with open(f'{path}.progress', 'w') as progress:
+            progress.write('6')
+        out = StringIO()
+        call_command('import_polls', path, batch_size=2, stdout=out)
+        self.assertIn("Resuming after 6 records.", out.getvalue())
+        self.assertIn("0 questions, 0 choices and 6 votes", out.getvalue())
+        self.assertEqual(Vote.objects.count(), 6)
+        self.assertFalse(os.path.exists(f'{path}.progress'))
+
+    def test_tallies_are_rebuilt_once(self):
+        """However many batches the votes take, each question's tallies are recomputed once, at the end."""
+        before = self.snapshot()
+        with mock.patch.object(QuestionQuerySet, 'rebuild_tallies', autospec=True,
+                               side_effect=QuestionQuerySet.rebuild_tallies) as rebuild:
+            self.round_trip('polls.jsonl', batch_size=1)
+        self.assertEqual([list(call.args[0]) for call in rebuild.call_args_list],
+                         [[question] for question in Question.objects.order_by('pk')])
+        self.assertEqual(self.snapshot(), before)
+
+    def test_import_into_populated_database(self):
+        """Ids taken by different rows stop the import instead of attaching votes to them."""
+        path = os.path.join(self.directory.name, 'polls.jsonl')
+        call_command('export_polls', path, stdout=StringIO())
+        pk = Question.objects.order_by('pk').values_list('pk', flat=True).first()
+        Question.objects.all().delete()
+        now = timezone.now()
+        unrelated = Question.objects.create(pk=pk, question_text="Unrelated question?", pub_date=now, end_date=now)
+        unrelated.choice_set.create(choice_text="Maybe")
+        before = self.snapshot()
+        with self.assertRaisesMessage(CommandError, f"question {pk} already exists here as a different question"):
+            call_command('import_polls', path, stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
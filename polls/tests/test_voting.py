@@ -2,7 +2,7 @@
 import datetime
 from django.contrib.auth.models import User
 from django.urls import reverse
-from polls.models import Question
+from polls.models import Question, Vote
 from django.test import TestCase
 from django.utils import timezone
 
@@ -29,3 +29,27 @@ class VotingTests(TestCase):
         question = create_question(question_text='Avaliable Question.', days=10)
         response = self.client.get(reverse('polls:vote', args=(question.id,)))
         self.assertEqual(response.status_code, 302)
+
+    def test_vote_is_recorded_for_user(self):
+        """A vote stores the selected choice for the user and question."""
+        self.client.login(username='admin', password='12345')
+        question = create_question(question_text='Avaliable Question.', days=-1)
+        question.end_date = timezone.now() + datetime.timedelta(days=1)
+        question.save()
+        choice = question.choice_set.create(choice_text='Yes')
+        response = self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+        self.assertRedirects(response, reverse('polls:results', args=(question.id,)))
+        self.assertEqual(self.user.vote_set.get(question=question).choice, choice)
+
+    def test_detail_shows_own_latest_vote(self):
+        """The detail page shows the current user's choice, not another user's."""
+        other = User.objects.create_user('other', password='12345')
+        question = create_question(question_text='Avaliable Question.', days=-1)
+        mine = question.choice_set.create(choice_text='Mine')
+        theirs = question.choice_set.create(choice_text='Theirs')
+        Vote.objects.create(user=self.user, question=question, choice=mine)
+        Vote.objects.create(user=other, question=question, choice=theirs)
+        self.client.login(username='admin', password='12345')
+        response = self.client.get(reverse('polls:detail', args=(question.id,)))
+        self.assertContains(response, "Your latest vote is Mine")
+        self.assertNotContains(response, "Your latest vote is Theirs")
@@ -0,0 +1,87 @@
+"""Per-client rate limits and load shedding for the write views.
+
+Every view listed in POLLS_THROTTLE['VIEWS'] can have:
+
+* ``RATE``: requests per logged-in user, read from the session, e.g. ``'20/m'``;
+* ``IP_RATE``: requests per client IP address, as found by get_client_ip;
+* ``CONCURRENCY``: requests of the view running at once in this process;
+* ``MAX_QUEUE``: votes waiting in the write-behind buffer.
+
+Rates are checked with a sliding window over counters in the CACHE backend, which
+is per process with locmem and shared with memcached or Redis. It is kept apart
+from the page cache so that page churn does not evict the windows. Clients over a
+rate get a 429 and saturated views a 503, both with Retry-After, before the view or
+the user lookup touch the database.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': False,
+    'CACHE': 'throttle',
+    'VIEWS': {},
+}
+
+VIEW_DEFAULTS = {
+    'METHODS': ('POST',),
+    'RATE': None,
+    'IP_RATE': None,
+    'CONCURRENCY': 0,
+    'MAX_QUEUE': 0,
+    'RETRY_AFTER': 1,
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def throttle_settings():
+    """Return the POLLS_THROTTLE setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_THROTTLE', {})}
+
+
+def parse_rate(rate):
+    """Return ``(requests, seconds)`` for a rate like ``'20/m'``, or None for no limit."""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0].lower()]
+
+
+def client_key(value):
+    """Return a short, cache-key safe digest of a client identifier."""
+    return hashlib.sha1(value.encode()).hexdigest()[:16]
+
+
+class RateLimiter:
+    """Sliding-window request counters in a cache backend.
+
+    Each window has one counter, and a request is allowed while the current count plus
+    the previous window's count, weighted by how much of it still overlaps the sliding
+    window, stays within the limit.
+    """
+
+    def __init__(self, cache):
+        """Keep the counters in ``cache``."""
+        self.cache = cache
+
+    def hit(self, key, limit, window, now=None):
+        """Count a request for ``key``; return 0 if it is allowed, else the seconds to wait."""
+        now = time.time() if now is None else now
+        index = int(now // window)
+        current_key = f'polls:throttle:{key}:{index}'
+        self.cache.add(current_key, 0, window * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            self.cache.set(current_key, 1, window * 2)
+            current = 1
+        previous = self.cache.get(f'polls:throttle:{key}:{index - 1}', 0)
+        remaining = window - (now - index * window)
+        if previous * remaining / window + current <= limit:
+            return 0
+        if current >= limit or not previous:
+            return max(1, math.ceil(remaining))
+        return max(1, math.ceil(remaining - (limit - current) * window / previous))
@@ -0,0 +1,196 @@
+"""Stream questions, choices and votes to and from JSON lines or CSV with constant memory.
+
+A file holds one record per line, parents first: every question, then every choice,
+then every vote. Questions and choices keep their ids and votes name their user by
+username, so an export can be loaded into another database. Rows whose id or
+(user, question) pair already exists are left alone, which makes it safe to run an
+interrupted import again, but a question or choice whose id is taken by a different
+row stops the import rather than attaching the file's choices and votes to it. The
+tallies of the questions that received votes are recomputed once, at the end.
+"""
+import csv
+import gzip
+import itertools
+import json
+import sys
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Choice, Question, Vote
+
+FORMATS = ('jsonl', 'csv')
+
+#: CSV columns; each record type leaves the ones it does not use empty.
+COLUMNS = ('type', 'id', 'question', 'choice', 'user', 'text', 'pub_date', 'end_date', 'created_at', 'updated_at')
+
+
+def guess_format(path):
+    """Return the format implied by the file name, JSON lines unless it ends in .csv or .csv.gz."""
+    return 'csv' if path.endswith(('.csv', '.csv.gz')) else 'jsonl'
+
+
+def open_stream(path, mode):
+    """Open ``path`` as text for reading ('r') or writing ('w'); '-' is stdin/stdout and .gz is compressed."""
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def export_records(chunk_size=2000, questions=None):
+    """Yield every question, choice and vote as a record, reading the tables with server-side chunks.
+
+    ``questions`` limits the export to a queryset of questions and their choices and votes.
+    """
+    choices, votes = Choice.objects.all(), Vote.objects.all()
+    if questions is None:
+        questions = Question.objects.all()
+    else:
+        choices, votes = choices.filter(question__in=questions), votes.filter(question__in=questions)
+    for pk, text, pub_date, end_date in questions.order_by('pk').values_list(
+            'pk', 'question_text', 'pub_date', 'end_date').iterator(chunk_size):
+        yield {'type': 'question', 'id': pk, 'text': text,
+               'pub_date': pub_date.isoformat(), 'end_date': end_date.isoformat()}
+    for pk, question_id, text in choices.order_by('pk').values_list(
+            'pk', 'question_id', 'choice_text').iterator(chunk_size):
+        yield {'type': 'choice', 'id': pk, 'question': question_id, 'text': text}
+    for username, question_id, choice_id, created_at, updated_at in votes.order_by('pk').values_list(
+            'user__username', 'question_id', 'choice_id', 'created_at', 'updated_at').iterator(chunk_size):
+        record = {'type': 'vote', 'question': question_id, 'choice': choice_id, 'user': username}
+        if created_at:
+            record.update(created_at=created_at.isoformat(), updated_at=updated_at.isoformat())
+        yield record
+
+
+def write_records(stream, records, fmt):
+    """Write the records to the stream and return how many of each type were written."""
+    counts = Counter()
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, COLUMNS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(record):
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+    for record in records:
+        write(record)
+        counts[record['type']] += 1
+    return counts
+
+
+def read_records(stream, fmt):
+    """Yield the records of a stream written by write_records, one line at a time."""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if value not in ('', None)}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def check_collisions(model, rows, fields):
+    """Raise ValueError if one of the numbered ``rows`` has the id of an existing, different row.
+
+    An existing row with the same ``fields`` is the row itself, saved by an earlier run.
+    """
+    existing = {row[0]: row[1:] for row in model.objects.filter(pk__in=[obj.pk for _, obj in rows])
+                .values_list('pk', *fields)}
+    for number, obj in rows:
+        if obj.pk in existing and existing[obj.pk] != tuple(getattr(obj, field) for field in fields):
+            raise ValueError(f"Record {number}: {model._meta.verbose_name} {obj.pk} already exists here "
+                             f"as a different {model._meta.verbose_name}; import into an empty database.")
+
+
+def save_batch(batch):
+    """Insert one batch of records in a single transaction and return how many of each type it held.
+
+    Tallies are not touched; import_records recomputes them once the last batch is saved.
+    """
+    questions, choices, votes = [], [], []
+    for number, record in batch:
+        kind = record.get('type')
+        try:
+            if kind == 'question':
+                questions.append((number, Question(pk=int(record['id']), question_text=record['text'],
+                                                   pub_date=parse_datetime(record['pub_date']),
+                                                   end_date=parse_datetime(record['end_date']))))
+            elif kind == 'choice':
+                choices.append((number, Choice(pk=int(record['id']), question_id=int(record['question']),
+                                               choice_text=record['text'])))
+            elif kind == 'vote':
+                created_at, updated_at = (parse_datetime(record.get(key, '')) for key in ('created_at', 'updated_at'))
+                votes.append((record['user'], int(record['question']), int(record['choice']), created_at, updated_at))
+            else:
+                raise ValueError(f"unknown record type {kind!r}")
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Record {number}: {error}") from error
+    users = dict(User.objects.filter(username__in={vote[0] for vote in votes}).values_list('username', 'pk'))
+    known = [Vote(user_id=users[username], question_id=question_id, choice_id=choice_id,
+                  created_at=created_at, updated_at=updated_at)
+             for username, question_id, choice_id, created_at, updated_at in votes if username in users]
+    with transaction.atomic(using=router.db_for_write(Vote)):
+        check_collisions(Question, questions, ('question_text', 'pub_date'))
+        check_collisions(Choice, choices, ('question_id', 'choice_text'))
+        Question.objects.bulk_create([question for _, question in questions], ignore_conflicts=True)
+        Question.objects.filter(pk__in=[question.pk for _, question in questions]).refresh_status()
+        Choice.objects.bulk_create([choice for _, choice in choices], ignore_conflicts=True)
+        Vote.objects.bulk_create(known, ignore_conflicts=True)
+    return Counter(question=len(questions), choice=len(choices), vote=len(known),
+                   unknown_user=len(votes) - len(known))
+
+
+def import_records(records, batch_size=1000, skip=0, progress=None):
+    """Save the records in batches of ``batch_size``, one transaction per batch.
+
+    The first ``skip`` records are passed over, so that an interrupted import can resume.
+    ``progress(done)`` is called after each committed batch with the number of records
+    consumed so far, skipped ones included. The tallies and rollups of every question
+    with votes in the file, skipped records included, are then recomputed once, in
+    chunks of ``batch_size`` questions. Return how many of each type were saved.
+    """
+    counts, done, voted = Counter(), skip, set()
+
+    def collect(records):
+        for record in records:
+            if record.get('type') == 'vote' and str(record.get('question', '')).isdigit():
+                voted.add(int(record['question']))
+            yield record
+
+    numbered = itertools.islice(enumerate(collect(records), 1), skip, None)
+    while True:
+        batch = list(itertools.islice(numbered, batch_size))
+        if not batch:
+            break
+        counts += save_batch(batch)
+        done += len(batch)
+        if progress:
+            progress(done)
+    rebuild_questions(voted, batch_size)
+    reset_sequences()
+    return counts
+
+
+def rebuild_questions(pks, chunk_size=1000):
+    """Recompute the tallies and rollups of the questions in ``pks``, one transaction per chunk."""
+    pks = sorted(pks)
+    for start in range(0, len(pks), chunk_size):
+        questions = Question.objects.filter(pk__in=pks[start:start + chunk_size])
+        with transaction.atomic(using=router.db_for_write(Question)):
+            questions.rebuild_tallies()
+            questions.rebuild_rollups()
+
+
+def reset_sequences():
+    """Move the id sequences past the imported ids, on databases that keep them apart from the table."""
+    connection = connections[router.db_for_write(Question)]
+    statements = connection.ops.sequence_reset_sql(no_style(), [Question, Choice])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
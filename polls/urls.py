@@ -1,11 +1,18 @@
 """Configuration of urls."""
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'polls'
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
     path('<int:pk>/', views.DetailView.as_view(), name='detail'),
     path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
-    path('<int:question_id>/vote/', views.vote, name='vote')]
+    path('<int:pk>/timeline/', views.TimelineView.as_view(), name='timeline'),
+    path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('groups/<int:pk>/', views.GroupDetailView.as_view(), name='group'),
+    path('groups/<int:pk>/vote/', views.group_vote, name='group-vote'),
+    path('groups/<int:pk>/results/', views.GroupResultsView.as_view(), name='group-results'),
+    path('api/questions/', api.question_list, name='api-questions'),
+    path('api/questions/<int:pk>/results/', api.question_results, name='api-results'),
+    path('api/questions/<int:pk>/timeline/', api.question_timeline, name='api-timeline')]
@@ -1,5 +1,9 @@
 """Contain index, detail and result page."""
-from django.http import HttpResponseRedirect
+import logging
+import time
+
+from django.conf import settings
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from django.views import generic
@@ -7,74 +11,251 @@ from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import user_logged_in, user_logged_out, user_login_failed
-from .models import Choice, Question, Vote
+from .cache import cache_settings, invalidate, invalidate_question, poll_cache
+from .ingest import get_buffer
+from .models import Choice, ChoiceShard, PollGroup, Question, Vote, VoteRollup, prefetch_choices
+from .pagination import keyset_page
+from .snapshots import finalize, snapshot_response
+from .streaming import stream_settings
 from django.dispatch import receiver
 
-from .settings import LOGGING
-import logging.config
-
-logging.config.dictConfig(LOGGING)
 logger = logging.getLogger('polls')
 
 def get_client_ip(request):
-    """Get ip address from the user."""
+    """Get ip address from the user.
+
+    X-Forwarded-For is only believed when the request comes from one of the
+    POLLS_TRUSTED_PROXIES, and then the last address not added by them is used.
+    """
+    if request is None:
+        return None
+    ip = request.META.get('REMOTE_ADDR')
+    trusted = getattr(settings, 'POLLS_TRUSTED_PROXIES', ())
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
+    if x_forwarded_for and ip in trusted:
+        for address in reversed(x_forwarded_for.split(',')):
+            ip = address.strip()
+            if ip not in trusted:
+                break
     return ip
 
 
+def get_user_vote(user, question):
+    """Return the choice that the user picked for the question, or None."""
+    if not user.is_authenticated:
+        return None
+    buffer = get_buffer()
+    pending = buffer and buffer.pending_choice(user.pk, question.pk)
+    if pending:
+        return Choice.objects.filter(pk=pending).first()
+    vote = Vote.objects.filter(user=user, question=question).select_related('choice').first()
+    return vote.choice if vote else None
+
+
+def get_user_votes(user, questions):
+    """Return ``{question_id: choice text}`` for the questions the user voted on, in one query."""
+    if not user.is_authenticated or not questions:
+        return {}
+    ids = [question.pk for question in questions]
+    votes = dict(Vote.objects.filter(user=user, question__in=ids).values_list('question_id', 'choice__choice_text'))
+    buffer = get_buffer()
+    if buffer:
+        pending = {pk: buffer.pending_choice(user.pk, pk) for pk in ids}
+        pending = {pk: choice_id for pk, choice_id in pending.items() if choice_id}
+        if pending:
+            texts = dict(Choice.objects.filter(pk__in=pending.values()).values_list('pk', 'choice_text'))
+            votes.update((pk, texts[choice_id]) for pk, choice_id in pending.items())
+    return votes
+
+
 @receiver(user_logged_in)
 def throw_feedback_login(sender, request, user, **kwargs):
     """Show some response when the user have log in."""
-    logger.info(f"Username: {user.username} User's IP: {get_client_ip(request)} is log in.")
+    ip = get_client_ip(request)
+    logger.info("%s logged in from %s.", user.username, ip, extra={'event': 'login', 'user': user.username, 'ip': ip})
 
 
 @receiver(user_logged_out)
 def throw_feedback_log_out(sender, request, user, **kwargs):
     """Show some responses when the user have log out."""
-    logger.info(f"Username: {user.username} User's IP: {get_client_ip(request)} is log out.")
+    username, ip = getattr(user, 'username', None), get_client_ip(request)
+    logger.info("%s logged out from %s.", username, ip, extra={'event': 'logout', 'user': username, 'ip': ip})
 
 
 @receiver(user_login_failed)
 def feedback_fail_login(sender, credentials, request, **kwargs):
     """Show some responses when the user fail to log in."""
-    logger.warning(f"Username {request.POST['username']} User's IP: {get_client_ip(request)} when the user login failed.")
+    username, ip = credentials.get('username'), get_client_ip(request)
+    logger.warning("Failed login as %s from %s.", username, ip,
+                   extra={'event': 'login_failed', 'user': username, 'ip': ip})
+
+def question_page(status, cursor, size):
+    """Return one cached page of published questions with the given status, and the next cursor.
+
+    Raise ValueError for a malformed cursor.
+    """
+    def load():
+        now = timezone.now()
+        questions = Question.objects.published(now).with_is_open(now)
+        if status == 'open':
+            questions = questions.open(now)
+        elif status == 'closed':
+            questions = questions.closed(now)
+        return keyset_page(questions, cursor, size)
+
+    return poll_cache.get_or_set('index', 'index', f'{status}:{cursor}:{size}', load,
+                                 timeout=cache_settings()['INDEX_TIMEOUT'])
+
 
 class IndexView(generic.ListView):
     """The index page for showing infomation the questions."""
 
     template_name = 'polls/index.html'
     context_object_name = 'latest_question_list'
+    page_size = 20
+    statuses = ('all', 'open', 'closed')
+
+    def get_status(self):
+        """Return the open/closed/all filter asked for in the query string."""
+        status = self.request.GET.get('status', 'all')
+        return status if status in self.statuses else 'all'
 
     def get_queryset(self):
-        """Return the last five published questions (not including those set to be published in the future)."""
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by('-pub_date')[:]
+        """Return one page of published questions, newest first (future questions are left out)."""
+        try:
+            page, self.next_cursor = question_page(self.get_status(), self.request.GET.get('after', ''),
+                                                   self.page_size)
+        except ValueError:
+            raise Http404("Invalid page cursor.")
+        return page
 
+    def get_context_data(self, **kwargs):
+        """Add the filter in use, the cursor of the next page and the user's vote on each question."""
+        context = super().get_context_data(**kwargs)
+        context['status'] = self.get_status()
+        context['next_cursor'] = self.next_cursor
+        page = context['latest_question_list']
+        votes = get_user_votes(self.request.user, page)
+        context['question_votes'] = [(question, votes.get(question.pk)) for question in page]
+        return context
 
-class DetailView(generic.DetailView):
-    """The detail page for showing infomation the questions."""
+
+class QuestionChoicesMixin:
+    """Load a question together with its choices in two queries, or from the poll cache."""
 
     model = Question
+    cache_name = None
+    published_only = False
+
+    def get_queryset(self):
+        """Prefetch the choices so the template never queries per choice."""
+        return super().get_queryset().prefetch_related(prefetch_choices())
+
+    def get_cache_key(self):
+        """Return what tells the cached contexts of this view apart within the question's scope."""
+        return self.kwargs[self.pk_url_kwarg]
+
+    def get_object(self, queryset=None):
+        """Return the question, keeping its choices context for get_context_data."""
+        pk = self.kwargs[self.pk_url_kwarg]
+        self.choices = poll_cache.get_or_set(self.cache_name, f'question:{pk}', self.get_cache_key(),
+                                             lambda: self.load(queryset))
+        if self.published_only and not self.choices['question'].is_published():
+            # The cache may have been warmed by schedule_polls just before pub_date.
+            raise Http404("No published question matches the given id.")
+        return self.choices['question']
+
+    def load(self, queryset):
+        """Read the question and its choices context from the database."""
+        question = super().get_object(queryset)
+        return {'question': question, **question.results()}
+
+    def get_context_data(self, **kwargs):
+        """Add the choices, their percentages and the total votes."""
+        context = super().get_context_data(**kwargs)
+        context.update(self.choices)
+        return context
+
+
+class DetailView(QuestionChoicesMixin, generic.DetailView):
+    """The detail page for showing infomation the questions."""
+
     template_name = 'polls/detail.html'
+    cache_name = 'detail'
+    published_only = True
 
     def get_queryset(self):
         """Excludes any questions that aren't published yet."""
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        return super().get_queryset().filter(pub_date__lte=timezone.now())
+
+    def get_context_data(self, **kwargs):
+        """Add the choice that the current user picked for this question."""
+        context = super().get_context_data(**kwargs)
+        context['user_vote'] = get_user_vote(self.request.user, self.object)
+        return context
 
 
-class ResultsView(generic.DetailView):
+class ResultsView(QuestionChoicesMixin, generic.DetailView):
     """The result page show the total vote for each polls."""
 
-    model = Question
     template_name = 'polls/results.html'
+    cache_name = 'results'
+
+    def get(self, request, *args, **kwargs):
+        """Serve closed polls from their frozen snapshot."""
+        self.object = self.get_object()
+        if self.object.is_final():
+            snapshot = poll_cache.get_or_set(
+                'snapshot', f'question:{self.object.pk}', self.object.pk, lambda: finalize(self.object))
+            return snapshot_response(request, snapshot)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    def get_context_data(self, **kwargs):
+        """Tell the template whether to follow the live results stream."""
+        context = super().get_context_data(**kwargs)
+        context['live_results'] = stream_settings()['ENABLED']
+        return context
+
+
+class TimelineView(QuestionChoicesMixin, generic.DetailView):
+    """The running vote count of each choice over the life of a poll, read from the vote rollups."""
+
+    template_name = 'polls/timeline.html'
+    cache_name = 'timeline'
+    published_only = True
+
+    def get_resolution(self):
+        """Return the minute/hour/day period asked for in the query string."""
+        resolution = self.request.GET.get('resolution', 'hour')
+        return resolution if resolution in VoteRollup.RESOLUTIONS else 'hour'
+
+    def get_queryset(self):
+        """Excludes any questions that aren't published yet."""
+        return super().get_queryset().filter(pub_date__lte=timezone.now())
+
+    def get_cache_key(self):
+        """Cache each resolution separately."""
+        return f'{super().get_cache_key()}:{self.get_resolution()}'
+
+    def load(self, queryset):
+        """Read the question, its choices and their timeline."""
+        question = super(QuestionChoicesMixin, self).get_object(queryset)
+        shard_votes = ChoiceShard.objects.totals([question.pk] if question.counter_shards > 1 else [])
+        return {'question': question, 'total_votes': question.total_votes + shard_votes.get(question.pk, 0),
+                **question.timeline(self.get_resolution())}
+
+    def get_context_data(self, **kwargs):
+        """Add the resolution in use and the ones to choose from."""
+        context = super().get_context_data(**kwargs)
+        context['resolution'] = self.get_resolution()
+        context['resolutions'] = VoteRollup.RESOLUTIONS
+        return context
 
 
 @login_required
 def vote(request, question_id):
     """Voting for each polls by select the choice."""
+    started = time.perf_counter()
     question = get_object_or_404(Question, pk=question_id)
     try:
         selected_choice = question.choice_set.get(pk=request.POST['choice'])
@@ -82,19 +263,100 @@ def vote(request, question_id):
         # Redisplay the question voting form.
         return render(request, 'polls/detail.html', {
             'question': question,
+            'user_vote': get_user_vote(request.user, question),
             'error_message': "You didn't select a choice.",
+            **question.results(),
         })
     else:
         if not (question.can_vote()):
             text = "The poll that you selected is not allowed."
             return HttpResponseRedirect(reverse('polls:index'), messages.warning(request, text))
-        Vote.objects.update_or_create(user =request.user, question =question, defaults ={'choice': selected_choice})
-        for q in Question.objects.all():
-            q.recently_vote = request.user.vote_set.get(question=question).choice.choice_text
-            q.save()
+        buffer = get_buffer()
+        if buffer:
+            buffer.enqueue(request.user.pk, question.id, selected_choice.id)
+        else:
+            Vote.objects.cast(request.user, question, selected_choice)
+            invalidate_question(question.id)
         messages.success(request, "Already complete your polls.")
-        logger.info(f"Username: {request.user.username} User's IP: {get_client_ip(request)}  Question ID: {question.id} vote sucessful.")
+        ip = get_client_ip(request)
+        logger.info("%s voted on question %s from %s.", request.user.username, question.id, ip, extra={
+            'event': 'vote', 'user': request.user.username, 'ip': ip, 'question': question.id,
+            'choice': selected_choice.id, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)})
         # Always return an HttpResponseRedirect after successfully dealing
         # with POST data. This prevents data from being posted twice if a
         # user hits the Back button.
         return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
+
+
+def group_form_context(user, group, **extra):
+    """Return the context of the poll group form: each published question and the user's current vote."""
+    questions = list(group.published_questions())
+    votes = get_user_votes(user, questions)
+    return {'group': group, 'question_votes': [(question, votes.get(question.pk)) for question in questions], **extra}
+
+
+class GroupDetailView(generic.DetailView):
+    """The form answering every open question of a poll group at once."""
+
+    model = PollGroup
+    template_name = 'polls/group_detail.html'
+    context_object_name = 'group'
+
+    def get_context_data(self, **kwargs):
+        """Add the questions, their choices and the user's votes."""
+        context = super().get_context_data(**kwargs)
+        context.update(group_form_context(self.request.user, self.object))
+        return context
+
+
+class GroupResultsView(generic.DetailView):
+    """The results of every published question of a poll group on one page."""
+
+    model = PollGroup
+    template_name = 'polls/group_results.html'
+    context_object_name = 'group'
+
+    def get_context_data(self, **kwargs):
+        """Add the results of each question."""
+        context = super().get_context_data(**kwargs)
+        context['question_results'] = [(question, question.results())
+                                       for question in self.object.published_questions()]
+        return context
+
+
+@login_required
+def group_vote(request, pk):
+    """Apply the answers to all the open questions of a poll group in one transaction.
+
+    Nothing is saved unless every open question has a valid answer.
+    """
+    started = time.perf_counter()
+    group = get_object_or_404(PollGroup, pk=pk)
+    answers, missing = [], []
+    for question in group.published_questions():
+        if not question.can_vote():
+            continue
+        choices = {str(choice.pk): choice for choice in question.choice_set.all()}
+        choice = choices.get(request.POST.get(f'question-{question.pk}', ''))
+        if choice is None:
+            missing.append(question.question_text)
+        else:
+            answers.append((question, choice))
+    if missing or not answers:
+        message = ("You didn't select a choice for: " + '; '.join(missing) if missing
+                   else "None of these polls can be voted on.")
+        return render(request, 'polls/group_detail.html',
+                      group_form_context(request.user, group, error_message=message))
+    buffer = get_buffer()
+    if buffer:
+        for question, choice in answers:
+            buffer.enqueue(request.user.pk, question.pk, choice.pk)
+    else:
+        Vote.objects.cast_many([(request.user.pk, question.pk, choice.pk) for question, choice in answers])
+        invalidate(*(f'question:{question.pk}' for question, _ in answers))
+    messages.success(request, "Already complete your polls.")
+    ip = get_client_ip(request)
+    logger.info("%s voted on %s question(s) of group %s from %s.", request.user.username, len(answers), group.pk, ip,
+                extra={'event': 'group_vote', 'user': request.user.username, 'ip': ip,
+                       'latency_ms': round((time.perf_counter() - started) * 1000, 2)})
+    return HttpResponseRedirect(reverse('polls:group-results', args=(group.pk,)))